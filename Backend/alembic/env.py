@@ -34,6 +34,7 @@ from app.models.message import Message  # noqa: E402
 from app.models.verification import Verification  # noqa: E402
 from app.models.report import Report  # noqa: E402
 from app.models.chat import ChatMessage, BlockedUser, ChatRoom, MessageReaction  # noqa: E402
+from app.models.market_stats import CategoryMarketStats  # noqa: E402
 
 # Add your model's MetaData object here for 'autogenerate' support
 target_metadata = Base.metadata
@@ -0,0 +1,26 @@
+"""Day 10: Quantized semantic embeddings on listings
+
+Revision ID: day10_add_listing_embeddings
+Revises: day9_add_recommendation_candidate_indexes
+Create Date: 2025-08-23
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "day10_add_listing_embeddings"
+down_revision: Union[str, Sequence[str], None] = "day9_add_recommendation_candidate_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # int8 vector, SEMANTIC_DIM bytes; filled by scripts/rebuild_embeddings.py for existing rows
+    op.add_column("listings", sa.Column("embedding", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("listings", "embedding")
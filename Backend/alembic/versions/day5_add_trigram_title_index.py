@@ -0,0 +1,31 @@
+"""Day 5: Enable pg_trgm and add trigram index on listing titles for typo-tolerant search
+
+Revision ID: day5_add_trigram_title_index
+Revises: day4_add_search_vector
+Create Date: 2025-08-18
+"""
+
+from typing import Sequence, Union
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "day5_add_trigram_title_index"
+down_revision: Union[str, Sequence[str], None] = "day4_add_search_vector"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # pg_trgm provides similarity() and the % operator used by the search fallback
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS listings_title_trgm_idx ON listings USING GIN (title gin_trgm_ops);
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS listings_title_trgm_idx;")
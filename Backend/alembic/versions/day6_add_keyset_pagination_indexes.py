@@ -0,0 +1,38 @@
+"""Day 6: Composite indexes backing keyset (cursor) pagination
+
+Revision ID: day6_add_keyset_pagination_indexes
+Revises: day5_add_trigram_title_index
+Create Date: 2025-08-19
+"""
+
+from typing import Sequence, Union
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "day6_add_keyset_pagination_indexes"
+down_revision: Union[str, Sequence[str], None] = "day5_add_trigram_title_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Listing feeds seek on (created_at, id)
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_listings_created_at_id ON listings (created_at DESC, id DESC);
+        """
+    )
+
+    # Chat history seeks on (timestamp, id) within a listing conversation
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_chat_messages_listing_timestamp_id
+        ON chat_messages (listing_id, timestamp DESC, id DESC);
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_chat_messages_listing_timestamp_id;")
+    op.execute("DROP INDEX IF EXISTS ix_listings_created_at_id;")
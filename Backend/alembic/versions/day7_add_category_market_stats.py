@@ -0,0 +1,59 @@
+"""Day 7: Add category_market_stats table maintained incrementally from listings
+
+Revision ID: day7_add_category_market_stats
+Revises: day6_add_keyset_pagination_indexes
+Create Date: 2025-08-20
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "day7_add_category_market_stats"
+down_revision: Union[str, Sequence[str], None] = "day6_add_keyset_pagination_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "category_market_stats",
+        sa.Column("category", sa.String(100), primary_key=True),
+        sa.Column("sample_size", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("price_sum", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("min_price", sa.Numeric(10, 2), nullable=True),
+        sa.Column("max_price", sa.Numeric(10, 2), nullable=True),
+        sa.Column("histogram", sa.JSON(), nullable=False, server_default="{}"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    # Backfill; bucket = floor(log10(price) * 40), matching MarketStatsService.price_bucket
+    op.execute(
+        """
+        WITH priced AS (
+            SELECT category, price, floor(log(GREATEST(price, 1)) * 40)::int AS bucket
+            FROM listings
+            WHERE status IN ('ACTIVE', 'SOLD') AND price IS NOT NULL
+        ),
+        hist AS (
+            SELECT category, json_object_agg(bucket, n) AS histogram
+            FROM (SELECT category, bucket, count(*) AS n FROM priced GROUP BY category, bucket) b
+            GROUP BY category
+        ),
+        totals AS (
+            SELECT category, count(*) AS sample_size, sum(price) AS price_sum,
+                   min(price) AS min_price, max(price) AS max_price
+            FROM priced
+            GROUP BY category
+        )
+        INSERT INTO category_market_stats (category, sample_size, price_sum, min_price, max_price, histogram, updated_at)
+        SELECT t.category, t.sample_size, t.price_sum, t.min_price, t.max_price, h.histogram, now()
+        FROM totals t JOIN hist h USING (category);
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("category_market_stats")
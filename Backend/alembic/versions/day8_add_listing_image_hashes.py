@@ -0,0 +1,26 @@
+"""Day 8: Packed perceptual image hashes on listings
+
+Revision ID: day8_add_listing_image_hashes
+Revises: day7_add_category_market_stats
+Create Date: 2025-08-21
+"""
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "day8_add_listing_image_hashes"
+down_revision: Union[str, Sequence[str], None] = "day7_add_category_market_stats"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (phash, ahash, dhash) per image as little-endian uint64, 24 bytes per image
+    op.add_column("listings", sa.Column("image_hashes", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("listings", "image_hashes")
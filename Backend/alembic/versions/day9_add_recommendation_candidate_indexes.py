@@ -0,0 +1,34 @@
+"""Day 9: Indexes backing recommendation candidate generation
+
+Revision ID: day9_add_recommendation_candidate_indexes
+Revises: day8_add_listing_image_hashes
+Create Date: 2025-08-22
+"""
+
+from typing import Sequence, Union
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "day9_add_recommendation_candidate_indexes"
+down_revision: Union[str, Sequence[str], None] = "day8_add_listing_image_hashes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Affinity bucket: newest ACTIVE listings within a few categories
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_listings_active_category_created
+        ON listings (category, created_at DESC) WHERE status = 'ACTIVE';
+        """
+    )
+
+    # University bucket joins owners by university
+    op.execute("CREATE INDEX IF NOT EXISTS ix_users_university ON users (university);")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_users_university;")
+    op.execute("DROP INDEX IF EXISTS ix_listings_active_category_created;")
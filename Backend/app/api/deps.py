@@ -1,8 +1,11 @@
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
+from app.core.principal import Principal, resolve_principal
 from app.core.security import decode_token
 from app.models.user import User
 
@@ -21,8 +24,8 @@ def get_db():
 TokenDep = Annotated[HTTPAuthorizationCredentials, Depends(bearer_scheme)]
 DbDep = Annotated[Session, Depends(get_db)]
 
-# Get the current user from token
-def get_current_user(credentials: TokenDep, db: DbDep) -> User:
+# Get the current user from token (cached principal; the users table is only hit on a miss)
+async def get_current_user(credentials: TokenDep, db: DbDep) -> Principal:
     token = credentials.credentials  # Extract the raw token string
     payload = decode_token(token)
     if not payload or "sub" not in payload:
@@ -30,16 +33,26 @@ def get_current_user(credentials: TokenDep, db: DbDep) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
-    user = db.query(User).filter(User.id == payload["sub"]).first()
-    if not user:
+    user_id = str(payload["sub"])
+    principal = await resolve_principal(
+        user_id, lambda: run_in_threadpool(lambda: db.query(User).filter(User.id == user_id).first())
+    )
+    if not principal:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
-    return user
+    return principal
 
 # Ensure current user is admin
-def get_current_admin(user: User = Depends(get_current_user)) -> User:
+def get_current_admin(user: Principal = Depends(get_current_user)) -> Principal:
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin only")
     return user
+
+# Dependency to get an async (asyncpg) DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+AsyncDbDep = Annotated[AsyncSession, Depends(get_async_db)]
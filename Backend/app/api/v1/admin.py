@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, desc, and_, or_, text
 from typing import Optional, List
 from datetime import datetime, timedelta
 
 from app.api.deps import get_db, get_current_admin
+from app.core.principal import invalidate_principal
 from app.models.user import User
 from app.models.listing import Listing
 from app.models.chat import ChatMessage, BlockedUser, ChatRoom
 from app.models.report import Report
 from app.models.verification import Verification
+from app.services.market_stats_service import MarketStatsService
+from app.services.ai_service import ai_service
+from app.services.listing_index import sync_listing_indexes
+from app.utils.pagination import COUNT_MODE_PATTERN, apply_keyset, count_total, encode_cursor, fetch_page
 from app.schemas.admin import (
     AdminUserOut, AdminListingOut, AdminStatsOut, 
     AdminReportOut, AdminVerificationOut, UserUpdateRequest,
@@ -129,11 +134,13 @@ def update_user(
     
     db.commit()
     db.refresh(user)
+    invalidate_principal(user_id)
     return {"message": "User updated successfully", "user": AdminUserOut.from_orm(user)}
 
 @router.delete("/users/{user_id}")
 def delete_user(
     user_id: str,  # Changed user_id from int to str
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
@@ -146,6 +153,10 @@ def delete_user(
         raise HTTPException(status_code=400, detail="Cannot delete admin users")
     
     # Delete associated data
+    listing_ids = []
+    for listing in db.query(Listing).filter(Listing.owner_id == user_id):
+        MarketStatsService.on_listing_deleted(db, listing)
+        listing_ids.append(listing.id)
     db.query(Listing).filter(Listing.owner_id == user_id).delete()
     db.query(ChatMessage).filter(
         or_(ChatMessage.sender_id == user_id, ChatMessage.receiver_id == user_id)
@@ -156,6 +167,8 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    invalidate_principal(user_id)
+    background_tasks.add_task(ai_service.remove_from_index, listing_ids)
     
     return {"message": "User deleted successfully"}
 
@@ -166,6 +179,8 @@ def list_listings(
     status: Optional[str] = Query(None, description="Filter by status"),
     category: Optional[str] = Query(None, description="Filter by category"),
     search: Optional[str] = Query(None, description="Search in title/description"),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page"),
+    count_mode: str = Query("exact", regex=COUNT_MODE_PATTERN, description="How to compute total: exact, capped, estimate or none"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
@@ -186,21 +201,24 @@ def list_listings(
             )
         )
     
-    total = query.count()
-    listings = query.order_by(Listing.created_at.desc()).offset((page - 1) * page_size).limit(page_size).all()
+    total = count_total(db, query, count_mode)
+    query = apply_keyset(query, Listing.created_at, Listing.id, cursor)
+    listings, has_next = fetch_page(query, page_size, 0 if cursor else (page - 1) * page_size)
     
     return {
         "listings": listings,
         "total": total,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total + page_size - 1) // page_size  # Added missing total_pages calculation
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+        "next_cursor": encode_cursor(listings[-1].created_at, listings[-1].id) if has_next else None
     }
 
 @router.patch("/listings/{listing_id}/moderate")
 def moderate_listing(
     listing_id: int,
     moderation_data: ListingModerationRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
@@ -209,17 +227,23 @@ def moderate_listing(
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
     
+    before = MarketStatsService.snapshot(listing)
+    old_status = listing.status
     listing.status = moderation_data.status
+    MarketStatsService.on_listing_saved(db, before, listing)
     if moderation_data.admin_notes:
         # Store admin notes in metadata or create a separate admin_notes field
         pass
     
     db.commit()
+    if listing.status != old_status:
+        sync_listing_indexes(background_tasks, listing)
     return {"message": f"Listing {moderation_data.status.lower()} successfully"}
 
 @router.delete("/listings/{listing_id}")
 def delete_listing(
     listing_id: int,
+    background_tasks: BackgroundTasks,
     reason: Optional[str] = Query(None, description="Reason for deletion"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
@@ -232,8 +256,10 @@ def delete_listing(
     # Delete associated messages
     db.query(ChatMessage).filter(ChatMessage.listing_id == listing_id).delete()
     
+    MarketStatsService.on_listing_deleted(db, listing)
     db.delete(listing)
     db.commit()
+    background_tasks.add_task(ai_service.remove_from_index, [listing_id])
     
     return {"message": "Listing deleted successfully", "reason": reason}
 
@@ -342,6 +368,8 @@ def review_verification(
             user.is_verified = True
     
     db.commit()
+    if approved:
+        invalidate_principal(verification.user_id)
     return {"message": f"Verification {'approved' if approved else 'rejected'} successfully"}
 
 @router.get("/system/health", response_model=SystemHealthOut)
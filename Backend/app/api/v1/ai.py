@@ -1,18 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, undefer
 from app.api.deps import get_db, get_current_user
 from app.models.listing import Listing
 from app.schemas.ai import (
     PriceSuggestRequest, PriceSuggestResponse,
+    PriceSuggestBatchRequest, PriceSuggestBatchResponse,
     DuplicateCheckRequest, DuplicateCheckResponse,
     RecommendRequest, RecommendResponse
 )
 from app.services.ai_service import ai_service
+from app.services.market_stats_service import MarketStatsService
+from app.services.recommendation_candidates import RecommendationCandidateService
 from app.core.config import settings
+from app.utils.cache import TieredCache, make_key, normalize_text
+from app.utils.image_hash import unpack_hashes
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
+# Sellers re-request the same suggestion while editing; cache both the DB aggregate and the ML result
+market_stats_cache = TieredCache("market_stats", maxsize=512, ttl=settings.MARKET_STATS_CACHE_TTL_SECONDS)
+price_suggest_cache = TieredCache("price_suggest", maxsize=settings.CACHE_MAX_ENTRIES, ttl=settings.PRICE_SUGGEST_CACHE_TTL_SECONDS)
+
+
+async def _market_stats(db: Session, category: str) -> dict:
+    market_stats = await market_stats_cache.get(category)
+    if market_stats is None:
+        # Sync Session query; keep it off the event loop
+        market_stats = await run_in_threadpool(MarketStatsService.get_stats, db, category)
+        await market_stats_cache.set(category, market_stats)
+    return market_stats
+
 
 @router.post("/price-suggest", response_model=PriceSuggestResponse)
 async def suggest_price(
@@ -24,18 +42,18 @@ async def suggest_price(
     if not settings.AI_PRICE_SUGGEST_ENABLED:
         raise HTTPException(status_code=503, detail="Price suggestion service is disabled")
 
-    # Pull real market stats from DB for the same category
-    stats = db.query(
-        func.avg(Listing.price).label("avg_price"),
-        func.min(Listing.price).label("min_price"),
-        func.max(Listing.price).label("max_price")
-    ).filter(Listing.category == request.category).first()
-
-    market_stats = {
-        "average_price": float(stats.avg_price or 0),
-        "min_price": float(stats.min_price or 0),
-        "max_price": float(stats.max_price or 0)
-    }
+    cache_key = make_key(
+        normalize_text(request.title),
+        normalize_text(request.description),
+        normalize_text(request.category),
+        normalize_text(request.condition),
+    )
+    cached = await price_suggest_cache.get(cache_key)
+    if cached is not None:
+        return PriceSuggestResponse(**cached)
+
+    # Pull real market stats for the same category (one-row lookup in category_market_stats)
+    market_stats = await _market_stats(db, request.category)
 
     try:
         result = await ai_service.suggest_price(
@@ -45,11 +63,36 @@ async def suggest_price(
             condition=request.condition,
             market_stats=market_stats
         )
+        # Only cache real predictions; service errors come back with suggested_price=None
+        if result.get("suggested_price") is not None:
+            await price_suggest_cache.set(cache_key, result)
         return PriceSuggestResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
 
+@router.post("/price-suggest/batch", response_model=PriceSuggestBatchResponse)
+async def suggest_prices_batch(
+    request: PriceSuggestBatchRequest,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """Price several listings in one ML call (bulk imports, repricing a seller's items)"""
+    if not settings.AI_PRICE_SUGGEST_ENABLED:
+        raise HTTPException(status_code=503, detail="Price suggestion service is disabled")
+    if len(request.items) > settings.AI_PRICE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {settings.AI_PRICE_BATCH_MAX} items per batch")
+
+    stats = {c: await _market_stats(db, c) for c in {item.category for item in request.items}}
+    items = [{**item.model_dump(), "market_stats": stats[item.category]} for item in request.items]
+    results = await ai_service.suggest_prices_batch(items)
+    if len(results) != len(items):
+        # Keep the positional contract even if the ML service answered short
+        missing = {"suggested_price": None, "confidence": 0, "reasoning": "No prediction returned"}
+        results = (results + [missing] * len(items))[:len(items)]
+    return PriceSuggestBatchResponse(suggestions=[PriceSuggestResponse(**r) for r in results])
+
+
 @router.post("/duplicate-check", response_model=DuplicateCheckResponse)
 async def check_duplicate(
     request: DuplicateCheckRequest,
@@ -60,31 +103,57 @@ async def check_duplicate(
     if not settings.AI_DUPLICATE_CHECK_ENABLED:
         raise HTTPException(status_code=503, detail="Duplicate check service is disabled")
 
-    # Get recent listings for comparison
-    recent_listings = db.query(Listing).filter(
-        Listing.category == request.category
-    ).order_by(Listing.created_at.desc()).limit(20).all()
-
-    existing_listings = [
-        {
-            "id": listing.id,
-            "title": listing.title,
-            "description": listing.description or ""
-        }
-        for listing in recent_listings
-    ]
+    # A saved listing contributes its photo hashes and is excluded from its own matches
+    image_hashes, exclude_ids = [], []
+    if request.listing_id is not None:
+        own = db.query(Listing).options(undefer(Listing.image_hashes)).filter(
+            Listing.id == request.listing_id,
+            Listing.owner_id == user.id
+        ).first()
+        if not own:
+            raise HTTPException(status_code=404, detail="Listing not found")
+        image_hashes = unpack_hashes(own.image_hashes)
+        exclude_ids = [own.id]
+
+    if settings.AI_DUPLICATE_USE_INDEX:
+        # ML service compares against its live index of the whole catalog
+        existing_listings = []
+    else:
+        # Get recent listings for comparison
+        recent_listings = db.query(Listing).options(undefer(Listing.image_hashes)).filter(
+            Listing.category == request.category
+        ).order_by(Listing.created_at.desc()).limit(settings.AI_DUPLICATE_MAX_CANDIDATES).all()
+
+        existing_listings = [
+            {
+                "id": listing.id,
+                "title": listing.title,
+                "description": listing.description or "",
+                "image_hashes": unpack_hashes(listing.image_hashes)
+            }
+            for listing in recent_listings
+        ]
 
     try:
         result = await ai_service.check_duplicate(
             title=request.title,
             description=request.description,
-            existing_listings=existing_listings
+            existing_listings=existing_listings,
+            image_hashes=image_hashes,
+            exclude_ids=exclude_ids
         )
         return DuplicateCheckResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
 
+def _recommend_preferences(user_id, client_preferences: dict) -> dict:
+    """Client preferences keyed to the authenticated user; a client-sent user_id is ignored."""
+    preferences = {k: v for k, v in client_preferences.items() if k != "user_id"}
+    preferences["user_id"] = user_id
+    return preferences
+
+
 @router.post("/recommend", response_model=RecommendResponse)
 async def recommend_listings(
     request: RecommendRequest,
@@ -95,24 +164,14 @@ async def recommend_listings(
     if not settings.AI_RECOMMEND_ENABLED:
         raise HTTPException(status_code=503, detail="Recommendation service is disabled")
 
-    # Get available listings
-    available_listings = db.query(Listing).filter(
-        Listing.status == "ACTIVE"
-    ).order_by(Listing.created_at.desc()).limit(50).all()
-
-    listings_data = [
-        {
-            "id": listing.id,
-            "title": listing.title,
-            "category": listing.category,
-            "price": float(listing.price)
-        }
-        for listing in available_listings
-    ]
+    # Candidate generation over the whole active catalog (affinity, university, popular, recent);
+    # several sync queries, so they run in the thread pool rather than on the event loop
+    preferences = _recommend_preferences(user.id, request.user_preferences)
+    listings_data = await run_in_threadpool(RecommendationCandidateService.generate, db, user, preferences)
 
     try:
         result = await ai_service.recommend_listings(
-            user_preferences=request.user_preferences,
+            user_preferences=preferences,
             available_listings=listings_data
         )
         return RecommendResponse(**result)
@@ -128,5 +187,9 @@ async def ai_health_check():
         "duplicate_check_enabled": settings.AI_DUPLICATE_CHECK_ENABLED,
         "recommend_enabled": settings.AI_RECOMMEND_ENABLED,
         "ai_service_configured": bool(settings.AI_API_KEY),
-        "model": settings.AI_MODEL
+        "model": settings.AI_MODEL,
+        "cache": {
+            "price_suggest": price_suggest_cache.stats(),
+            "market_stats": market_stats_cache.stats()
+        }
     }
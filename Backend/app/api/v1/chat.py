@@ -1,59 +1,70 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status, HTTPException, UploadFile, File, Form
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from starlette.websockets import WebSocketState
 from jose import JWTError, jwt
 from app.core.config import settings
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_async_db, get_current_user
+from app.core.principal import resolve_principal
+from app.db.session import AsyncSessionLocal
 from app.models.chat import ChatMessage, BlockedUser, ChatRoom, MessageReaction
 from app.models.listing import Listing
 from app.models.user import User
 from app.schemas.chat import ChatMessageOut, ChatRoomOut, MessageReactionOut
-from app.utils.storage import save_upload
+from app.utils.storage import store_upload
+from app.utils.pagination import apply_keyset, encode_cursor, fetch_page
+from app.services.chat_broker import chat_broker
+from app.services.chat_writer import chat_writer
 from typing import Dict, List, Optional
 import html
 import logging
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-active_connections: Dict[str, List[WebSocket]] = {}
-
 JWT_SECRET = settings.JWT_SECRET
 JWT_ALGORITHM = settings.JWT_ALGORITHM
 
 logger = logging.getLogger("chat_ws")
 
+def _as_int(value) -> Optional[int]:
+    """Message ids arrive as JSON and may be strings; asyncpg won't coerce them."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 def room_id(listing_id: int, u1: int, u2: int):
     return f"{listing_id}-{min(u1, u2)}-{max(u1, u2)}"
 
-def create_message(db: Session, data: dict):
+async def create_message(db: AsyncSession, data: dict):
     msg = ChatMessage(**data)
     db.add(msg)
-    db.commit()
-    db.refresh(msg)
-    
-    # Update chat room last message timestamp
-    room = db.query(ChatRoom).filter(
-        ChatRoom.listing_id == data["listing_id"],
-        ((ChatRoom.participant1_id == data["sender_id"]) & (ChatRoom.participant2_id == data["receiver_id"])) |
-        ((ChatRoom.participant1_id == data["receiver_id"]) & (ChatRoom.participant2_id == data["sender_id"]))
-    ).first()
-    
-    if room:
-        room.last_message_at = msg.timestamp
-        db.commit()
-    
+    await db.flush()
+    await db.refresh(msg)
+
+    # Update chat room last message timestamp in the same transaction
+    await db.execute(
+        update(ChatRoom)
+        .where(ChatRoom.for_participants(data["listing_id"], data["sender_id"], data["receiver_id"]))
+        .values(last_message_at=msg.timestamp)
+    )
+    await db.commit()
+
     return msg
 
-def user_blocked(db: Session, user_id: str, blocked_by: str):
-    return db.query(BlockedUser).filter(
-        BlockedUser.user_id == user_id,
-        BlockedUser.blocked_by == blocked_by
-    ).first() is not None
+async def user_blocked(db: AsyncSession, user_id: str, blocked_by: str):
+    result = await db.execute(
+        select(BlockedUser.id).where(
+            BlockedUser.user_id == user_id,
+            BlockedUser.blocked_by == blocked_by
+        ).limit(1)
+    )
+    return result.first() is not None
 
-async def get_current_user_websocket(websocket: WebSocket, db: Session):
+async def get_current_user_websocket(websocket: WebSocket, db: AsyncSession):
     auth = websocket.headers.get("authorization")
     if not auth or not auth.lower().startswith("bearer "):
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
@@ -65,8 +76,8 @@ async def get_current_user_websocket(websocket: WebSocket, db: Session):
         if user_id is None:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             raise Exception("Invalid token: no subject")
-        # Optionally verify user in DB
-        user = db.query(User).filter(User.id == user_id).first()
+        # Verify the user still exists (cached principal, shared with get_current_user)
+        user = await resolve_principal(user_id, lambda: db.get(User, user_id))
         if not user:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             raise Exception("User not found")
@@ -97,10 +108,11 @@ def get_chat_messages(
     room_id: int,
     page: int = 1,
     page_size: int = 50,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get messages for a specific chat room"""
+    """Get messages for a specific chat room (newest first; pass next_cursor to load older history)"""
     room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
     if not room:
         raise HTTPException(status_code=404, detail="Chat room not found")
@@ -108,7 +120,7 @@ def get_chat_messages(
     if current_user.id not in [room.participant1_id, room.participant2_id]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    messages = db.query(ChatMessage).options(
+    query = db.query(ChatMessage).options(
         joinedload(ChatMessage.sender),
         joinedload(ChatMessage.reply_to)
     ).filter(
@@ -116,7 +128,9 @@ def get_chat_messages(
         ((ChatMessage.sender_id == room.participant1_id) & (ChatMessage.receiver_id == room.participant2_id)) |
         ((ChatMessage.sender_id == room.participant2_id) & (ChatMessage.receiver_id == room.participant1_id)),
         ChatMessage.deleted == False
-    ).order_by(ChatMessage.timestamp.desc()).offset((page - 1) * page_size).limit(page_size).all()
+    )
+    query = apply_keyset(query, ChatMessage.timestamp, ChatMessage.id, cursor)
+    messages, has_next = fetch_page(query, page_size, 0 if cursor else (page - 1) * page_size)
     
     # Mark messages as read
     unread_messages = db.query(ChatMessage).filter(
@@ -126,7 +140,7 @@ def get_chat_messages(
     ).all()
     
     for msg in unread_messages:
-        msg.read_at = datetime.utcnow()
+        msg.read_at = datetime.now(timezone.utc)
     
     db.commit()
     
@@ -134,7 +148,8 @@ def get_chat_messages(
         "messages": [msg.to_dict() if hasattr(msg, 'to_dict') else ChatMessageOut.from_orm(msg).dict() for msg in reversed(messages)],
         "page": page,
         "page_size": page_size,
-        "total": len(messages)
+        "total": len(messages),
+        "next_cursor": encode_cursor(messages[-1].timestamp, messages[-1].id) if has_next else None
     }
 
 @router.post("/rooms/{room_id}/messages/file")
@@ -142,11 +157,11 @@ async def upload_file_message(
     room_id: int,
     file: UploadFile = File(...),
     caption: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Upload a file as a chat message"""
-    room = db.query(ChatRoom).filter(ChatRoom.id == room_id).first()
+    room = await db.get(ChatRoom, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Chat room not found")
     
@@ -154,7 +169,7 @@ async def upload_file_message(
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Save file
-    file_url = save_upload(file, subdir="chat")
+    file_url = await store_upload(file, subdir="chat")
     
     # Determine message type
     message_type = "file"
@@ -170,7 +185,7 @@ async def upload_file_message(
         "receiver_id": other_participant,
         "content": caption or f"Shared a {message_type}",
         "message_type": message_type,
-        "metadata": {
+        "message_metadata": {
             "file_url": file_url,
             "file_name": file.filename,
             "file_size": file.size,
@@ -178,7 +193,7 @@ async def upload_file_message(
         }
     }
     
-    message = create_message(db, message_data)
+    message = await create_message(db, message_data)
     return ChatMessageOut.from_orm(message)
 
 @router.post("/messages/{message_id}/reactions")
@@ -295,112 +310,125 @@ def get_blocked_users(
     ]
 
 @router.websocket("/{listing_id}/{peer_id}")
-async def chat_ws(websocket: WebSocket, listing_id: int, peer_id: str, db: Session = Depends(get_db)):
+async def chat_ws(websocket: WebSocket, listing_id: int, peer_id: str):
+    # All DB work here goes through short-lived AsyncSessions so a slow query
+    # never blocks the event loop or pins a pooled connection between messages.
+    user_id = None
+    rid = None
     try:
-        # 🔐 Authenticate the user
-        try:
-            user_id = await get_current_user_websocket(websocket, db)
-        except Exception as e:
-            logger.error(f"Auth failed: {e}")
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-
-        # 🏷️ Check listing
-        listing = db.query(Listing).filter(Listing.id == listing_id).first()
-        if not listing:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-
-        # 🚫 Check if user is blocked
-        if user_blocked(db, user_id, peer_id) or user_blocked(db, peer_id, user_id):
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-
-        # 🚫 Prevent self-chat
-        if peer_id == user_id:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-
-        is_seller = user_id == str(listing.owner_id)
-        is_buyer_chatting_with_owner = peer_id == str(listing.owner_id)
-
-        # ❌ Invalid access check
-        if not (is_seller or is_buyer_chatting_with_owner):
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-
-        # ✅ Accept the connection now
-        await websocket.accept()
-
-        # 💬 Create or fetch chat room
-        room = db.query(ChatRoom).filter(
-            ChatRoom.listing_id == listing_id,
-            ((ChatRoom.participant1_id == user_id) & (ChatRoom.participant2_id == peer_id)) |
-            ((ChatRoom.participant1_id == peer_id) & (ChatRoom.participant2_id == user_id))
-        ).first()
-
-        if not room:
-            room = ChatRoom(
-                listing_id=listing_id,
-                participant1_id=min(user_id, peer_id),
-                participant2_id=max(user_id, peer_id)
-            )
-            db.add(room)
-            db.commit()
+        async with AsyncSessionLocal() as db:
+            # 🔐 Authenticate the user
+            try:
+                user_id = await get_current_user_websocket(websocket, db)
+            except Exception as e:
+                logger.error(f"Auth failed: {e}")
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
+            # 🏷️ Check listing
+            listing = await db.get(Listing, listing_id)
+            if not listing:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
+            # 🚫 Check if user is blocked
+            if await user_blocked(db, user_id, peer_id) or await user_blocked(db, peer_id, user_id):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
+            # 🚫 Prevent self-chat
+            if peer_id == user_id:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
+            is_seller = user_id == str(listing.owner_id)
+            is_buyer_chatting_with_owner = peer_id == str(listing.owner_id)
+
+            # ❌ Invalid access check
+            if not (is_seller or is_buyer_chatting_with_owner):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
+            # ✅ Accept the connection now
+            await websocket.accept()
+
+            # 💬 Create or fetch chat room
+            room = (await db.execute(
+                select(ChatRoom).where(ChatRoom.for_participants(listing_id, user_id, peer_id))
+            )).scalars().first()
+
+            if not room:
+                room = ChatRoom(
+                    listing_id=listing_id,
+                    participant1_id=min(user_id, peer_id),
+                    participant2_id=max(user_id, peer_id)
+                )
+                db.add(room)
+                await db.commit()
 
         rid = room_id(listing_id, user_id, peer_id)
-        active_connections.setdefault(rid, []).append(websocket)
+        await chat_broker.join(rid, websocket)
         logger.info(f"User {user_id} connected to room {rid}")
 
         while True:
             data = await websocket.receive_json()
 
             if "typing" in data and data["typing"]:
-                for conn in active_connections.get(rid, []):
-                    if conn != websocket and conn.application_state == WebSocketState.CONNECTED:
-                        await conn.send_json({"typing": True, "user": user_id})
+                await chat_broker.publish(rid, {"typing": True, "user": user_id}, exclude=websocket)
 
             elif "delivery_receipt" in data:
-                message_id = data["delivery_receipt"]
-                msg = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
-                if msg and msg.receiver_id == user_id:
-                    msg.read_at = datetime.utcnow()
-                    db.commit()
+                message_id = _as_int(data["delivery_receipt"])
+                if message_id is None:
+                    await websocket.send_json({"error": "Invalid payload."})
+                    continue
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(ChatMessage)
+                        .where(ChatMessage.id == message_id, ChatMessage.receiver_id == user_id)
+                        .values(read_at=datetime.now(timezone.utc))
+                    )
+                    await db.commit()
 
-                for conn in active_connections.get(rid, []):
-                    if conn != websocket and conn.application_state == WebSocketState.CONNECTED:
-                        await conn.send_json({"delivery_receipt": message_id, "user": user_id})
+                await chat_broker.publish(rid, {"delivery_receipt": message_id, "user": user_id}, exclude=websocket)
 
             elif "edit_message" in data:
                 edit_data = data["edit_message"]
-                msg_db = db.query(ChatMessage).filter(ChatMessage.id == edit_data["message_id"]).first()
-                if msg_db and msg_db.sender_id == user_id:
-                    new_text = html.escape(edit_data["new_content"].strip())
-                    if new_text:
-                        msg_db.content = new_text
-                        msg_db.edited = True
-                        db.commit()
-                        msg_out = ChatMessageOut.from_orm(msg_db).dict()
-                        msg_out["timestamp"] = msg_out["timestamp"].isoformat()
-                        for conn in active_connections.get(rid, []):
-                            if conn.application_state == WebSocketState.CONNECTED:
-                                await conn.send_json({"edit_message": msg_out})
+                message_id = _as_int(edit_data.get("message_id"))
+                if message_id is None:
+                    await websocket.send_json({"error": "Invalid payload."})
+                    continue
+                async with AsyncSessionLocal() as db:
+                    msg_db = await db.get(ChatMessage, message_id)
+                    if msg_db and msg_db.sender_id == user_id:
+                        new_text = html.escape(edit_data["new_content"].strip())
+                        if new_text:
+                            msg_db.content = new_text
+                            msg_db.edited = True
+                            await db.commit()
+                            msg_out = ChatMessageOut.from_orm(msg_db).dict()
+                            msg_out["timestamp"] = msg_out["timestamp"].isoformat()
+                            await chat_broker.publish(rid, {"edit_message": msg_out})
 
             elif "delete_message" in data:
-                message_id = data["delete_message"]
-                msg_db = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
-                if msg_db and msg_db.sender_id == user_id:
-                    msg_db.deleted = True
-                    db.commit()
-                    for conn in active_connections.get(rid, []):
-                        if conn.application_state == WebSocketState.CONNECTED:
-                            await conn.send_json({"delete_message": message_id})
+                message_id = _as_int(data["delete_message"])
+                if message_id is None:
+                    await websocket.send_json({"error": "Invalid payload."})
+                    continue
+                async with AsyncSessionLocal() as db:
+                    msg_db = await db.get(ChatMessage, message_id)
+                    if msg_db and msg_db.sender_id == user_id:
+                        msg_db.deleted = True
+                        await db.commit()
+                        await chat_broker.publish(rid, {"delete_message": message_id})
 
             elif "reply_to" in data:
                 content = html.escape(data["content"].strip())
-                reply_to_id = data["reply_to"]
+                reply_to_id = _as_int(data["reply_to"])
                 if not content:
                     continue
+                if reply_to_id is None:
+                    await websocket.send_json({"error": "Invalid payload."})
+                    continue
                 msg_in = {
                     "listing_id": listing_id,
                     "sender_id": user_id,
@@ -408,12 +436,10 @@ async def chat_ws(websocket: WebSocket, listing_id: int, peer_id: str, db: Sessi
                     "content": content,
                     "reply_to_id": reply_to_id
                 }
-                msg = create_message(db, msg_in)
+                msg = await chat_writer.submit(msg_in)
                 msg_out = ChatMessageOut.from_orm(msg).dict()
                 msg_out["timestamp"] = msg_out["timestamp"].isoformat()
-                for conn in list(active_connections.get(rid, [])):
-                    if conn.application_state == WebSocketState.CONNECTED:
-                        await conn.send_json(msg_out)
+                await chat_broker.publish(rid, msg_out)
 
             elif "content" in data:
                 content = html.escape(data["content"].strip())
@@ -425,29 +451,23 @@ async def chat_ws(websocket: WebSocket, listing_id: int, peer_id: str, db: Sessi
                     "receiver_id": peer_id,
                     "content": content
                 }
-                msg = create_message(db, msg_in)
+                msg = await chat_writer.submit(msg_in)
                 msg_out = ChatMessageOut.from_orm(msg).dict()
                 msg_out["timestamp"] = msg_out["timestamp"].isoformat()
-                for conn in list(active_connections.get(rid, [])):
-                    if conn.application_state == WebSocketState.CONNECTED:
-                        await conn.send_json(msg_out)
+                await chat_broker.publish(rid, msg_out)
 
             else:
                 await websocket.send_json({"error": "Invalid payload."})
 
     except WebSocketDisconnect:
-        if rid in active_connections and websocket in active_connections[rid]:
-            active_connections[rid].remove(websocket)
-            if not active_connections[rid]:
-                del active_connections[rid]
+        if rid:
+            await chat_broker.leave(rid, websocket)
         logger.info(f"User {user_id} disconnected from room {rid}")
 
     except Exception as e:
         logger.error(f"Unexpected error in websocket: {e}", exc_info=True)
-        if rid in active_connections and websocket in active_connections[rid]:
-            active_connections[rid].remove(websocket)
-            if not active_connections[rid]:
-                del active_connections[rid]
+        if rid:
+            await chat_broker.leave(rid, websocket)
         try:
             await websocket.close()
         except RuntimeError:
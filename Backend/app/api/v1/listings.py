@@ -1,79 +1,219 @@
+import asyncio
+import io
+import logging
 import uuid
 from typing import List, Optional
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from app.api import deps
 from app.core.config import settings
+from app.db.session import SessionLocal
 from app.models.listing import Listing
 from app.models.user import User
-from app.schemas.listing import ListingOut, ListingUpdate, ListingStatusPatch
+from app.schemas.listing import (
+    ListingFromUploads,
+    ListingOut,
+    ListingStatusPatch,
+    ListingUpdate,
+    PresignedUpload,
+    UploadPresignRequest,
+)
 from app.utils.storage import (
-    save_upload,
+    decode_local_upload_token,
+    delete_key,
     gen_object_key,
+    presigned_upload_url,
     public_url_for_key,
-    get_s3_client,
+    read_key,
+    receive_local_upload,
+    stat_key,
+    store_uploads,
 )
 from app.services.notification_service import NotificationService
+from app.services.market_stats_service import MarketStatsService
+from app.services.ai_service import ai_service
+from app.services.listing_index import dup_index_entry, sync_listing_indexes
+from app.services.semantic_index import semantic_index
+from app.utils.embedding import embed_listings, pack_embedding
+from app.utils.image_hash import hash_upload, pack_hashes
 
-router = APIRouter(prefix="/listings", tags=["Listings"])
+logger = logging.getLogger(__name__)
 
+router = APIRouter(prefix="/listings", tags=["Listings"])
 
-# -------- Create listing (LOCAL or S3 based on settings) --------
-@router.post("", response_model=ListingOut)
-async def create_listing(
-    title: str = Form(...),
-    description: str = Form(...),
-    category: str = Form(...),
-    price: Decimal = Form(...),
-    images: Optional[List[UploadFile]] = File(None),
-    db: Session = Depends(deps.get_db),
-    user: User = Depends(deps.get_current_user),
-):
-    if not user.is_verified:
-        raise HTTPException(status_code=403, detail="User must be verified")
+MAX_LISTING_IMAGES = 10
 
-    urls = []
-
-    if settings.STORAGE_BACKEND == "LOCAL":
-        # Save files locally
-        for f in images or []:
-            url = save_upload(f, subdir="listings")
-            urls.append(url)
-    elif settings.STORAGE_BACKEND == "S3":
-        # Upload files to S3 directly
-        s3_client = get_s3_client()
-        for f in images or []:
-            key = gen_object_key("listings", f.filename)
-            s3_client.upload_fileobj(f.file, settings.S3_BUCKET, key)
-            urls.append(public_url_for_key(key))
-    else:
-        raise HTTPException(status_code=500, detail="Invalid storage backend")
 
+def _save_new_listing(
+    db: Session, user: User, title: str, description: str, category: str, price: Decimal,
+    urls: List[str], hashes: List[List[int]],
+) -> Listing:
+    """Blocking (DB commit, embedding, market stats); async handlers call it via run_in_threadpool."""
     obj = Listing(
         title=title,
         description=description,
         category=category,
         price=float(price),
         images=urls,
+        image_hashes=pack_hashes(hashes),
         owner_id=user.id,
         status="ACTIVE",
     )
     
     search_text = f"{title} {description} {category}"
     obj.search_vector = func.to_tsvector('english', search_text)
+    embedding = pack_embedding(embed_listings([obj])[0])
+    obj.embedding = embedding
     
     db.add(obj)
+    MarketStatsService.on_listing_saved(db, None, obj)
     db.commit()
     db.refresh(obj)
+    semantic_index.upsert(obj.id, embedding)
     
     NotificationService.notify_listing_created(db, obj, user.id)
+    return obj
+
+
+# -------- Create listing (LOCAL or S3 based on settings) --------
+@router.post("", response_model=ListingOut)
+async def create_listing(
+    background_tasks: BackgroundTasks,
+    title: str = Form(...),
+    description: str = Form(...),
+    category: str = Form(...),
+    price: Decimal = Form(...),
+    images: Optional[List[UploadFile]] = File(None),
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(deps.get_current_user),
+):
+    if not user.is_verified:
+        raise HTTPException(status_code=403, detail="User must be verified")
+
+    images = images or []
+    # Streamed to disk/S3 in worker threads, several at a time; oversize files are rejected mid-copy
+    urls = await store_uploads(images, subdir="listings")
+
+    # Perceptual hashes are computed once here, while the bytes are in hand
+    hashes = await asyncio.gather(*(run_in_threadpool(hash_upload, f.file) for f in images))
+    hashes = [h for h in hashes if h is not None]
+
+    # Sync DB commit, embedding and market-stats update: keep them off the event loop
+    obj = await run_in_threadpool(
+        _save_new_listing, db, user, title, description, category, price, urls, hashes,
+    )
+    background_tasks.add_task(ai_service.index_listings, [dup_index_entry(obj)])
     
     return obj
 
 
+# -------- Direct uploads: presign, PUT straight to storage, then create by key --------
+def _upload_prefix(user: User) -> str:
+    return f"listings/{user.id}"
+
+
+@router.post("/uploads", response_model=List[PresignedUpload])
+def presign_uploads(payload: UploadPresignRequest, user: User = Depends(deps.get_current_user)):
+    if not user.is_verified:
+        raise HTTPException(status_code=403, detail="User must be verified")
+    if len(payload.files) > MAX_LISTING_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LISTING_IMAGES} images per listing")
+
+    out = []
+    for f in payload.files:
+        if not f.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail=f"{f.filename}: only images can be uploaded")
+        if f.size <= 0 or f.size > settings.UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"{f.filename}: file too large or empty")
+        key = gen_object_key(_upload_prefix(user), f.filename)
+        out.append(PresignedUpload(
+            key=key,
+            upload_url=presigned_upload_url(key, f.content_type),
+            headers={"Content-Type": f.content_type},
+            expires_in=settings.UPLOAD_URL_TTL_SECONDS,
+        ))
+    return out
+
+
+@router.put("/uploads/local/{token}", status_code=204)
+async def put_local_upload(token: str, request: Request):
+    """LOCAL-backend stand-in for an S3 presigned PUT; the signed token is the credential."""
+    if settings.STORAGE_BACKEND != "LOCAL":
+        raise HTTPException(status_code=404, detail="Not found")
+    key = decode_local_upload_token(token)
+    if not key:
+        raise HTTPException(status_code=403, detail="Upload URL invalid or expired")
+    await receive_local_upload(key, request.stream())
+
+
+async def _hash_stored_images(listing_id: int, keys: List[str]) -> None:
+    """Background: hash images uploaded directly to storage, then feed the duplicate index."""
+    def hash_key(key: str):
+        try:
+            return hash_upload(io.BytesIO(read_key(key)))
+        except Exception as e:
+            logger.warning(f"Could not read uploaded image {key}: {e}")
+            return None
+
+    hashes = await asyncio.gather(*(run_in_threadpool(hash_key, k) for k in keys))
+    hashes = [h for h in hashes if h is not None]
+
+    def save() -> Optional[dict]:
+        with SessionLocal() as db:
+            obj = db.query(Listing).filter(Listing.id == listing_id).first()
+            if not obj:
+                return None
+            obj.image_hashes = pack_hashes(hashes)
+            db.commit()
+            return dup_index_entry(obj)
+
+    entry = await run_in_threadpool(save)
+    if entry:
+        await ai_service.index_listings([entry])
+
+
+@router.post("/from-uploads", response_model=ListingOut)
+async def create_listing_from_uploads(
+    payload: ListingFromUploads,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(deps.get_db),
+    user: User = Depends(deps.get_current_user),
+):
+    if not user.is_verified:
+        raise HTTPException(status_code=403, detail="User must be verified")
+    keys = list(dict.fromkeys(payload.image_keys))
+    if len(keys) > MAX_LISTING_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LISTING_IMAGES} images per listing")
+    prefix = _upload_prefix(user) + "/"
+    for key in keys:
+        if not key.startswith(prefix) or ".." in key:
+            raise HTTPException(status_code=403, detail=f"Not your upload: {key}")
+
+    sizes = await asyncio.gather(*(run_in_threadpool(stat_key, k) for k in keys))
+    for key, size in zip(keys, sizes):
+        if size is None:
+            raise HTTPException(status_code=400, detail=f"Upload not found: {key}")
+        if size > settings.UPLOAD_MAX_BYTES:
+            await run_in_threadpool(delete_key, key)
+            raise HTTPException(status_code=413, detail=f"Upload too large: {key}")
+
+    urls = [public_url_for_key(k) for k in keys]
+    obj = await run_in_threadpool(
+        _save_new_listing,
+        db, user, payload.title, payload.description, payload.category, payload.price, urls, [],
+    )
+    if keys:
+        # Hashing needs the bytes; do it after responding instead of holding the request
+        background_tasks.add_task(_hash_stored_images, obj.id, keys)
+    else:
+        background_tasks.add_task(ai_service.index_listings, [dup_index_entry(obj)])
+    return obj
+
+
 # -------- Get listing --------
 @router.get("/{listing_id}", response_model=ListingOut)
 def get_listing(listing_id: int, db: Session = Depends(deps.get_db)):
@@ -88,6 +228,7 @@ def get_listing(listing_id: int, db: Session = Depends(deps.get_db)):
 def update_listing(
     listing_id: int,
     payload: ListingUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     user: User = Depends(deps.get_current_user),
 ):
@@ -99,6 +240,7 @@ def update_listing(
     if not user.is_verified:
         raise HTTPException(status_code=403, detail="User must be verified")
 
+    before = MarketStatsService.snapshot(obj)
     update_data = payload.model_dump(exclude_unset=True, exclude_none=True)
     
     # Additional validation to prevent updating with empty/default values
@@ -121,15 +263,23 @@ def update_listing(
     for field, value in filtered_update_data.items():
         setattr(obj, field, value)
 
+    embedding = None
     if any(field in filtered_update_data for field in ['title', 'description', 'category']):
         search_text = f"{obj.title} {obj.description} {obj.category}"
         obj.search_vector = func.to_tsvector('english', search_text)
+        embedding = pack_embedding(embed_listings([obj])[0])
+        obj.embedding = embedding
 
+    MarketStatsService.on_listing_saved(db, before, obj)
     db.commit()
     db.refresh(obj)
+    if embedding is not None and obj.status == "ACTIVE":
+        semantic_index.upsert(obj.id, embedding)
     
     if filtered_update_data:  # Only notify if something was actually updated
         NotificationService.notify_listing_updated(db, obj, user.id)
+    if obj.status == "ACTIVE" and ("title" in filtered_update_data or "description" in filtered_update_data):
+        background_tasks.add_task(ai_service.index_listings, [dup_index_entry(obj)])
     
     return obj
 
@@ -139,6 +289,7 @@ def update_listing(
 def patch_status(
     listing_id: int,
     payload: ListingStatusPatch,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     user: User = Depends(deps.get_current_user),
 ):
@@ -150,9 +301,14 @@ def patch_status(
     if payload.status not in {"ACTIVE", "SOLD", "ARCHIVED"}:
         raise HTTPException(status_code=422, detail="Invalid status")
 
+    before = MarketStatsService.snapshot(obj)
+    old_status = obj.status
     obj.status = payload.status
+    MarketStatsService.on_listing_saved(db, before, obj)
     db.commit()
     db.refresh(obj)
+    if obj.status != old_status:
+        sync_listing_indexes(background_tasks, obj)
     return obj
 
 
@@ -160,6 +316,7 @@ def patch_status(
 @router.delete("/{listing_id}", status_code=204)
 def delete_listing(
     listing_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     user: User = Depends(deps.get_current_user),
 ):
@@ -171,5 +328,8 @@ def delete_listing(
     if not user.is_verified:
         raise HTTPException(status_code=403, detail="User must be verified")
 
+    MarketStatsService.on_listing_deleted(db, obj)
     db.delete(obj)
     db.commit()
+    semantic_index.remove(listing_id)
+    background_tasks.add_task(ai_service.remove_from_index, [listing_id])
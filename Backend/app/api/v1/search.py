@@ -5,43 +5,35 @@ from typing import Optional, List
 from datetime import datetime, timedelta
 
 from app.api.deps import get_db
+from app.core.config import settings
 from app.models.listing import Listing
 from app.models.user import User
+from app.services.semantic_index import semantic_index
+from app.utils.pagination import (
+    COUNT_MODE_PATTERN,
+    apply_keyset,
+    count_total,
+    default_count_mode,
+    encode_cursor,
+    fetch_page,
+)
 
 router = APIRouter(tags=["Search"])
 
-@router.get("/listings/search")
-def search_listings(
-    q: Optional[str] = Query(None, description="Search keyword"),
-    category: Optional[str] = Query(None, description="Filter by category"),
-    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
-    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
-    university: Optional[str] = Query(None, description="Filter by university"),
-    status: Optional[str] = Query("ACTIVE", description="Filter by status"),
-    sort_by: str = Query("created_at", description="Sort field"),
-    sort_order: str = Query("desc", regex="^(asc|desc)$", description="Sort order"),
-    page: int = Query(1, ge=1, description="Page number"),
-    page_size: int = Query(10, ge=1, le=100, description="Page size"),
-    db: Session = Depends(get_db)
+
+def _apply_search_filters(
+    query,
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    university: Optional[str],
+    status: Optional[str],
 ):
-    query = db.query(Listing).options(joinedload(Listing.owner))
-    
     if status:
         query = query.filter(Listing.status == status)
     else:
         query = query.filter(Listing.status == "ACTIVE")
 
-    if q:
-        search_term = f"%{q}%"
-        query = query.filter(
-            or_(
-                Listing.title.ilike(search_term),
-                Listing.description.ilike(search_term),
-                Listing.category.ilike(search_term)
-            )
-        )
-
-    # Enhanced filters
     if category:
         query = query.filter(Listing.category.ilike(f"%{category}%"))
     if university:
@@ -50,31 +42,118 @@ def search_listings(
         query = query.filter(Listing.price >= min_price)
     if max_price is not None:
         query = query.filter(Listing.price <= max_price)
+    return query
+
 
-    valid_sort_fields = ['created_at', 'updated_at', 'price', 'title']
+@router.get("/listings/search")
+def search_listings(
+    q: Optional[str] = Query(None, description="Search keyword"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
+    university: Optional[str] = Query(None, description="Filter by university"),
+    status: Optional[str] = Query("ACTIVE", description="Filter by status"),
+    sort_by: Optional[str] = Query(None, description="Sort field (defaults to relevance when q is given, else created_at)"),
+    sort_order: str = Query("desc", regex="^(asc|desc)$", description="Sort order"),
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(10, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page (created_at sort only)"),
+    count_mode: Optional[str] = Query(None, regex=COUNT_MODE_PATTERN, description="How to compute total: exact, capped, estimate or none (default: estimate, none with a cursor)"),
+    db: Session = Depends(get_db)
+):
+    valid_sort_fields = ['relevance', 'created_at', 'updated_at', 'price', 'title']
+    if sort_by is None:
+        sort_by = "relevance" if q and not cursor else "created_at"
     if sort_by not in valid_sort_fields:
         raise HTTPException(status_code=400, detail=f"Invalid sort field. Valid options: {valid_sort_fields}")
+    if sort_by == "relevance" and not q:
+        sort_by = "created_at"
+    if cursor and sort_by != "created_at":
+        raise HTTPException(status_code=400, detail="Cursor pagination requires sort_by=created_at")
 
-    sort_column = getattr(Listing, sort_by)
-    if sort_order == 'desc':
-        query = query.order_by(sort_column.desc())
+    base = _apply_search_filters(
+        db.query(Listing).options(joinedload(Listing.owner)),
+        category, min_price, max_price, university, status
+    )
+
+    query = base
+    search_mode = None
+    rank = None
+    if q:
+        # Full-text search over the GIN-indexed search_vector column
+        ts_query = func.websearch_to_tsquery('english', q)
+        query = base.filter(Listing.search_vector.op('@@')(ts_query))
+        rank = func.ts_rank_cd(Listing.search_vector, ts_query)
+        search_mode = "fulltext"
+
+    if q and not db.query(query.exists()).scalar():
+        # No lexeme match: fall back to trigram similarity on titles to catch typos.
+        # `%` honours pg_trgm.similarity_threshold (0.3 by default) and uses the trigram index.
+        query = base.filter(Listing.title.op('%')(q))
+        rank = func.similarity(Listing.title, q)
+        search_mode = "trigram"
+
+    total = count_total(db, query, default_count_mode(count_mode, cursor))
+
+    if sort_by == "relevance":
+        query = query.order_by(rank.desc(), Listing.created_at.desc(), Listing.id.desc())
+    elif sort_by == "created_at":
+        query = apply_keyset(query, Listing.created_at, Listing.id, cursor, descending=sort_order == 'desc')
     else:
-        query = query.order_by(sort_column.asc())
+        sort_column = getattr(Listing, sort_by)
+        if sort_order == 'desc':
+            query = query.order_by(sort_column.desc(), Listing.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), Listing.id.asc())
+
+    offset = 0 if cursor else (page - 1) * page_size
+    listings, has_next = fetch_page(query, page_size, offset)
 
-    # Pagination with performance optimization
-    total = query.count()
-    listings = query.offset((page - 1) * page_size).limit(page_size).all()
+    next_cursor = None
+    if has_next and sort_by == "created_at":
+        next_cursor = encode_cursor(listings[-1].created_at, listings[-1].id)
 
     return {
         "total": total,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total + page_size - 1) // page_size,
-        "has_next": page * page_size < total,
-        "has_prev": page > 1,
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+        "has_next": has_next,
+        "has_prev": page > 1 or cursor is not None,
+        "next_cursor": next_cursor,
+        "search_mode": search_mode,
         "results": [listing.to_dict() for listing in listings]
     }
 
+@router.get("/listings/semantic-search")
+def semantic_search_listings(
+    q: str = Query(..., min_length=2, description="Free-text query, matched on meaning and word parts rather than exact words"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
+    university: Optional[str] = Query(None, description="Filter by university"),
+    limit: int = Query(20, ge=1, le=100, description="Number of results"),
+    db: Session = Depends(get_db)
+):
+    # Over-fetch from the vector index so the SQL filters below still leave `limit` results
+    hits = semantic_index.search(db, q, k=min(limit * 5, 500), min_score=settings.SEMANTIC_MIN_SCORE)
+    scores = dict(hits)
+
+    listings = []
+    if scores:
+        listings = _apply_search_filters(
+            db.query(Listing).options(joinedload(Listing.owner)),
+            category, min_price, max_price, university, "ACTIVE"
+        ).filter(Listing.id.in_(scores)).all()
+        listings.sort(key=lambda l: (-scores[l.id], -l.id))
+        listings = listings[:limit]
+
+    return {
+        "total": len(listings),
+        "search_mode": "semantic",
+        "results": [{**listing.to_dict(), "score": round(scores[listing.id], 4)} for listing in listings]
+    }
+
 @router.get("/listings/advanced-search")
 def advanced_search_listings(
     keywords: Optional[List[str]] = Query(None, description="Multiple search keywords"),
@@ -86,6 +165,8 @@ def advanced_search_listings(
     exclude_sold: bool = Query(True, description="Exclude sold items"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page"),
+    count_mode: Optional[str] = Query(None, regex=COUNT_MODE_PATTERN, description="How to compute total: exact, capped, estimate or none (default: estimate, none with a cursor)"),
     db: Session = Depends(get_db)
 ):
     query = db.query(Listing).options(joinedload(Listing.owner))
@@ -143,17 +224,20 @@ def advanced_search_listings(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date_to format. Use YYYY-MM-DD")
     
-    # Default sorting by relevance/date
-    query = query.order_by(Listing.created_at.desc())
-    
-    total = query.count()
-    listings = query.offset((page - 1) * page_size).limit(page_size).all()
+    total = count_total(db, query, default_count_mode(count_mode, cursor))
+
+    # Default sorting by date, with id as a tiebreaker so the keyset is stable
+    query = apply_keyset(query, Listing.created_at, Listing.id, cursor)
+    offset = 0 if cursor else (page - 1) * page_size
+    listings, has_next = fetch_page(query, page_size, offset)
     
     return {
         "total": total,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total + page_size - 1) // page_size,
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+        "has_next": has_next,
+        "next_cursor": encode_cursor(listings[-1].created_at, listings[-1].id) if has_next else None,
         "results": [listing.to_dict() for listing in listings]
     }
 
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 from app.api.deps import get_db, get_current_user, get_current_admin
+from app.core.principal import invalidate_principal
 from app.core.config import settings, allowed_domains
 from app.models.user import User
 from app.models.verification import Verification
@@ -92,6 +93,7 @@ def approve(user_id: str, review_action: AdminReviewAction, db: Session = Depend
     ver.reviewed_at = datetime.now(timezone.utc)
     user.is_verified = True
     db.commit()
+    invalidate_principal(user_id)
     
     NotificationService.notify_verification_status(db, user_id, "APPROVED")
     
@@ -15,6 +15,10 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 60
 
+    # Async engine pool (chat WebSocket path)
+    ASYNC_DB_POOL_SIZE: int = 10
+    ASYNC_DB_MAX_OVERFLOW: int = 20
+
     # CORS
     CORS_ORIGINS: List[AnyHttpUrl] | List[str] = []
 
@@ -39,6 +43,10 @@ class Settings(BaseSettings):
     # Storage
     STORAGE_BACKEND: Literal["LOCAL", "S3"] = "LOCAL"
     UPLOAD_DIR: str = "./uploads"  # used when STORAGE_BACKEND=LOCAL
+    UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024  # per file; larger uploads get a 413
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # copy size when streaming to disk/S3
+    UPLOAD_CONCURRENCY: int = 4  # files stored in parallel per request
+    UPLOAD_URL_TTL_SECONDS: int = 900  # lifetime of presigned direct-upload URLs
 
     # AWS S3 settings (for production)
     S3_BUCKET: Optional[str] = None
@@ -47,6 +55,32 @@ class Settings(BaseSettings):
     S3_SECRET_KEY: Optional[str] = None
     S3_PUBLIC_BASE_URL: Optional[str] = None  # e.g. https://bucket.s3.ap-south-1.amazonaws.com
 
+    # Redis (optional; shared state across workers)
+    REDIS_URL: Optional[str] = None
+
+    # Chat fan-out: "memory" keeps sockets per process, "redis" publishes across workers
+    CHAT_BROKER: Literal["memory", "redis"] = "memory"
+
+    # Response caching: "memory" is per-process only, "redis" adds a shared tier on REDIS_URL
+    CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    CACHE_MAX_ENTRIES: int = 4096
+    PRICE_SUGGEST_CACHE_TTL_SECONDS: int = 600
+    MARKET_STATS_CACHE_TTL_SECONDS: int = 300
+    # Authenticated-user lookups (get_current_user); 0 queries the users table on every request
+    AUTH_USER_CACHE_TTL_SECONDS: int = 30
+
+    # Rate limiting (GCRA, O(1) state per key). "redis" shares counters across workers on REDIS_URL
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100_000  # per-process LRU bound for the memory backend / Redis fallback
+    RATE_LIMIT_IP_PER_MINUTE: int = 100  # anonymous requests
+    RATE_LIMIT_USER_PER_MINUTE: int = 300  # authenticated requests, keyed by user id
+    RATE_LIMIT_AI_PER_MINUTE: int = 30  # /ai/* per user: each call fans out to the ML service
+
+    # Chat write batching: messages arriving within the window share one INSERT/commit
+    CHAT_WRITE_BATCH_WINDOW_MS: int = 5
+    CHAT_WRITE_BATCH_MAX: int = 200
+
     # AI Service Configuration
     AI_SERVICE_URL: str = os.getenv("AI_SERVICE_URL", "https://mlservice-production.up.railway.app")  # Awais's ML FastAPI service
     AI_API_KEY: str
@@ -54,11 +88,33 @@ class Settings(BaseSettings):
     AI_TIMEOUT_SECONDS: int = 30
     AI_MAX_RETRIES: int = 3
     AI_RETRY_DELAY: float = 2.0
+
+    # Pooled HTTP client for the ML service (kept open for the app's lifetime)
+    AI_HTTP2: bool = True
+    AI_POOL_MAX_CONNECTIONS: int = 50
+    AI_POOL_MAX_KEEPALIVE: int = 20
+    AI_POOL_KEEPALIVE_EXPIRY: float = 30.0
     
     # Feature Flags for AI services
     AI_PRICE_SUGGEST_ENABLED: bool = True
     AI_DUPLICATE_CHECK_ENABLED: bool = True
     AI_RECOMMEND_ENABLED: bool = True
+    # Check duplicates against the ML service's live index (kept in sync on listing
+    # create/update/delete) instead of sending a sample of recent listings
+    AI_DUPLICATE_USE_INDEX: bool = False
+    # Recent same-category listings sent as candidates when not using the index
+    AI_DUPLICATE_MAX_CANDIDATES: int = 200
+    # Listings pulled from the whole active catalog for the recommendation ranker
+    AI_RECO_MAX_CANDIDATES: int = 300
+    # Per-process cache of the most-favourited ranking (a favourites-wide aggregate)
+    AI_RECO_POPULAR_CACHE_TTL_SECONDS: int = 120
+    # Items per /ai/price-suggest/batch call (bulk repricing / imports)
+    AI_PRICE_BATCH_MAX: int = 50
+
+    # Semantic search: hashed word + char n-gram embeddings stored as int8 in listings.embedding
+    SEMANTIC_DIM: int = 256  # changing it requires scripts/rebuild_embeddings.py
+    SEMANTIC_REFRESH_S: float = 30.0  # how often each worker pulls changed listings into its index
+    SEMANTIC_MIN_SCORE: float = 0.15  # cosine below this is not returned
 
     @field_validator("CORS_ORIGINS", mode="before")
     @classmethod
@@ -74,6 +130,16 @@ class Settings(BaseSettings):
             uri = uri.replace("postgres://", "postgresql://", 1)
         return uri
 
+    @property
+    def ASYNC_SQLALCHEMY_DATABASE_URI(self) -> str:
+        uri = self.SQLALCHEMY_DATABASE_URI
+        for prefix in ("postgresql+psycopg2://", "postgresql://"):
+            if uri.startswith(prefix):
+                uri = uri.replace(prefix, "postgresql+asyncpg://", 1)
+                break
+        # asyncpg takes `ssl` where libpq takes `sslmode`
+        return uri.replace("sslmode=", "ssl=")
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -1,85 +1,154 @@
 import time
 import logging
-from typing import Dict, Optional
-from fastapi import Request, Response, HTTPException
+from typing import Optional
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict, deque
-import asyncio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.security import decode_token
+from app.utils.rate_limit import RateLimiter, policy_for, rate_limiter, retry_after_header
 
 logger = logging.getLogger(__name__)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, calls: int = 100, period: int = 60):
-        super().__init__(app)
-        self.calls = calls
-        self.period = period
-        self.clients: Dict[str, deque] = defaultdict(deque)
-        
-    def get_client_ip(self, request: Request) -> str:
+# Pure ASGI middleware: each layer wraps `send` to touch headers on
+# http.response.start instead of buffering the response through
+# BaseHTTPMiddleware's extra task and memory stream, so streaming bodies
+# pass straight through and a layer costs a function call per message.
+
+
+class RateLimitMiddleware:
+    """
+    Per-route GCRA limits (see app/utils/rate_limit.py). Authenticated requests
+    are keyed by user id, so students behind one campus NAT don't share a
+    budget; anonymous ones and login/signup are keyed by client IP.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    @staticmethod
+    def get_client_ip(scope: Scope, headers: Headers) -> str:
         # Check for forwarded headers first (for reverse proxy setups)
-        forwarded_for = request.headers.get("X-Forwarded-For")
+        forwarded_for = headers.get("x-forwarded-for")
         if forwarded_for:
             return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("X-Real-IP")
+
+        real_ip = headers.get("x-real-ip")
         if real_ip:
             return real_ip
-            
-        return request.client.host if request.client else "unknown"
-    
-    async def dispatch(self, request: Request, call_next):
-        client_ip = self.get_client_ip(request)
-        now = time.time()
-        
-        # Clean old entries
-        client_calls = self.clients[client_ip]
-        while client_calls and client_calls[0] <= now - self.period:
-            client_calls.popleft()
-        
-        # Check rate limit
-        if len(client_calls) >= self.calls:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
+
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def get_user_id(headers: Headers) -> Optional[str]:
+        auth = headers.get("authorization", "")
+        if not auth.lower().startswith("bearer "):
+            return None
+        payload = decode_token(auth[7:])
+        return str(payload["sub"]) if payload and "sub" in payload else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        user_id = self.get_user_id(headers)
+        policy = policy_for(scope["method"], scope["path"], authenticated=user_id is not None)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = f"user:{user_id}" if policy.per_user and user_id else f"ip:{self.get_client_ip(scope, headers)}"
+        decision = await self.limiter.hit(key, policy)
+        if not decision.allowed:
+            logger.warning(f"Rate limit '{policy.name}' exceeded for {key}")
+            response = JSONResponse(
                 status_code=429,
-                content={"detail": "Rate limit exceeded. Please try again later."}
+                content={"detail": "Rate limit exceeded. Please try again later."},
+                headers={
+                    "Retry-After": retry_after_header(decision),
+                    "X-RateLimit-Limit": str(policy.limit),
+                    "X-RateLimit-Remaining": "0",
+                },
             )
-        
-        # Add current request
-        client_calls.append(now)
-        
-        response = await call_next(request)
-        return response
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        if not request.url.path.startswith(("/docs", "/redoc", "/openapi.json")):
-            response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'self'; style-src 'self' 'unsafe-inline'"
-
-
-        
-        return response
-
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+            await response(scope, receive, send)
+            return
+
+        async def send_with_limits(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                out = MutableHeaders(scope=message)
+                out["X-RateLimit-Limit"] = str(policy.limit)
+                out["X-RateLimit-Remaining"] = str(decision.remaining)
+            await send(message)
+
+        await self.app(scope, receive, send_with_limits)
+
+
+_SECURITY_HEADERS = (
+    ("X-Content-Type-Options", "nosniff"),
+    ("X-Frame-Options", "DENY"),
+    ("X-XSS-Protection", "1; mode=block"),
+    ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+    ("Referrer-Policy", "strict-origin-when-cross-origin"),
+)
+_CSP = "default-src 'self'; script-src 'self'; style-src 'self' 'unsafe-inline'"
+
+
+class SecurityHeadersMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Swagger/ReDoc load inline scripts, so they don't get the CSP
+        with_csp = not scope["path"].startswith(("/docs", "/redoc", "/openapi.json"))
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                out = MutableHeaders(scope=message)
+                for name, value in _SECURITY_HEADERS:
+                    out[name] = value
+                if with_csp:
+                    out["Content-Security-Policy"] = _CSP
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         start_time = time.time()
-        
+        client = scope.get("client")
+
         # Log request
-        logger.info(f"Request: {request.method} {request.url.path} from {request.client.host if request.client else 'unknown'}")
-        
-        response = await call_next(request)
-        
-        # Log response
-        process_time = time.time() - start_time
-        logger.info(f"Response: {response.status_code} in {process_time:.4f}s")
-        
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
+        logger.info(f"Request: {scope['method']} {scope['path']} from {client[0] if client else 'unknown'}")
+
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Time to response headers; streamed bodies may keep going after this
+                MutableHeaders(scope=message)["X-Process-Time"] = str(time.time() - start_time)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Log response
+            process_time = time.time() - start_time
+            logger.info(f"Response: {status_code} in {process_time:.4f}s")
@@ -0,0 +1,67 @@
+import logging
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Optional
+
+import anyio
+
+from app.core.config import settings
+from app.models.user import User
+from app.utils.cache import TieredCache, get_redis
+
+logger = logging.getLogger(__name__)
+
+# user id -> principal fields; short TTL bounds staleness on workers that missed an invalidation
+principal_cache = TieredCache("principal", maxsize=settings.CACHE_MAX_ENTRIES, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated user as request handlers see it: identity and flags, no ORM session attached."""
+    id: str
+    email: str
+    is_active: bool
+    is_admin: bool
+    is_verified: bool
+    university: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin),
+            is_verified=bool(user.is_verified),
+            university=user.university,
+        )
+
+
+async def resolve_principal(user_id: str, load: Callable[[], Awaitable[Optional[User]]]) -> Optional[Principal]:
+    """Cached principal for a token subject; `load` fetches the User row on a miss."""
+    if settings.AUTH_USER_CACHE_TTL_SECONDS > 0:
+        cached = await principal_cache.get(user_id)
+        if cached is not None:
+            return Principal(**cached)
+
+    user = await load()
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    if settings.AUTH_USER_CACHE_TTL_SECONDS > 0:
+        await principal_cache.set(user_id, asdict(principal))
+    return principal
+
+
+def invalidate_principal(user_id: str) -> None:
+    """
+    Forget a cached principal after the user row changes. Called from sync
+    endpoints, which run in AnyIO worker threads, so the Redis delete is
+    handed back to the event loop.
+    """
+    principal_cache.local.delete(user_id)
+    if get_redis() is None:
+        return
+    try:
+        anyio.from_thread.run(principal_cache.delete, user_id)
+    except RuntimeError:
+        logger.warning(f"Could not clear shared principal cache for {user_id}; it expires within the TTL")
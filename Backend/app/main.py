@@ -9,9 +9,12 @@ from sqlalchemy import text
 from app.core.config import settings
 from app.core.middleware import RateLimitMiddleware, SecurityHeadersMiddleware, LoggingMiddleware
 from app.api.v1 import auth, reports, verification, listings, search, favorites, notifications, admin, ai, chat
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, async_engine
 from app.models.user import User
 from app.core.security import hash_password
+from app.services.chat_broker import chat_broker
+from app.services.chat_writer import chat_writer
+from app.services.ai_service import ai_service
 
 logging.basicConfig(
     level=logging.INFO,
@@ -39,7 +42,7 @@ def read_root():
 
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(LoggingMiddleware)
-app.add_middleware(RateLimitMiddleware, calls=100, period=60)
+app.add_middleware(RateLimitMiddleware)
 
 if settings.ENV == "production":
     app.add_middleware(
@@ -97,6 +100,28 @@ def create_single_admin():
         # Re-raising ensures the container truly exits with an error for Railway to potentially catch better
         raise e 
 
+@app.on_event("startup")
+async def start_chat_services():
+    await chat_broker.start()
+    await chat_writer.start()
+
+@app.on_event("shutdown")
+async def stop_chat_services():
+    await chat_writer.stop()
+    await chat_broker.stop()
+
+@app.on_event("startup")
+async def start_ai_client():
+    await ai_service.startup()
+
+@app.on_event("shutdown")
+async def stop_ai_client():
+    await ai_service.shutdown()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
 app.include_router(admin.router, prefix="/api/v1")
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(verification.router, prefix="/api/v1")
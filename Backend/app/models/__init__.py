@@ -6,5 +6,6 @@ from app.models.message import Message
 from app.models.verification import Verification
 from app.models.report import Report, ReportStatus
 from app.models.chat import ChatMessage,BlockedUser
+from app.models.market_stats import CategoryMarketStats
 
-__all__ = ["User","Listing","Favorite","Notification","Message","Verification","Report","ReportStatus","ChatMessage","BlockedUser"]
+__all__ = ["User","Listing","Favorite","Notification","Message","Verification","Report","ReportStatus","ChatMessage","BlockedUser","CategoryMarketStats"]
@@ -44,6 +44,14 @@ class ChatRoom(Base):
     
     __table_args__ = (UniqueConstraint('listing_id', 'participant1_id', 'participant2_id', name='uq_chat_room'),)
 
+    @classmethod
+    def for_participants(cls, listing_id: int, u1: str, u2: str):
+        """Filter matching the room for a listing between two users, in either order"""
+        return (cls.listing_id == listing_id) & (
+            ((cls.participant1_id == u1) & (cls.participant2_id == u2)) |
+            ((cls.participant1_id == u2) & (cls.participant2_id == u1))
+        )
+
 class BlockedUser(Base):
     __tablename__ = "blocked_users"
 
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import JSON, String, Integer, ForeignKey, Numeric, Text, DateTime, func
+from sqlalchemy import JSON, String, Integer, ForeignKey, Numeric, Text, DateTime, LargeBinary, func
 from datetime import datetime
 from typing import List as SAList, Optional
 from app.db.session import Base
@@ -17,6 +17,8 @@ class Listing(Base):
     price: Mapped[float] = mapped_column(Numeric(10, 2))
     images: Mapped[Optional[list[str]]] = mapped_column(JSON, nullable=True)  # store as list of URLs
     search_vector: Mapped[Optional[str]] = deferred(mapped_column(TSVECTOR, nullable=True))
+    image_hashes: Mapped[Optional[bytes]] = deferred(mapped_column(LargeBinary, nullable=True))  # packed uint64 (phash, ahash, dhash) per image
+    embedding: Mapped[Optional[bytes]] = deferred(mapped_column(LargeBinary, nullable=True))  # int8 semantic vector, SEMANTIC_DIM bytes
 
     status: Mapped[str] = mapped_column(String(20), index=True, default="ACTIVE")  # ACTIVE | SOLD | ARCHIVED
     owner_id: Mapped[str] = mapped_column(ForeignKey("users.id"), index=True)
@@ -0,0 +1,22 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import JSON, String, Integer, Numeric, DateTime, func
+from datetime import datetime
+from typing import Optional
+from app.db.session import Base
+
+
+class CategoryMarketStats(Base):
+    """
+    Per-category price statistics, maintained incrementally as listings change.
+    Percentiles come from a log-scale price histogram ({bucket: count}),
+    see app/services/market_stats_service.py for the bucket scheme.
+    """
+    __tablename__ = "category_market_stats"
+
+    category: Mapped[str] = mapped_column(String(100), primary_key=True)
+    sample_size: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    price_sum: Mapped[float] = mapped_column(Numeric(14, 2), default=0, nullable=False)
+    min_price: Mapped[Optional[float]] = mapped_column(Numeric(10, 2), nullable=True)
+    max_price: Mapped[Optional[float]] = mapped_column(Numeric(10, 2), nullable=True)
+    histogram: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -73,10 +73,11 @@ class PaginatedUsersResponse(BaseModel):
 
 class PaginatedListingsResponse(BaseModel):
     listings: List[AdminListingOut]
-    total: int
+    total: Optional[int] = None  # None when count_mode=none
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 class PaginatedReportsResponse(BaseModel):
     reports: List[AdminReportOut]
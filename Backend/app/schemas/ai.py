@@ -13,10 +13,17 @@ class PriceSuggestResponse(BaseModel):
     reasoning: str
     price_range: Optional[Dict[str, float]] = None
 
+class PriceSuggestBatchRequest(BaseModel):
+    items: List[PriceSuggestRequest]
+
+class PriceSuggestBatchResponse(BaseModel):
+    suggestions: List[PriceSuggestResponse]  # same order as items
+
 class DuplicateCheckRequest(BaseModel):
     title: str
     description: str
     category: str
+    listing_id: Optional[int] = None  # check a saved listing, including its photos
 
 class DuplicateCheckResponse(BaseModel):
     is_duplicate: bool
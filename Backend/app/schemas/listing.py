@@ -16,6 +16,32 @@ class ListingCreate(BaseModel):
         return v or []
 
 
+class UploadSpec(BaseModel):
+    filename: str
+    content_type: str
+    size: int  # bytes, as the client will send them
+
+
+class UploadPresignRequest(BaseModel):
+    files: List[UploadSpec]
+
+
+class PresignedUpload(BaseModel):
+    key: str
+    upload_url: str
+    method: str = "PUT"
+    headers: dict  # must be sent with the PUT (Content-Type is part of the signature)
+    expires_in: int
+
+
+class ListingFromUploads(BaseModel):
+    title: str
+    description: str
+    category: str
+    price: Decimal
+    image_keys: List[str] = []  # keys returned by POST /listings/uploads, in display order
+
+
 class ListingUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -9,7 +9,7 @@ class SearchFilters(BaseModel):
     max_price: Optional[float] = Field(None, ge=0, description="Maximum price")
     university: Optional[str] = Field(None, description="Filter by university")
     status: Optional[str] = Field("ACTIVE", description="Filter by status")
-    sort_by: str = Field("created_at", description="Sort field")
+    sort_by: Optional[str] = Field(None, description="Sort field (relevance, created_at, updated_at, price, title)")
     sort_order: str = Field("desc", pattern="^(asc|desc)$", description="Sort order")
 
 class AdvancedSearchFilters(BaseModel):
@@ -22,12 +22,14 @@ class AdvancedSearchFilters(BaseModel):
     exclude_sold: bool = Field(True, description="Exclude sold items")
 
 class SearchResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # None when count_mode=none
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int] = None
     has_next: bool
     has_prev: bool
+    next_cursor: Optional[str] = None
+    search_mode: Optional[str] = None  # fulltext | trigram when q is given
     results: List[dict]
 
 class SearchSuggestion(BaseModel):
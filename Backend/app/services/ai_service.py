@@ -1,7 +1,7 @@
 import asyncio
 import json
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import httpx
 from app.core.config import settings
 
@@ -18,21 +18,51 @@ class AIService:
         self.timeout = settings.AI_TIMEOUT_SECONDS
         self.max_retries = settings.AI_MAX_RETRIES
         self.retry_delay = settings.AI_RETRY_DELAY
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.AI_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.AI_POOL_KEEPALIVE_EXPIRY,
+        )
+        kwargs = dict(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=limits,
+            headers={"Content-Type": "application/json"},
+        )
+        if settings.AI_HTTP2:
+            try:
+                return httpx.AsyncClient(http2=True, **kwargs)
+            except ImportError:
+                logger.warning("HTTP/2 requested for ML service but 'h2' is not installed; using HTTP/1.1")
+        return httpx.AsyncClient(**kwargs)
+
+    async def startup(self):
+        """Open the pooled client so connections are reused across requests"""
+        if self._client is None:
+            self._client = self._build_client()
+
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Lazily create the client if used outside the app lifecycle (scripts, tests)
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
 
     async def _make_ml_request(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Make request to ML service"""
-        headers = {"Content-Type": "application/json"}
-
         for attempt in range(self.max_retries):
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        f"{self.base_url}{endpoint}",
-                        headers=headers,
-                        json=payload
-                    )
-                    response.raise_for_status()
-                    return response.json()
+                response = await self.client.post(endpoint, json=payload)
+                response.raise_for_status()
+                return response.json()
 
             except httpx.TimeoutException:
                 logger.warning(f"ML service timeout on attempt {attempt + 1}")
@@ -86,15 +116,65 @@ class AIService:
             logger.error(f"Price suggestion error: {e}")
             return {"suggested_price": None, "confidence": 0, "reasoning": f"Service error: {str(e)}"}
 
-    async def check_duplicate(self, title: str, description: str, existing_listings: List[Dict]) -> Dict[str, Any]:
-        """Check duplicates using ML model with DB context"""
+    async def suggest_prices_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Price many listings in one ML call (bulk repricing / imports).
+        Each item has the same keys as the suggest_price payload; results keep input order.
+        """
+        if not settings.AI_PRICE_SUGGEST_ENABLED or not items:
+            return [{"suggested_price": None, "confidence": 0, "reasoning": "AI price suggestion disabled"} for _ in items]
+
+        try:
+            result = await self._make_ml_request("/predict-price/batch", {"items": items})
+            return [
+                {
+                    "suggested_price": r.get("predicted_price"),
+                    "confidence": r.get("confidence", 0),
+                    "reasoning": r.get("explanation", "ML model prediction"),
+                    "price_range": r.get("price_range")
+                }
+                for r in result.get("predictions", [])
+            ]
+        except Exception as e:
+            logger.error(f"Batch price suggestion error: {e}")
+            return [{"suggested_price": None, "confidence": 0, "reasoning": f"Service error: {str(e)}"} for _ in items]
+
+    async def index_listings(self, listings: List[Dict[str, Any]]) -> None:
+        """Upsert listings ({id, title, description}) into the ML duplicate index"""
+        if not settings.AI_DUPLICATE_CHECK_ENABLED or not listings:
+            return
+        try:
+            await self._make_ml_request("/index/upsert", {"listings": listings})
+        except Exception as e:
+            logger.error(f"Duplicate index upsert error: {e}")
+
+    async def remove_from_index(self, listing_ids: List[Any]) -> None:
+        """Remove listings from the ML duplicate index"""
+        if not settings.AI_DUPLICATE_CHECK_ENABLED or not listing_ids:
+            return
+        try:
+            await self._make_ml_request("/index/delete", {"ids": listing_ids})
+        except Exception as e:
+            logger.error(f"Duplicate index delete error: {e}")
+
+    async def check_duplicate(
+        self,
+        title: str,
+        description: str,
+        existing_listings: List[Dict],
+        image_hashes: Optional[List[List[str]]] = None,
+        exclude_ids: Optional[List[Any]] = None
+    ) -> Dict[str, Any]:
+        """Check duplicates using ML model with DB context (and photo hashes when available)"""
         if not settings.AI_DUPLICATE_CHECK_ENABLED:
             return {"is_duplicate": False, "confidence": 0, "similar_listings": []}
 
         payload = {
             "title": title,
             "description": description,
-            "existing_listings": existing_listings[:10]  # Pass sample from DB
+            "existing_listings": existing_listings[:settings.AI_DUPLICATE_MAX_CANDIDATES],  # Pass sample from DB
+            "image_hashes": image_hashes or [],
+            "exclude_ids": exclude_ids or []
         }
 
         try:
@@ -117,14 +197,18 @@ class AIService:
         payload = {
             "user_id": user_preferences.get("user_id"),
             "user_preferences": user_preferences,
-            "available_listings": available_listings[:20]  # Pass real DB listings
+            # Context the ML ranker matches candidates against
+            "category": user_preferences.get("category"),
+            "condition": user_preferences.get("condition"),
+            "title": user_preferences.get("title") or user_preferences.get("query"),
+            "available_listings": available_listings[:settings.AI_RECO_MAX_CANDIDATES]  # Pass real DB listings
         }
 
         try:
             result = await self._make_ml_request("/recommend", payload)
             return {
                 "recommendations": result.get("recommendations", []),
-                "reasoning": result.get("explanation", "ML-based recommendations")
+                "reasoning": result.get("reasoning") or result.get("explanation", "ML-based recommendations")
             }
         except Exception as e:
             logger.error(f"Recommendation error: {e}")
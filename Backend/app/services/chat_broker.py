@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChatBroker:
+    """
+    Fan-out of chat events to every WebSocket in a room.
+
+    Rooms are keyed by the chat `room_id()` string. Each worker keeps its own
+    local sockets; subclasses decide how events reach the other workers.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.connections: Dict[str, List[WebSocket]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def join(self, room: str, websocket: WebSocket) -> None:
+        self.connections.setdefault(room, []).append(websocket)
+
+    async def leave(self, room: str, websocket: WebSocket) -> None:
+        conns = self.connections.get(room)
+        if conns and websocket in conns:
+            conns.remove(websocket)
+            if not conns:
+                del self.connections[room]
+
+    async def publish(self, room: str, payload: Dict[str, Any], exclude: Optional[WebSocket] = None) -> None:
+        """Send payload to every socket in the room, optionally skipping the sender's socket."""
+        await self._deliver_local(room, payload, self._socket_key(exclude))
+
+    def _socket_key(self, websocket: Optional[WebSocket]) -> Optional[str]:
+        return f"{self.worker_id}:{id(websocket)}" if websocket is not None else None
+
+    async def _deliver_local(self, room: str, payload: Dict[str, Any], exclude_key: Optional[str]) -> None:
+        for conn in list(self.connections.get(room, [])):
+            if exclude_key is not None and self._socket_key(conn) == exclude_key:
+                continue
+            if conn.application_state != WebSocketState.CONNECTED:
+                continue
+            try:
+                await conn.send_json(payload)
+            except Exception as e:
+                logger.warning(f"Dropping chat socket in room {room}: {e}")
+                await self.leave(room, conn)
+
+
+class InMemoryChatBroker(ChatBroker):
+    """Single-process broker: every socket lives on this worker."""
+
+
+class RedisChatBroker(ChatBroker):
+    """
+    Redis pub/sub broker. Each worker subscribes to the channels of the rooms it
+    has sockets for, so a message published on any worker reaches all of them.
+    """
+
+    CHANNEL_PREFIX = "chat:room:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, room: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{room}"
+
+    async def start(self) -> None:
+        import redis.asyncio as aioredis  # optional dependency, only needed for CHAT_BROKER=redis
+
+        self._redis = aioredis.Redis.from_url(self.url, decode_responses=True)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"Chat broker connected to Redis (worker {self.worker_id})")
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.aclose()
+        if self._redis:
+            await self._redis.aclose()
+
+    async def join(self, room: str, websocket: WebSocket) -> None:
+        first = room not in self.connections
+        await super().join(room, websocket)
+        if first:
+            await self._pubsub.subscribe(self._channel(room))
+
+    async def leave(self, room: str, websocket: WebSocket) -> None:
+        await super().leave(room, websocket)
+        if room not in self.connections and self._pubsub is not None:
+            await self._pubsub.unsubscribe(self._channel(room))
+
+    async def publish(self, room: str, payload: Dict[str, Any], exclude: Optional[WebSocket] = None) -> None:
+        envelope = {"payload": payload, "exclude": self._socket_key(exclude)}
+        await self._redis.publish(self._channel(room), json.dumps(envelope, default=str))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    # get_message() returns immediately when nothing is subscribed yet
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self._pubsub.get_message(timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                room = message["channel"][len(self.CHANNEL_PREFIX):]
+                envelope = json.loads(message["data"])
+                await self._deliver_local(room, envelope["payload"], envelope.get("exclude"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat broker listener error: {e}", exc_info=True)
+                await asyncio.sleep(1.0)
+
+
+def create_chat_broker() -> ChatBroker:
+    if settings.CHAT_BROKER == "redis":
+        if not settings.REDIS_URL:
+            raise RuntimeError("CHAT_BROKER=redis requires REDIS_URL")
+        return RedisChatBroker(settings.REDIS_URL)
+    return InMemoryChatBroker()
+
+
+# Singleton instance
+chat_broker = create_chat_broker()
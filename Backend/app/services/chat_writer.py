@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.chat import ChatMessage, ChatRoom
+
+logger = logging.getLogger(__name__)
+
+# Columns every queued row carries so a whole batch shares one INSERT shape
+_ROW_DEFAULTS = {
+    "reply_to_id": None,
+    "message_type": "text",
+    "message_metadata": None,
+    "edited": False,
+    "deleted": False,
+}
+
+
+class ChatMessageWriter:
+    """
+    Coalesces chat messages that arrive within a short window into one
+    multi-row INSERT ... RETURNING id and one last_message_at UPDATE per room,
+    all in a single transaction. Callers await the persisted message, so the
+    sender still gets its id back.
+    """
+
+    def __init__(self, window_ms: int = 5, max_batch: int = 200):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # Let anything already queued reach the database before shutting down
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, data: Dict[str, Any]) -> ChatMessage:
+        """Queue a message for the next batch and wait until it is committed."""
+        if self._task is None:
+            raise RuntimeError("ChatMessageWriter is not running")
+        row = {**_ROW_DEFAULTS, **data, "timestamp": datetime.now(timezone.utc)}
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush_isolating(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush_isolating(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """
+        Flush the batch; if the multi-row INSERT fails (e.g. one message replies
+        to an id that doesn't exist), retry row by row so only the offending
+        sender gets the error.
+        """
+        try:
+            await self._flush(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Chat message insert failed: {e}")
+                self._fail(batch, e)
+                return
+            logger.warning(f"Chat batch of {len(batch)} failed, retrying rows one at a time: {e}")
+
+        for item in batch:
+            try:
+                await self._flush([item])
+            except Exception as e:
+                logger.error(f"Chat message insert failed: {e}")
+                self._fail([item], e)
+
+    @staticmethod
+    def _fail(batch: List[Tuple[Dict[str, Any], asyncio.Future]], error: Exception) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        rows = [row for row, _ in batch]
+
+        # Latest timestamp per conversation
+        latest: Dict[Tuple[int, str, str], datetime] = {}
+        for row in rows:
+            key = (row["listing_id"], *sorted((row["sender_id"], row["receiver_id"])))
+            if key not in latest or row["timestamp"] > latest[key]:
+                latest[key] = row["timestamp"]
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                insert(ChatMessage).returning(ChatMessage.id, sort_by_parameter_order=True),
+                rows,
+            )
+            ids = result.scalars().all()
+
+            for (listing_id, u1, u2), ts in latest.items():
+                await db.execute(
+                    update(ChatRoom)
+                    .where(ChatRoom.for_participants(listing_id, u1, u2))
+                    .values(last_message_at=ts)
+                )
+            await db.commit()
+
+        for (row, future), msg_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(ChatMessage(id=msg_id, **row))
+
+
+# Singleton instance
+chat_writer = ChatMessageWriter(
+    window_ms=settings.CHAT_WRITE_BATCH_WINDOW_MS,
+    max_batch=settings.CHAT_WRITE_BATCH_MAX,
+)
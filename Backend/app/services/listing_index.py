@@ -0,0 +1,30 @@
+from fastapi import BackgroundTasks
+
+from app.models.listing import Listing
+from app.services.ai_service import ai_service
+from app.services.semantic_index import semantic_index
+from app.utils.image_hash import unpack_hashes
+
+
+def dup_index_entry(obj: Listing) -> dict:
+    """A listing in the ML duplicate index's /index/upsert shape."""
+    return {
+        "id": obj.id,
+        "title": obj.title,
+        "description": obj.description or "",
+        "image_hashes": unpack_hashes(obj.image_hashes),
+    }
+
+
+def sync_listing_indexes(background_tasks: BackgroundTasks, obj: Listing) -> None:
+    """
+    Only ACTIVE listings are searchable or count as duplicates: add the listing
+    to both indexes when it is (back to) ACTIVE, drop it otherwise. Call after
+    a commit that changed the status.
+    """
+    if obj.status == "ACTIVE":
+        semantic_index.upsert(obj.id, obj.embedding)
+        background_tasks.add_task(ai_service.index_listings, [dup_index_entry(obj)])
+    else:
+        semantic_index.remove(obj.id)
+        background_tasks.add_task(ai_service.remove_from_index, [obj.id])
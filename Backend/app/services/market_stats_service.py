@@ -0,0 +1,166 @@
+import logging
+import math
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.listing import Listing
+from app.models.market_stats import CategoryMarketStats
+
+logger = logging.getLogger(__name__)
+
+# Listings that count towards market prices (archived/removed ones are noise)
+TRACKED_STATUSES = ("ACTIVE", "SOLD")
+
+# Log-scale histogram: 40 buckets per decade, so each bucket spans ~6% of price.
+# Keep in sync with the backfill in alembic/versions/day7_add_category_market_stats.py
+BUCKETS_PER_DECADE = 40
+
+
+def price_bucket(price: float) -> int:
+    return int(math.floor(math.log10(max(float(price), 1.0)) * BUCKETS_PER_DECADE))
+
+
+def bucket_bounds(bucket: int) -> Tuple[float, float]:
+    return 10 ** (bucket / BUCKETS_PER_DECADE), 10 ** ((bucket + 1) / BUCKETS_PER_DECADE)
+
+
+def histogram_percentile(histogram: Dict[str, int], q: float) -> Optional[float]:
+    """Estimate the q-th percentile (0..1) by interpolating inside the log-scale bucket."""
+    total = sum(histogram.values())
+    if total <= 0:
+        return None
+    target = q * total
+    cumulative = 0
+    for bucket in sorted(histogram, key=int):
+        count = histogram[bucket]
+        if count <= 0:
+            continue
+        if cumulative + count >= target:
+            lo, hi = bucket_bounds(int(bucket))
+            fraction = (target - cumulative) / count
+            return lo * (hi / lo) ** fraction
+        cumulative += count
+    return bucket_bounds(int(max(histogram, key=int)))[1]
+
+
+class MarketStatsService:
+    @staticmethod
+    def snapshot(listing: Listing) -> Optional[Tuple[str, float]]:
+        """(category, price) a listing contributes to market stats, or None if it doesn't count"""
+        if listing.status not in TRACKED_STATUSES or listing.price is None:
+            return None
+        return listing.category, float(listing.price)
+
+    @staticmethod
+    def apply(db: Session, category: str, price: float, delta: int) -> None:
+        """Add (delta=+1) or remove (delta=-1) one price; runs inside the caller's transaction."""
+        db.execute(
+            pg_insert(CategoryMarketStats)
+            .values(category=category, sample_size=0, price_sum=0, histogram={})
+            .on_conflict_do_nothing(index_elements=["category"])
+        )
+        row = db.query(CategoryMarketStats).filter(
+            CategoryMarketStats.category == category
+        ).with_for_update().one()
+
+        bucket = str(price_bucket(price))
+        histogram = dict(row.histogram or {})
+        histogram[bucket] = histogram.get(bucket, 0) + delta
+        if histogram[bucket] <= 0:
+            del histogram[bucket]
+
+        row.histogram = histogram
+        row.sample_size = max(0, row.sample_size + delta)
+        row.price_sum = max(0.0, float(row.price_sum) + delta * price)
+        if delta > 0:
+            row.min_price = price if row.min_price is None else min(float(row.min_price), price)
+            row.max_price = price if row.max_price is None else max(float(row.max_price), price)
+        elif row.sample_size == 0:
+            row.min_price = None
+            row.max_price = None
+        # On removal min/max may now be slightly wide; the periodic rebuild tightens them.
+
+    @staticmethod
+    def on_listing_saved(db: Session, before: Optional[Tuple[str, float]], listing: Listing) -> None:
+        """Call after changing a listing (before commit) with its snapshot() from before the change"""
+        after = MarketStatsService.snapshot(listing)
+        if before == after:
+            return
+        if before is not None:
+            MarketStatsService.apply(db, before[0], before[1], -1)
+        if after is not None:
+            MarketStatsService.apply(db, after[0], after[1], +1)
+
+    @staticmethod
+    def on_listing_deleted(db: Session, listing: Listing) -> None:
+        before = MarketStatsService.snapshot(listing)
+        if before is not None:
+            MarketStatsService.apply(db, before[0], before[1], -1)
+
+    @staticmethod
+    def rebuild(db: Session, category: Optional[str] = None) -> int:
+        """Recompute stats from the listings table. Returns the number of categories written."""
+        query = db.query(Listing.category, Listing.price).filter(Listing.status.in_(TRACKED_STATUSES))
+        if category:
+            query = query.filter(Listing.category == category)
+
+        acc: Dict[str, Dict[str, Any]] = {}
+        for cat, price in query.yield_per(5000):
+            price = float(price)
+            s = acc.setdefault(cat, {"n": 0, "sum": 0.0, "min": price, "max": price, "hist": {}})
+            s["n"] += 1
+            s["sum"] += price
+            s["min"] = min(s["min"], price)
+            s["max"] = max(s["max"], price)
+            bucket = str(price_bucket(price))
+            s["hist"][bucket] = s["hist"].get(bucket, 0) + 1
+
+        stale = db.query(CategoryMarketStats)
+        if category:
+            stale = stale.filter(CategoryMarketStats.category == category)
+        stale.delete(synchronize_session=False)
+
+        for cat, s in acc.items():
+            db.add(CategoryMarketStats(
+                category=cat,
+                sample_size=s["n"],
+                price_sum=round(s["sum"], 2),
+                min_price=s["min"],
+                max_price=s["max"],
+                histogram=s["hist"],
+            ))
+        db.commit()
+        logger.info(f"Rebuilt market stats for {len(acc)} categories")
+        return len(acc)
+
+    @staticmethod
+    def get_stats(db: Session, category: str) -> Dict[str, Any]:
+        """Point lookup shaped like the ML service's MarketStats payload"""
+        row = db.query(CategoryMarketStats).filter(CategoryMarketStats.category == category).first()
+        if not row or row.sample_size <= 0:
+            return {
+                "average_price": 0.0,
+                "median_price": None,
+                "min_price": 0.0,
+                "max_price": 0.0,
+                "sample_size": 0,
+            }
+
+        lo, hi = float(row.min_price), float(row.max_price)
+
+        def pct(q: float) -> Optional[float]:
+            value = histogram_percentile(row.histogram or {}, q)
+            return round(min(max(value, lo), hi), 2) if value is not None else None
+
+        return {
+            "average_price": round(float(row.price_sum) / row.sample_size, 2),
+            "median_price": pct(0.50),
+            "min_price": lo,
+            "max_price": hi,
+            "sample_size": row.sample_size,
+            "p25_price": pct(0.25),
+            "p75_price": pct(0.75),
+            "p90_price": pct(0.90),
+        }
@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.favorite import Favorite
+from app.models.listing import Listing
+from app.models.user import User
+from app.utils.cache import TTLCache
+
+
+# Share of the candidate budget per bucket; unused slots roll over to the next bucket
+BUCKET_SHARES = (
+    ("affinity", 0.40),    # categories the user asked for or has favourited
+    ("university", 0.20),  # listed by students at the same university
+    ("popular", 0.25),     # most favourited
+    ("recent", 0.15),      # newest, so fresh items always get a chance
+)
+
+# The popular ranking is the same for everyone, so it is computed once per TTL
+# per process instead of grouping the whole favourites table on every request
+_popular_cache = TTLCache(maxsize=1, ttl=settings.AI_RECO_POPULAR_CACHE_TTL_SECONDS)
+
+
+class RecommendationCandidateService:
+    """
+    First stage of recommendations: pull a few hundred ACTIVE listings from the
+    whole catalog through a handful of cheap indexed queries, so the ML ranker
+    scores relevant items instead of only the newest ones.
+    """
+
+    @staticmethod
+    def _preferred_categories(db: Session, user: User, preferences: Dict[str, Any]) -> List[str]:
+        cats = []
+        for key in ("category", "categories"):
+            value = preferences.get(key)
+            if isinstance(value, str) and value:
+                cats.append(value)
+            elif isinstance(value, list):
+                cats.extend(str(v) for v in value if v)
+
+        favourite_cats = (
+            db.query(Listing.category, func.count(Favorite.id).label("n"))
+            .join(Favorite, Favorite.listing_id == Listing.id)
+            .filter(Favorite.user_id == user.id)
+            .group_by(Listing.category)
+            .order_by(func.count(Favorite.id).desc())
+            .limit(5)
+            .all()
+        )
+        cats.extend(c for c, _ in favourite_cats)
+        return list(dict.fromkeys(cats))
+
+    @staticmethod
+    def _popular(db: Session) -> List[Tuple[int, str]]:
+        """(listing id, owner id) of the most-favourited ACTIVE listings, best first."""
+        ranked = _popular_cache.get("popular")
+        if ranked is None:
+            # Enough for the largest request generate() makes (quota plus already chosen ids)
+            pool = 2 * settings.AI_RECO_MAX_CANDIDATES
+            rows = (
+                db.query(Listing.id, Listing.owner_id)
+                .join(Favorite, Favorite.listing_id == Listing.id)
+                .filter(Listing.status == "ACTIVE")
+                .group_by(Listing.id)
+                .order_by(func.count(Favorite.id).desc(), Listing.id.desc())
+                .limit(pool)
+                .all()
+            )
+            ranked = [(row.id, row.owner_id) for row in rows]
+            _popular_cache.set("popular", ranked)
+        return ranked
+
+    @staticmethod
+    def _bucket_ids(db: Session, bucket: str, user: User, categories: List[str], limit: int) -> List[int]:
+        base = db.query(Listing.id).filter(Listing.status == "ACTIVE", Listing.owner_id != user.id)
+
+        if bucket == "affinity":
+            if not categories:
+                return []
+            query = base.filter(Listing.category.in_(categories)).order_by(Listing.created_at.desc())
+        elif bucket == "university":
+            if not user.university:
+                return []
+            query = (
+                base.join(User, User.id == Listing.owner_id)
+                .filter(User.university == user.university)
+                .order_by(Listing.created_at.desc())
+            )
+        elif bucket == "popular":
+            ranked = RecommendationCandidateService._popular(db)
+            return [listing_id for listing_id, owner_id in ranked if owner_id != user.id][:limit]
+        else:
+            query = base.order_by(Listing.created_at.desc())
+
+        return [row.id for row in query.limit(limit).all()]
+
+    @staticmethod
+    def generate(db: Session, user: User, preferences: Optional[Dict[str, Any]] = None,
+                 limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Candidate listings shaped for the ML /recommend pool, with favourite counts as saved_count."""
+        limit = limit or settings.AI_RECO_MAX_CANDIDATES
+        categories = RecommendationCandidateService._preferred_categories(db, user, preferences or {})
+
+        chosen: List[int] = []
+        seen = set()
+        carry = 0
+        for bucket, share in BUCKET_SHARES:
+            quota = int(limit * share) + carry
+            # Over-fetch so overlap with earlier buckets doesn't leave this one short
+            ids = RecommendationCandidateService._bucket_ids(db, bucket, user, categories, quota + len(chosen))
+            added = 0
+            for listing_id in ids:
+                if added >= quota:
+                    break
+                if listing_id not in seen:
+                    seen.add(listing_id)
+                    chosen.append(listing_id)
+                    added += 1
+            carry = quota - added
+
+        if not chosen:
+            return []
+
+        saved = dict(
+            db.query(Favorite.listing_id, func.count(Favorite.id))
+            .filter(Favorite.listing_id.in_(chosen))
+            .group_by(Favorite.listing_id)
+            .all()
+        )
+        rows = {l.id: l for l in db.query(Listing).filter(Listing.id.in_(chosen)).all()}
+        return [
+            {
+                "id": rows[i].id,
+                "title": rows[i].title,
+                "description": rows[i].description or "",
+                "category": rows[i].category,
+                "price": float(rows[i].price),
+                "saved_count": saved.get(i, 0),
+            }
+            for i in chosen
+            if i in rows
+        ]
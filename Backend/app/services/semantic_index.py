@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.listing import Listing
+from app.utils.embedding import embed_texts, unpack_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Rows dequantised per matmul, bounding the float32 scratch to a few MB
+_CHUNK_ROWS = 16384
+_WATERMARK_OVERLAP = timedelta(seconds=60)
+# Row buffers start at this capacity and double when full
+_MIN_CAPACITY = 1024
+# Removed rows are only masked out; compact once they are this share of the rows (and at least _COMPACT_MIN)
+_COMPACT_FRACTION = 0.25
+_COMPACT_MIN = 1024
+
+
+class SemanticIndex:
+    """
+    In-memory int8 matrix of ACTIVE listing embeddings, searched by brute-force
+    cosine in chunks. Each worker loads the column once and then polls for rows
+    changed since its last refresh (updated_at watermark), so writes made by
+    other workers show up within SEMANTIC_REFRESH_S. Deleted listings that
+    linger in a stale index are dropped when results are read back from the DB.
+
+    Writes cost O(batch): known ids are overwritten in place, new ones are
+    appended to capacity-doubled buffers, and removals clear an alive flag.
+    Dead rows are compacted away once they pass _COMPACT_FRACTION.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        dim = settings.SEMANTIC_DIM
+        # Backing buffers (ids, int8 vectors, 1/row norm, alive flag); rows [0, _n) are in use
+        self._buf = (
+            np.empty(0, dtype=np.int64),
+            np.empty((0, dim), dtype=np.int8),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=bool),
+        )
+        self._n = 0
+        self._dead = 0
+        # The in-use slices, swapped as one tuple when rows are appended or the buffers are replaced;
+        # a search racing an in-place update may score that one row with a mix of old and new values
+        self._view = tuple(b[:0] for b in self._buf)
+        self._pos = {}
+        self._watermark: Optional[datetime] = None
+        self._checked_at = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self._pos)
+
+    # ---------- maintenance ----------
+    def _reserve(self, rows: int) -> None:
+        """Make room for `rows` rows in total, copying into buffers of double the capacity."""
+        ids, vecs = self._buf[0], self._buf[1]
+        if rows <= len(ids):
+            return
+        capacity = max(rows, 2 * len(ids), _MIN_CAPACITY)
+        grown = (
+            np.empty(capacity, dtype=np.int64),
+            np.empty((capacity, vecs.shape[1]), dtype=np.int8),
+            np.empty(capacity, dtype=np.float32),
+            np.zeros(capacity, dtype=bool),
+        )
+        for new, old in zip(grown, self._buf):
+            new[:self._n] = old[:self._n]
+        self._buf = grown
+
+    def _compact(self) -> None:
+        """Drop dead rows into fresh buffers (searches still holding the old view are unaffected)."""
+        ids, vecs, inv, alive = (b[:self._n] for b in self._buf)
+        keep = np.flatnonzero(alive)
+        n = len(keep)
+        capacity = max(2 * n, _MIN_CAPACITY)
+        compacted = (
+            np.empty(capacity, dtype=np.int64),
+            np.empty((capacity, vecs.shape[1]), dtype=np.int8),
+            np.empty(capacity, dtype=np.float32),
+            np.zeros(capacity, dtype=bool),
+        )
+        for new, old in zip(compacted, (ids, vecs, inv, alive)):
+            new[:n] = old[keep]
+        self._buf = compacted
+        self._n = n
+        self._dead = 0
+        self._pos = {int(i): p for p, i in enumerate(compacted[0][:n].tolist())}
+
+    def _apply(self, ids: List[int], vecs: np.ndarray, remove: List[int]) -> None:
+        """Drop `remove`, then overwrite known `ids` in place and append the rest; O(batch)."""
+        for listing_id in remove:
+            p = self._pos.pop(int(listing_id), None)
+            if p is not None:
+                self._buf[3][p] = False
+                self._dead += 1
+
+        if len(ids):
+            vecs = vecs.astype(np.int8)
+            norms = np.linalg.norm(vecs.astype(np.float32), axis=1)
+            inv = (1.0 / np.maximum(norms, 1e-12)).astype(np.float32)
+            latest = {int(i): r for r, i in enumerate(ids)}  # last write of an id in the batch wins
+            known = [(self._pos[i], r) for i, r in latest.items() if i in self._pos]
+            fresh = [(i, r) for i, r in latest.items() if i not in self._pos]
+
+            if known:
+                dst, src = (np.asarray(c, dtype=np.intp) for c in zip(*known))
+                self._buf[1][dst] = vecs[src]
+                self._buf[2][dst] = inv[src]
+            if fresh:
+                self._reserve(self._n + len(fresh))
+                new_ids, src = zip(*fresh)
+                src = np.asarray(src, dtype=np.intp)
+                end = self._n + len(fresh)
+                buf_ids, buf_vecs, buf_inv, buf_alive = self._buf
+                buf_ids[self._n:end] = new_ids
+                buf_vecs[self._n:end] = vecs[src]
+                buf_inv[self._n:end] = inv[src]
+                buf_alive[self._n:end] = True
+                self._pos.update((i, p) for p, i in enumerate(new_ids, start=self._n))
+                self._n = end
+
+        if self._dead >= _COMPACT_MIN and self._dead > _COMPACT_FRACTION * self._n:
+            self._compact()
+        self._view = tuple(b[:self._n] for b in self._buf)
+
+    def refresh(self, db: Session, force: bool = False) -> None:
+        """Pull listings changed since the last refresh; a full load the first time."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < settings.SEMANTIC_REFRESH_S:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < settings.SEMANTIC_REFRESH_S:
+                return
+            self._checked_at = now
+            query = db.query(Listing.id, Listing.status, Listing.embedding, Listing.updated_at)
+            if self._watermark is not None:
+                # Overlap the window so rows committed late with an older updated_at aren't missed
+                query = query.filter(Listing.updated_at > self._watermark - _WATERMARK_OVERLAP)
+            rows = query.all()
+            if not rows:
+                return
+
+            dim = settings.SEMANTIC_DIM
+            live, gone = [], []
+            for r in rows:
+                (live if r.status == "ACTIVE" and r.embedding and len(r.embedding) == dim else gone).append(r)
+            self._apply([r.id for r in live], unpack_embeddings([r.embedding for r in live]), [r.id for r in gone])
+            first_load = self._watermark is None
+            stamps = [r.updated_at for r in rows if r.updated_at is not None]
+            if stamps:
+                self._watermark = max(stamps + ([self._watermark] if self._watermark else []))
+            if first_load:
+                logger.info(f"Semantic index loaded: {self.size} listings")
+
+    def upsert(self, listing_id: int, packed: Optional[bytes]) -> None:
+        """Apply this worker's own write immediately instead of waiting for the next poll."""
+        if not packed or len(packed) != settings.SEMANTIC_DIM:
+            return self.remove(listing_id)
+        with self._lock:
+            self._apply([listing_id], unpack_embeddings([packed]), [])
+
+    def remove(self, listing_id: int) -> None:
+        with self._lock:
+            if listing_id in self._pos:
+                self._apply([], np.empty((0, settings.SEMANTIC_DIM), dtype=np.int8), [listing_id])
+
+    # ---------- search ----------
+    def search(self, db: Session, query: str, k: int, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Top-k (listing id, cosine) for a free-text query, best first."""
+        self.refresh(db)
+        ids, vecs, inv_norm, alive = self._view
+        if not len(ids) or not query.strip():
+            return []
+
+        q = embed_texts([query])[0]
+        scores = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), _CHUNK_ROWS):
+            block = vecs[start:start + _CHUNK_ROWS].astype(np.float32)
+            scores[start:start + _CHUNK_ROWS] = (block @ q) * inv_norm[start:start + _CHUNK_ROWS]
+        scores[~alive] = -np.inf
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] >= min_score]
+
+
+# Singleton instance
+semantic_index = SemanticIndex()
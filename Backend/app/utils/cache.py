@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_ws_re = re.compile(r"\s+")
+
+_redis_client = None
+
+
+def get_redis():
+    """Shared async Redis client for the cache tier, or None when CACHE_BACKEND=memory."""
+    global _redis_client
+    if settings.CACHE_BACKEND != "redis" or not settings.REDIS_URL:
+        return None
+    if _redis_client is None:
+        import redis.asyncio as aioredis  # optional dependency, only needed for CACHE_BACKEND=redis
+
+        _redis_client = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis_client
+
+
+def normalize_text(s: Optional[str]) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a key."""
+    return _ws_re.sub(" ", (s or "").lower()).strip()
+
+
+def make_key(*parts: Any) -> str:
+    """Stable short key for arbitrary JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    In-process TTLCache in front of an optional shared Redis tier.
+    Redis errors are logged and treated as misses so the cache never fails a request.
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 1024, ttl: float = 300):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.prefix}:{key}"
+
+    async def get(self, key: str) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(self._redis_key(key))
+                if raw is not None:
+                    value = json.loads(raw)
+                    self.local.set(key, value)
+                    self.hits += 1
+                    return value
+            except Exception as e:
+                logger.warning(f"Redis cache read failed for {self.prefix}: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = ttl or self.ttl
+        self.local.set(key, value, ttl)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.setex(self._redis_key(key), int(ttl), json.dumps(value, default=str))
+            except Exception as e:
+                logger.warning(f"Redis cache write failed for {self.prefix}: {e}")
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.delete(self._redis_key(key))
+            except Exception as e:
+                logger.warning(f"Redis cache delete failed for {self.prefix}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "local_entries": len(self.local),
+        }
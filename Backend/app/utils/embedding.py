@@ -0,0 +1,81 @@
+import re
+import zlib
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+# Listing embeddings are signed feature-hashed vectors over words and the
+# character n-grams inside them, so "calc" lands near "calculus" and
+# "textbok" near "textbook" without a model download or a GPU.
+_token_re = re.compile(r"[a-z0-9]+")
+_NGRAMS = (3, 4, 5)
+_TITLE_WEIGHT = 2.0  # titles say what the item is; descriptions add noise
+
+
+def _features(text: str) -> Iterable[str]:
+    for tok in _token_re.findall((text or "").lower()):
+        yield f"w:{tok}"
+        if len(tok) >= 4:
+            yield f"p:{tok[:4]}"  # crude stem: calc/calculus/calculator, textbook/textbooks
+        padded = f"<{tok}>"
+        for n in _NGRAMS:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+
+def _add_text(row: np.ndarray, text: str, weight: float, dim: int) -> None:
+    idx, sign = [], []
+    for feat in _features(text):
+        h = zlib.crc32(feat.encode())
+        idx.append(h % dim)
+        sign.append(1.0 if h & 0x80000000 else -1.0)
+    if idx:
+        np.add.at(row, np.array(idx), weight * np.array(sign, dtype=np.float32))
+
+
+def embed_texts(titles: List[str], bodies: Optional[List[str]] = None, dim: Optional[int] = None) -> np.ndarray:
+    """(n, dim) float32, L2-normalised; one row per title (+ optional body text)."""
+    dim = dim or settings.SEMANTIC_DIM
+    out = np.zeros((len(titles), dim), dtype=np.float32)
+    for i, title in enumerate(titles):
+        _add_text(out[i], title, _TITLE_WEIGHT, dim)
+        if bodies is not None:
+            _add_text(out[i], bodies[i], 1.0, dim)
+    # sublinear tf keeps long descriptions from drowning the title
+    np.copyto(out, np.sign(out) * np.log1p(np.abs(out)))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return out / np.maximum(norms, 1e-12)
+
+
+def listing_body(description: Optional[str], category: Optional[str]) -> str:
+    return f"{description or ''} {category or ''}"
+
+
+def embed_listings(listings) -> np.ndarray:
+    """Batch-embed Listing rows (or anything with title/description/category)."""
+    listings = list(listings)
+    return embed_texts(
+        [l.title or "" for l in listings],
+        [listing_body(l.description, l.category) for l in listings],
+    )
+
+
+def quantize(vecs: np.ndarray) -> np.ndarray:
+    """Symmetric per-row int8. The scale is dropped: rows are re-normalised on load, which is all cosine needs."""
+    peak = np.maximum(np.abs(vecs).max(axis=1, keepdims=True), 1e-12)
+    return np.rint(vecs / peak * 127).astype(np.int8)
+
+
+def pack_embedding(vec: np.ndarray) -> bytes:
+    """One embedding as its int8 bytes (SEMANTIC_DIM bytes per listing)."""
+    return quantize(vec.reshape(1, -1)).tobytes()
+
+
+def unpack_embeddings(blobs: List[bytes], dim: Optional[int] = None) -> np.ndarray:
+    """Packed column values -> (n, dim) int8."""
+    dim = dim or settings.SEMANTIC_DIM
+    if not blobs:
+        return np.empty((0, dim), dtype=np.int8)
+    return np.frombuffer(b"".join(blobs), dtype=np.int8).reshape(-1, dim)
@@ -0,0 +1,67 @@
+import io
+import logging
+from typing import BinaryIO, List, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Per image: (phash, ahash, dhash), each a 64-bit perceptual hash
+HASHES_PER_IMAGE = 3
+
+_N = 32
+# Orthonormal DCT-II basis, so the 2-D DCT is two small matrix products
+_k = np.arange(_N)
+_DCT = np.sqrt(2.0 / _N) * np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _N))
+_DCT[0] /= np.sqrt(2.0)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.astype(np.uint8).ravel()).view(">u8")[0])
+
+
+def _gray(img: Image.Image, w: int, h: int) -> np.ndarray:
+    return np.asarray(img.convert("L").resize((w, h), Image.LANCZOS), dtype=np.float64)
+
+
+def image_hashes(img: Image.Image) -> List[int]:
+    """[phash, ahash, dhash] of one image as unsigned 64-bit ints."""
+    px = _gray(img, _N, _N)
+    low = (_DCT @ px @ _DCT.T)[:8, :8]
+    phash = _pack(low > np.median(low))
+
+    px = _gray(img, 8, 8)
+    ahash = _pack(px > px.mean())
+
+    px = _gray(img, 9, 8)
+    dhash = _pack(px[:, 1:] > px[:, :-1])
+    return [phash, ahash, dhash]
+
+
+def hash_upload(fileobj: BinaryIO) -> Optional[List[int]]:
+    """Hash an uploaded image file, leaving its position at 0; None if it is not a readable image."""
+    try:
+        fileobj.seek(0)
+        with Image.open(io.BytesIO(fileobj.read())) as img:
+            return image_hashes(img)
+    except Exception as e:
+        logger.warning(f"Could not hash uploaded image: {e}")
+        return None
+    finally:
+        fileobj.seek(0)
+
+
+def pack_hashes(hashes: List[List[int]]) -> Optional[bytes]:
+    """Store as a packed little-endian uint64 array, 24 bytes per image."""
+    if not hashes:
+        return None
+    return np.asarray(hashes, dtype="<u8").tobytes()
+
+
+def unpack_hashes(blob: Optional[bytes]) -> List[List[str]]:
+    """Packed column -> [[phash, ahash, dhash] as 16-digit hex] per image, the ML service's wire format."""
+    if not blob:
+        return []
+    arr = np.frombuffer(blob, dtype="<u8").reshape(-1, HASHES_PER_IMAGE)
+    return [[f"{int(h):016x}" for h in row] for row in arr]
@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query, Session
+
+# Upper bound for "capped" totals; anything past this is reported as the cap
+COUNT_CAP = 10000
+
+COUNT_MODES = ("exact", "capped", "estimate", "none")
+COUNT_MODE_PATTERN = "^(exact|capped|estimate|none)$"
+
+
+def encode_cursor(ts: datetime, id_: Any) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token."""
+    raw = json.dumps({"ts": ts.isoformat(), "id": id_}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """Decode a token produced by encode_cursor, raising 400 if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["ts"]), data["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_keyset(query: Query, ts_col, id_col, cursor: Optional[str], descending: bool = True) -> Query:
+    """
+    Order by (ts_col, id_col) and, if a cursor is given, seek past it.
+    The row-value comparison lets Postgres walk a (ts, id) index instead of skipping rows.
+    """
+    if cursor:
+        ts, id_ = decode_cursor(cursor)
+        position = tuple_(ts_col, id_col)
+        query = query.filter(position < tuple_(ts, id_) if descending else position > tuple_(ts, id_))
+
+    if descending:
+        return query.order_by(ts_col.desc(), id_col.desc())
+    return query.order_by(ts_col.asc(), id_col.asc())
+
+
+def fetch_page(query: Query, page_size: int, offset: int = 0) -> Tuple[list, bool]:
+    """Fetch one page plus a lookahead row so has_next is known without counting."""
+    rows = query.offset(offset).limit(page_size + 1).all()
+    return rows[:page_size], len(rows) > page_size
+
+
+def default_count_mode(mode: Optional[str], cursor: Optional[str]) -> str:
+    """
+    An explicit mode wins. Otherwise keyset pages skip the count (the client got
+    the total with the first page) and first pages use the planner estimate.
+    """
+    if mode:
+        return mode
+    return "none" if cursor else "estimate"
+
+
+def count_total(db: Session, query: Query, mode: str = "exact") -> Optional[int]:
+    """
+    Total rows for a filtered query.
+      exact    -> SELECT count(*) over the full result
+      capped   -> count stops at COUNT_CAP rows
+      estimate -> the planner's row estimate (no scan at all)
+      none     -> skip counting
+    """
+    if mode == "none":
+        return None
+
+    query = query.order_by(None)
+    if mode == "capped":
+        return query.limit(COUNT_CAP).count()
+    if mode == "estimate":
+        return estimate_count(db, query)
+    return query.count()
+
+
+def estimate_count(db: Session, query: Query) -> int:
+    """Ask the planner how many rows the query would return (EXPLAIN, not executed)."""
+    compiled = query.enable_eagerloads(False).statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
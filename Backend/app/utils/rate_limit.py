@@ -0,0 +1,154 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    """`limit` requests per `period` seconds per key, allowing the whole limit as a burst."""
+    name: str
+    limit: int
+    period: float
+    per_user: bool = True  # key authenticated requests by user id instead of IP
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.limit
+
+
+@dataclass(frozen=True)
+class RateDecision:
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed (0 when allowed)
+
+
+# First match wins; (method or None, path prefix, policy)
+ROUTE_POLICIES = (
+    ("POST", "/api/v1/auth/login", RatePolicy("login", 10, 60, per_user=False)),
+    ("POST", "/api/v1/auth/signup", RatePolicy("signup", 5, 300, per_user=False)),
+    (None, "/api/v1/verification/", RatePolicy("verification", 10, 60)),
+    (None, "/api/v1/ai/", RatePolicy("ai", settings.RATE_LIMIT_AI_PER_MINUTE, 60)),
+    ("POST", "/api/v1/listings", RatePolicy("listing_write", 20, 60)),
+)
+DEFAULT_USER_POLICY = RatePolicy("default", settings.RATE_LIMIT_USER_PER_MINUTE, 60)
+DEFAULT_IP_POLICY = RatePolicy("default", settings.RATE_LIMIT_IP_PER_MINUTE, 60, per_user=False)
+
+EXEMPT_PATHS = ("/healthz", "/health/detailed", "/docs", "/redoc", "/openapi.json")
+
+
+def policy_for(method: str, path: str, authenticated: bool) -> Optional[RatePolicy]:
+    if path.startswith(EXEMPT_PATHS):
+        return None
+    for route_method, prefix, policy in ROUTE_POLICIES:
+        if (route_method is None or route_method == method) and path.startswith(prefix):
+            return policy
+    return DEFAULT_USER_POLICY if authenticated else DEFAULT_IP_POLICY
+
+
+def _gcra(tat: float, now: float, policy: RatePolicy) -> Tuple[RateDecision, Optional[float]]:
+    """
+    Generic cell rate algorithm: the whole state per key is one theoretical
+    arrival time (TAT). Returns the decision and the new TAT (None if denied).
+    """
+    interval = policy.interval
+    new_tat = max(tat, now) + interval
+    allow_at = new_tat - policy.limit * interval
+    if now < allow_at:
+        return RateDecision(False, 0, allow_at - now), None
+    remaining = int((now - allow_at) / interval)
+    return RateDecision(True, remaining, 0.0), new_tat
+
+
+class LocalRateLimiter:
+    """Per-process GCRA over a bounded LRU of keys; least recently seen keys are evicted first."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def hit(self, key: str, policy: RatePolicy, now: Optional[float] = None) -> RateDecision:
+        now = time.monotonic() if now is None else now
+        decision, new_tat = _gcra(self._tats.get(key, 0.0), now, policy)
+        if new_tat is not None:
+            self._tats[key] = new_tat
+        if key in self._tats:
+            self._tats.move_to_end(key)
+        while len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+        return decision
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+# Same GCRA as _gcra, atomically in Redis using the server clock so workers agree
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - limit * interval
+if now < allow_at then
+  return {0, 0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, math.floor((now - allow_at) / interval), '0'}
+"""
+
+
+class RateLimiter:
+    """
+    GCRA limiter with O(1) state per key. With RATE_LIMIT_BACKEND=redis the
+    state lives in Redis (shared by every worker, expiring on its own); if
+    Redis errors, requests fall back to the local limiter instead of failing.
+    """
+
+    def __init__(self):
+        self.local = LocalRateLimiter(settings.RATE_LIMIT_MAX_KEYS)
+        self._redis = None
+        self._script = None
+        self._redis_down_until = 0.0
+
+    def _get_redis(self):
+        if settings.RATE_LIMIT_BACKEND != "redis" or not settings.REDIS_URL:
+            return None
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            import redis.asyncio as aioredis  # optional dependency, only needed for RATE_LIMIT_BACKEND=redis
+
+            self._redis = aioredis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.1, socket_connect_timeout=0.1)
+            self._script = self._redis.register_script(_GCRA_LUA)
+        return self._redis
+
+    async def hit(self, key: str, policy: RatePolicy) -> RateDecision:
+        if self._get_redis() is not None:
+            try:
+                allowed, remaining, retry_after = await self._script(
+                    keys=[f"rl:{policy.name}:{key}"], args=[policy.interval, policy.limit]
+                )
+                return RateDecision(bool(allowed), int(remaining), float(retry_after))
+            except Exception as e:
+                # Back off for a few seconds rather than paying a timeout on every request
+                self._redis_down_until = time.monotonic() + 5
+                logger.warning(f"Redis rate limiter unavailable, using per-process limits: {e}")
+        return self.local.hit(f"{policy.name}:{key}", policy)
+
+
+def retry_after_header(decision: RateDecision) -> str:
+    return str(max(1, math.ceil(decision.retry_after)))
+
+
+# Singleton instance
+rate_limiter = RateLimiter()
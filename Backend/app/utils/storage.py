@@ -1,15 +1,27 @@
+import asyncio
+import logging
 import os
+import shutil
 import uuid
-from typing import Tuple
-from fastapi import UploadFile
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, BinaryIO, List, Optional, Tuple
+import jwt
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
 import boto3  # type: ignore
 from botocore.config import Config  # type: ignore
+from botocore.exceptions import ClientError  # type: ignore
+
+logger = logging.getLogger(__name__)
 
 
 def gen_object_key(prefix: str, filename: str) -> str:
     """Generate a unique object key for storage."""
     ext = (filename.rsplit(".", 1)[-1] if "." in filename else "bin").lower()
+    if not ext.isalnum() or len(ext) > 8:
+        ext = "bin"  # client-supplied; never let it carry path characters into the key
     return f"{prefix}/{uuid.uuid4()}.{ext}"
 
 
@@ -23,8 +35,9 @@ def public_url_for_key(key: str) -> str:
     return f"/uploads/{key}"
 
 
+@lru_cache(maxsize=1)
 def get_s3_client():
-    """Return a configured boto3 S3 client."""
+    """Return a configured boto3 S3 client (shared: boto3 clients are thread-safe)."""
     return boto3.client(
         "s3",
         region_name=settings.S3_REGION,
@@ -34,46 +47,83 @@ def get_s3_client():
     )
 
 
-def save_upload(file: UploadFile, subdir: str = "uploads") -> str:
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large (max {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB)",
+    )
+
+
+class _LimitedReader:
+    """File wrapper that refuses to read past `limit` bytes, so oversize uploads stop mid-stream."""
+
+    def __init__(self, fileobj: BinaryIO, limit: int):
+        self._f = fileobj
+        self._left = limit
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = settings.UPLOAD_CHUNK_BYTES
+        chunk = self._f.read(min(size, self._left + 1))
+        self._left -= len(chunk)
+        if self._left < 0:
+            raise _too_large()
+        return chunk
+
+
+def _local_path(key: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR or "./uploads", key)
+
+
+def _store(file: UploadFile, subdir: str) -> str:
     """
-    Save a file either to local storage or S3 depending on STORAGE_BACKEND.
-    Returns the public URL of the stored file.
+    Blocking: stream one upload to local disk or S3 in UPLOAD_CHUNK_BYTES pieces
+    and return its key. Call from a worker thread (see store_upload).
     """
-    key = gen_object_key(subdir, file.filename)
-
-    print(f"[DEBUG] Saving file: {file.filename}")
-    print(f"[DEBUG] Generated key: {key}")
-    print(f"[DEBUG] Storage backend: {settings.STORAGE_BACKEND}")
+    if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+        raise _too_large()
+    key = gen_object_key(subdir, file.filename or "")
+    file.file.seek(0)
+    src = _LimitedReader(file.file, settings.UPLOAD_MAX_BYTES)
 
     if settings.STORAGE_BACKEND == "S3":
-        s3 = get_s3_client()
-        s3.upload_fileobj(file.file, settings.S3_BUCKET, key)
-        print(f"[DEBUG] Uploaded to S3: {key}")
+        extra = {"ContentType": file.content_type} if file.content_type else None
+        get_s3_client().upload_fileobj(src, settings.S3_BUCKET, key, ExtraArgs=extra)
     else:
-        base = settings.UPLOAD_DIR or "./uploads"
-        abs_path = os.path.join(base, key)
-        print(f"[DEBUG] Upload directory: {base}")
-        print(f"[DEBUG] Full file path: {abs_path}")
-        
-        dir_path = os.path.dirname(abs_path)
-        print(f"[DEBUG] Creating directory: {dir_path}")
-        os.makedirs(dir_path, exist_ok=True)
-        
-        file.file.seek(0)
-        content = file.file.read()
-        print(f"[DEBUG] File size: {len(content)} bytes")
-        
-        with open(abs_path, "wb") as f:
-            f.write(content)
-        
-        if os.path.exists(abs_path):
-            print(f"[DEBUG] File successfully saved to: {abs_path}")
+        abs_path = _local_path(key)
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        # Write under a temporary name so a rejected or failed upload never leaves a partial file behind
+        tmp_path = abs_path + ".part"
+        try:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(src, f, settings.UPLOAD_CHUNK_BYTES)
+            os.replace(tmp_path, abs_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    logger.debug(f"Stored upload {file.filename!r} as {key}")
+    return key
+
+
+def delete_key(key: str) -> None:
+    """Best-effort removal of a stored object."""
+    try:
+        if settings.STORAGE_BACKEND == "S3":
+            get_s3_client().delete_object(Bucket=settings.S3_BUCKET, Key=key)
         else:
-            print(f"[DEBUG] ERROR: File was not saved to: {abs_path}")
+            os.remove(_local_path(key))
+    except Exception as e:
+        logger.warning(f"Could not delete stored upload {key}: {e}")
+
 
-    public_url = public_url_for_key(key)
-    print(f"[DEBUG] Public URL: {public_url}")
-    return public_url
+def save_upload(file: UploadFile, subdir: str = "uploads") -> str:
+    """
+    Save a file either to local storage or S3 depending on STORAGE_BACKEND.
+    Returns the public URL of the stored file. Blocking; from async code use store_upload.
+    """
+    return public_url_for_key(_store(file, subdir))
 
 
 def save_upload_with_key(file: UploadFile, subdir: str = "uploads") -> Tuple[str, str]:
@@ -81,19 +131,35 @@ def save_upload_with_key(file: UploadFile, subdir: str = "uploads") -> Tuple[str
     Save file and return both (key, public_url).
     Useful if you need to store the key in DB for later S3 operations.
     """
-    key = gen_object_key(subdir, file.filename)
+    key = _store(file, subdir)
+    return key, public_url_for_key(key)
 
-    if settings.STORAGE_BACKEND == "S3":
-        s3 = get_s3_client()
-        s3.upload_fileobj(file.file, settings.S3_BUCKET, key)
-    else:
-        base = settings.UPLOAD_DIR or "./uploads"
-        abs_path = os.path.join(base, key)
-        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-        with open(abs_path, "wb") as f:
-            f.write(file.file.read())
 
-    return key, public_url_for_key(key)
+async def store_upload(file: UploadFile, subdir: str = "uploads") -> str:
+    """save_upload off the event loop: the copy runs in the thread pool."""
+    return public_url_for_key(await run_in_threadpool(_store, file, subdir))
+
+
+async def store_uploads(files: List[UploadFile], subdir: str = "uploads") -> List[str]:
+    """
+    Store several uploads concurrently (at most UPLOAD_CONCURRENCY at a time)
+    and return their public URLs in input order. If any file fails, the ones
+    already stored are deleted and the error is re-raised.
+    """
+    sem = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+
+    async def one(f: UploadFile) -> str:
+        async with sem:
+            return await run_in_threadpool(_store, f, subdir)
+
+    results = await asyncio.gather(*(one(f) for f in files), return_exceptions=True)
+    failure = next((r for r in results if isinstance(r, BaseException)), None)
+    if failure is not None:
+        stored = [r for r in results if isinstance(r, str)]
+        if stored:
+            await run_in_threadpool(lambda: [delete_key(k) for k in stored])
+        raise failure
+    return [public_url_for_key(k) for k in results]
 
 
 def create_presigned_put(key: str, content_type: str, expires: int = 3600) -> str:
@@ -104,3 +170,86 @@ def create_presigned_put(key: str, content_type: str, expires: int = 3600) -> st
         Params={"Bucket": settings.S3_BUCKET, "Key": key, "ContentType": content_type},
         ExpiresIn=expires,
     )
+
+
+# -------- Direct uploads (client PUTs bytes straight to storage) --------
+LOCAL_UPLOAD_PATH = "/api/v1/listings/uploads/local"
+# Audience of LOCAL upload tokens: they share JWT_SECRET with login tokens, and
+# the claim keeps either kind from being accepted as the other
+UPLOAD_TOKEN_AUDIENCE = "listing-upload"
+
+
+def presigned_upload_url(key: str, content_type: str, expires: Optional[int] = None) -> str:
+    """
+    URL the client PUTs the file body to. On S3 a presigned PUT; on LOCAL a
+    signed token for the API's stand-in endpoint (see receive_local_upload).
+    """
+    expires = expires or settings.UPLOAD_URL_TTL_SECONDS
+    if settings.STORAGE_BACKEND == "S3":
+        return create_presigned_put(key, content_type, expires)
+    payload = {
+        "upl": key,
+        "ct": content_type,
+        "aud": UPLOAD_TOKEN_AUDIENCE,
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=expires),
+    }
+    token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    return f"{LOCAL_UPLOAD_PATH}/{token}"
+
+
+def decode_local_upload_token(token: str) -> Optional[str]:
+    """Object key a LOCAL upload token grants a PUT to, or None if invalid/expired."""
+    try:
+        payload = jwt.decode(
+            token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM], audience=UPLOAD_TOKEN_AUDIENCE,
+        )
+    except Exception:
+        return None
+    return payload.get("upl")
+
+
+async def receive_local_upload(key: str, chunks: AsyncIterator[bytes]) -> int:
+    """Stream a request body to `key` on local disk, enforcing UPLOAD_MAX_BYTES; returns bytes written."""
+    abs_path = _local_path(key)
+    tmp_path = abs_path + ".part"
+    await run_in_threadpool(os.makedirs, os.path.dirname(abs_path), exist_ok=True)
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    written = 0
+    try:
+        async for chunk in chunks:
+            written += len(chunk)
+            if written > settings.UPLOAD_MAX_BYTES:
+                raise _too_large()
+            if chunk:
+                await run_in_threadpool(f.write, chunk)
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(os.replace, tmp_path, abs_path)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def stat_key(key: str) -> Optional[int]:
+    """Size in bytes of a stored object, or None if it does not exist."""
+    if settings.STORAGE_BACKEND == "S3":
+        try:
+            return int(get_s3_client().head_object(Bucket=settings.S3_BUCKET, Key=key)["ContentLength"])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+    try:
+        return os.path.getsize(_local_path(key))
+    except FileNotFoundError:
+        return None
+
+
+def read_key(key: str) -> bytes:
+    """Whole object body (for post-processing small files such as listing images)."""
+    if settings.STORAGE_BACKEND == "S3":
+        return get_s3_client().get_object(Bucket=settings.S3_BUCKET, Key=key)["Body"].read()
+    with open(_local_path(key), "rb") as f:
+        return f.read()
@@ -0,0 +1,171 @@
+"""
+Micro-benchmark for the HTTP middleware stack: the pure ASGI classes in
+app/core/middleware.py against the BaseHTTPMiddleware versions they replaced,
+on a trivial JSON endpoint shaped like /notifications/unread-count.
+
+Requests are driven straight through the ASGI interface (no sockets, no HTTP
+client) so the numbers are per-request middleware + routing overhead only.
+Rate limiting runs with a huge limit so every request takes the allowed path.
+
+Usage: python scripts/bench_middleware.py [requests]
+"""
+import sys
+import os
+import asyncio
+import logging
+import time
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core import middleware as asgi_middleware
+from app.core.config import settings
+from app.utils.rate_limit import RatePolicy, RateLimiter, retry_after_header
+
+
+# ---------- the BaseHTTPMiddleware stack, as it was before the rewrite ----------
+class OldRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, limiter=None):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        user_id = asgi_middleware.RateLimitMiddleware.get_user_id(request.headers)
+        policy = asgi_middleware.policy_for(request.method, request.url.path, authenticated=user_id is not None)
+        if policy is None:
+            return await call_next(request)
+        ip = request.headers.get("x-forwarded-for") or (request.client.host if request.client else "unknown")
+        key = f"user:{user_id}" if policy.per_user and user_id else f"ip:{ip}"
+        decision = await self.limiter.hit(key, policy)
+        if not decision.allowed:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded. Please try again later."},
+                headers={"Retry-After": retry_after_header(decision)},
+            )
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(policy.limit)
+        response.headers["X-RateLimit-Remaining"] = str(decision.remaining)
+        return response
+
+
+class OldSecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for name, value in asgi_middleware._SECURITY_HEADERS:
+            response.headers[name] = value
+        if not request.url.path.startswith(("/docs", "/redoc", "/openapi.json")):
+            response.headers["Content-Security-Policy"] = asgi_middleware._CSP
+        return response
+
+
+class OldLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        asgi_middleware.logger.info(f"Request: {request.method} {request.url.path}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        asgi_middleware.logger.info(f"Response: {response.status_code} in {process_time:.4f}s")
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+# ---------- harness ----------
+def _limiter() -> RateLimiter:
+    limiter = RateLimiter()
+    limiter._get_redis = lambda: None  # local GCRA only; Redis latency isn't what's measured
+    return limiter
+
+
+def build_app(stack) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/notifications/unread-count")
+    def unread_count():
+        return {"count": 3}
+
+    rate_limit, security, logging_mw = stack
+    # Same order as app/main.py
+    app.add_middleware(security)
+    app.add_middleware(logging_mw)
+    app.add_middleware(rate_limit, limiter=_limiter())
+    return app
+
+
+_SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/api/v1/notifications/unread-count",
+    "raw_path": b"/api/v1/notifications/unread-count",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"host", b"bench"), (b"x-forwarded-for", b"10.0.0.1")],
+    "client": ("10.0.0.1", 50000),
+    "server": ("bench", 80),
+}
+
+
+async def _request(app) -> int:
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(_SCOPE), receive, send)
+    return status
+
+
+async def _run(app, n: int) -> float:
+    for _ in range(min(n, 500)):  # warm-up: route compile, lazy imports
+        assert await _request(app) == 200
+    start = time.perf_counter()
+    for _ in range(n):
+        await _request(app)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench(n: int = 20000) -> None:
+    settings.RATE_LIMIT_ENABLED = True
+    logging.getLogger(asgi_middleware.__name__).setLevel(logging.WARNING)
+    # one policy for every request, high enough never to deny
+    policy = RatePolicy("bench", 10**9, 60, per_user=False)
+    asgi_middleware.policy_for = lambda *args, **kwargs: policy
+
+    stacks = {
+        "none": None,
+        "BaseHTTPMiddleware": (OldRateLimitMiddleware, OldSecurityHeadersMiddleware, OldLoggingMiddleware),
+        "pure ASGI": (
+            asgi_middleware.RateLimitMiddleware,
+            asgi_middleware.SecurityHeadersMiddleware,
+            asgi_middleware.LoggingMiddleware,
+        ),
+    }
+    results = {}
+    for name, stack in stacks.items():
+        if stack is None:
+            app = FastAPI()
+            app.get("/api/v1/notifications/unread-count")(lambda: {"count": 3})
+        else:
+            app = build_app(stack)
+        results[name] = asyncio.run(_run(app, n))
+
+    base = results["none"]
+    print(f"{n} requests per stack")
+    for name, us in results.items():
+        print(f"  {name:<20} {us:8.1f} us/request  (+{us - base:.1f} us middleware)")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,63 @@
+"""
+Script to (re)compute semantic search embeddings for every listing, in batches.
+Run after the day10 migration, or after changing SEMANTIC_DIM, then restart
+the API so each worker reloads its in-memory index.
+
+Usage: python scripts/rebuild_embeddings.py [batch_size]
+"""
+import sys
+import os
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, update
+
+from app.db.session import SessionLocal
+from app.models.listing import Listing
+from app.utils.embedding import embed_listings, quantize
+
+
+listings = Listing.__table__
+# updated_at = updated_at suppresses onupdate: an embedding refresh is not a user-visible edit
+_set_embedding = (
+    update(listings)
+    .where(listings.c.id == bindparam("b_id"))
+    .values(embedding=bindparam("b_embedding"), updated_at=listings.c.updated_at)
+)
+
+
+def rebuild_embeddings(batch_size=500):
+    db = SessionLocal()
+    try:
+        last_id, total = 0, 0
+        while True:
+            batch = (
+                db.query(Listing.id, Listing.title, Listing.description, Listing.category)
+                .filter(Listing.id > last_id)
+                .order_by(Listing.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+            packed = quantize(embed_listings(batch))
+            db.execute(
+                _set_embedding,
+                [{"b_id": row.id, "b_embedding": vec.tobytes()} for row, vec in zip(batch, packed)],
+            )
+            db.commit()
+            last_id = batch[-1].id
+            total += len(batch)
+            print(f"Embedded {total} listings")
+        print(f"Done: {total} listings embedded")
+    except Exception as e:
+        print(f"Error: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_embeddings(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
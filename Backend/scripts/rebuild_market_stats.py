@@ -0,0 +1,32 @@
+"""
+Script to fully rebuild category_market_stats from the listings table.
+Incremental updates keep it current; run this periodically (e.g. nightly) to
+tighten min/max after removals and to repair any drift.
+
+Usage: python scripts/rebuild_market_stats.py [category]
+"""
+import sys
+import os
+
+# Add the parent directory to the path so we can import our models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.session import SessionLocal
+from app.services.market_stats_service import MarketStatsService
+
+
+def rebuild_market_stats(category=None):
+    db = SessionLocal()
+    try:
+        count = MarketStatsService.rebuild(db, category)
+        print(f"Rebuilt market stats for {count} categories")
+    except Exception as e:
+        print(f"Error: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_market_stats(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.api.v1 import ai
+from app.core.config import settings
+from app.main import app
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    seen = {}
+
+    def generate(db, user, preferences):
+        seen["candidates"] = preferences
+        return []
+
+    async def recommend_listings(user_preferences, available_listings):
+        seen["ml"] = user_preferences
+        return {"recommendations": [], "reasoning": "ok"}
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(settings, "AI_RECOMMEND_ENABLED", True)
+    monkeypatch.setattr(ai.RecommendationCandidateService, "generate", staticmethod(generate))
+    monkeypatch.setattr(ai.ai_service, "recommend_listings", recommend_listings)
+    # Restore rather than clear: conftest installs a global get_db override
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[deps.get_current_user] = lambda: SimpleNamespace(id="me")
+    app.dependency_overrides[deps.get_db] = lambda: None
+    yield seen
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
+
+
+def test_client_cannot_pick_another_users_recommendations(captured):
+    response = TestClient(app).post(
+        "/api/v1/ai/recommend",
+        json={"user_preferences": {"user_id": "victim", "categories": ["Books"]}},
+    )
+    assert response.status_code == 200
+    assert captured["candidates"] == {"categories": ["Books"], "user_id": "me"}
+    assert captured["ml"]["user_id"] == "me"
@@ -0,0 +1,87 @@
+import time
+
+import fakeredis.aioredis
+import pytest
+
+from app.utils import cache
+from app.utils.cache import TieredCache, TTLCache, make_key, normalize_text
+
+
+class TestTTLCache:
+    def test_entries_expire(self):
+        c = TTLCache(ttl=0.05)
+        c.set("k", 1)
+        assert c.get("k") == 1
+        time.sleep(0.08)
+        assert c.get("k") is None
+        assert len(c) == 0
+
+    def test_per_entry_ttl_overrides_default(self):
+        c = TTLCache(ttl=60)
+        c.set("short", 1, ttl=0.05)
+        c.set("long", 2)
+        time.sleep(0.08)
+        assert c.get("short") is None
+        assert c.get("long") == 2
+
+    def test_least_recently_used_is_evicted(self):
+        c = TTLCache(maxsize=2)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")
+        c.set("c", 3)
+        assert c.get("a") == 1
+        assert c.get("b") is None
+        assert c.get("c") == 3
+
+
+class TestKeys:
+    def test_trivially_different_inputs_share_a_key(self):
+        assert make_key(normalize_text("  Casio  FX-991 "), "Books") == make_key(normalize_text("casio fx-991"), "Books")
+
+    def test_order_of_dict_keys_does_not_matter(self):
+        assert make_key({"a": 1, "b": 2}) == make_key({"b": 2, "a": 1})
+
+
+class FailingRedis:
+    async def get(self, key):
+        raise ConnectionError("down")
+
+    async def setex(self, key, ttl, value):
+        raise ConnectionError("down")
+
+    async def delete(self, key):
+        raise ConnectionError("down")
+
+
+class TestTieredCache:
+    @pytest.mark.asyncio
+    async def test_memory_only(self, monkeypatch):
+        monkeypatch.setattr(cache, "get_redis", lambda: None)
+        c = TieredCache("t")
+        assert await c.get("k") is None
+        await c.set("k", {"price": 10})
+        assert await c.get("k") == {"price": 10}
+        await c.delete("k")
+        assert await c.get("k") is None
+        assert c.stats()["hits"] == 1 and c.stats()["misses"] == 2
+
+    @pytest.mark.asyncio
+    async def test_redis_tier_is_shared_between_workers(self, monkeypatch):
+        redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        monkeypatch.setattr(cache, "get_redis", lambda: redis)
+        worker_a, worker_b = TieredCache("t"), TieredCache("t")
+
+        await worker_a.set("k", {"price": 10})
+        assert await worker_b.get("k") == {"price": 10}
+        assert len(worker_b.local) == 1  # read-through fills the local tier
+        assert 0 < await redis.ttl("cache:t:k") <= 300
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_are_misses_not_failures(self, monkeypatch):
+        monkeypatch.setattr(cache, "get_redis", lambda: FailingRedis())
+        c = TieredCache("t")
+        assert await c.get("k") is None
+        await c.set("k", 1)
+        assert await c.get("k") == 1  # still served from the local tier
+        await c.delete("k")
@@ -0,0 +1,110 @@
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.services.chat_broker import InMemoryChatBroker, RedisChatBroker
+
+
+class FakeSocket:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send_json(self, payload):
+        if self.fail:
+            raise RuntimeError("socket closed")
+        self.sent.append(payload)
+
+
+class TestInMemoryBroker:
+    @pytest.mark.asyncio
+    async def test_fan_out_skips_sender(self):
+        broker = InMemoryChatBroker()
+        sender, peer, other_room = FakeSocket(), FakeSocket(), FakeSocket()
+        await broker.join("r1", sender)
+        await broker.join("r1", peer)
+        await broker.join("r2", other_room)
+
+        await broker.publish("r1", {"typing": True}, exclude=sender)
+        await broker.publish("r1", {"content": "hi"})
+
+        assert sender.sent == [{"content": "hi"}]
+        assert peer.sent == [{"typing": True}, {"content": "hi"}]
+        assert other_room.sent == []
+
+    @pytest.mark.asyncio
+    async def test_failed_socket_is_dropped(self):
+        broker = InMemoryChatBroker()
+        dead, alive = FakeSocket(fail=True), FakeSocket()
+        await broker.join("r1", dead)
+        await broker.join("r1", alive)
+
+        await broker.publish("r1", {"content": "hi"})
+
+        assert broker.connections["r1"] == [alive]
+        assert alive.sent == [{"content": "hi"}]
+
+    @pytest.mark.asyncio
+    async def test_empty_room_is_removed(self):
+        broker = InMemoryChatBroker()
+        socket = FakeSocket()
+        await broker.join("r1", socket)
+        await broker.leave("r1", socket)
+        await broker.leave("r1", socket)  # leaving twice is harmless
+        assert "r1" not in broker.connections
+
+
+async def _start_on(broker: RedisChatBroker, server) -> None:
+    # RedisChatBroker.start() with the connection swapped for an in-memory server
+    broker._redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    broker._pubsub = broker._redis.pubsub(ignore_subscribe_messages=True)
+    broker._listener = asyncio.create_task(broker._listen())
+
+
+async def _until(condition, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+class TestRedisBroker:
+    @pytest.mark.asyncio
+    async def test_publish_reaches_sockets_on_other_workers(self):
+        server = fakeredis.FakeServer()
+        a, b = RedisChatBroker("redis://fake"), RedisChatBroker("redis://fake")
+        await _start_on(a, server)
+        await _start_on(b, server)
+        try:
+            sender, peer = FakeSocket(), FakeSocket()
+            await a.join("r1", sender)
+            await b.join("r1", peer)
+
+            await a.publish("r1", {"content": "hi"}, exclude=sender)
+            await _until(lambda: peer.sent)
+
+            assert peer.sent == [{"content": "hi"}]
+            await asyncio.sleep(0.1)
+            assert sender.sent == []
+        finally:
+            await a.stop()
+            await b.stop()
+
+    @pytest.mark.asyncio
+    async def test_last_leave_unsubscribes(self):
+        broker = RedisChatBroker("redis://fake")
+        await _start_on(broker, fakeredis.FakeServer())
+        try:
+            socket = FakeSocket()
+            await broker.join("r1", socket)
+            assert broker._pubsub.subscribed
+            await broker.leave("r1", socket)
+            assert "r1" not in broker.connections
+            # confirmed once the listener reads the unsubscribe reply
+            await _until(lambda: not broker._pubsub.channels)
+        finally:
+            await broker.stop()
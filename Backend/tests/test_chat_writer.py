@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.services.chat_writer import ChatMessageWriter
+
+
+class BadReplyError(Exception):
+    pass
+
+
+class FakeWriter(ChatMessageWriter):
+    """Writer whose flush fails like a FK violation when any row replies to a missing message"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.flushes = []
+        self.next_id = 1
+
+    async def _flush(self, batch):
+        self.flushes.append(len(batch))
+        if any(row["reply_to_id"] == 999 for row, _ in batch):
+            raise BadReplyError("reply_to_id 999 does not exist")
+        for row, future in batch:
+            future.set_result({"id": self.next_id, **row})
+            self.next_id += 1
+
+
+def _message(sender, **extra):
+    return {"listing_id": 1, "sender_id": sender, "receiver_id": "peer", "content": "hi", **extra}
+
+
+@pytest.mark.asyncio
+async def test_messages_in_one_window_share_a_flush():
+    writer = FakeWriter(window_ms=50)
+    await writer.start()
+    try:
+        results = await asyncio.gather(*(writer.submit(_message(f"u{i}")) for i in range(3)))
+    finally:
+        await writer.stop()
+    assert writer.flushes == [3]
+    assert [r["sender_id"] for r in results] == ["u0", "u1", "u2"]
+
+
+@pytest.mark.asyncio
+async def test_bad_row_only_fails_its_own_sender():
+    writer = FakeWriter(window_ms=50)
+    await writer.start()
+    try:
+        results = await asyncio.gather(
+            writer.submit(_message("a")),
+            writer.submit(_message("b", reply_to_id=999)),
+            writer.submit(_message("c")),
+            return_exceptions=True,
+        )
+    finally:
+        await writer.stop()
+
+    assert results[0]["sender_id"] == "a"
+    assert isinstance(results[1], BadReplyError)
+    assert results[2]["sender_id"] == "c"
+    # one failed batch insert, then one retry per row
+    assert writer.flushes == [3, 1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_writer_keeps_running_after_a_failure():
+    writer = FakeWriter(window_ms=5)
+    await writer.start()
+    try:
+        with pytest.raises(BadReplyError):
+            await writer.submit(_message("a", reply_to_id=999))
+        ok = await writer.submit(_message("b"))
+    finally:
+        await writer.stop()
+    assert ok["sender_id"] == "b"
@@ -0,0 +1,63 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_hash import hash_upload, image_hashes, pack_hashes, unpack_hashes
+
+
+def _image(seed: int = 0, size: int = 128) -> Image.Image:
+    # Smooth gradient plus blobs, so the low frequencies phash looks at are distinct per seed
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    px = 120 * x + 60 * y
+    for cx, cy, r in rng.uniform(0.1, 0.9, (4, 3)):
+        px += 120 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (0.05 * r))
+    return Image.fromarray(np.clip(px, 0, 255).astype(np.uint8)).convert("RGB")
+
+
+def _hamming(a, b) -> float:
+    return np.mean([bin(x ^ y).count("1") for x, y in zip(a, b)])
+
+
+def _jpeg(img: Image.Image) -> io.BytesIO:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=70)
+    buf.seek(0)
+    return buf
+
+
+class TestImageHashes:
+    def test_hashes_are_unsigned_64_bit(self):
+        for h in image_hashes(_image()):
+            assert 0 <= h < 2 ** 64
+
+    def test_resized_recompressed_copy_stays_close(self):
+        original = image_hashes(_image())
+        copy = hash_upload(_jpeg(_image().resize((300, 300))))
+        other = image_hashes(_image(seed=5))
+        assert _hamming(original, copy) <= 6
+        assert _hamming(original, other) > _hamming(original, copy)
+
+    def test_upload_is_rewound(self):
+        buf = _jpeg(_image())
+        assert hash_upload(buf) is not None
+        assert buf.tell() == 0
+
+    def test_non_image_returns_none(self):
+        buf = io.BytesIO(b"not an image")
+        buf.seek(5)
+        assert hash_upload(buf) is None
+        assert buf.tell() == 0
+
+
+class TestPacking:
+    def test_round_trip_to_wire_format(self):
+        hashes = [[0, 2 ** 64 - 1, 2 ** 63 + 1], [0x0123456789ABCDEF, 1, 2]]
+        blob = pack_hashes(hashes)
+        assert len(blob) == 2 * 24
+        assert unpack_hashes(blob) == [[f"{h:016x}" for h in row] for row in hashes]
+
+    def test_empty(self):
+        assert pack_hashes([]) is None
+        assert unpack_hashes(None) == [] and unpack_hashes(b"") == []
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.core.config import settings
+from app.services import listing_index
+from app.services.ai_service import ai_service
+from app.services.semantic_index import SemanticIndex
+
+
+def _listing(status):
+    return SimpleNamespace(
+        id=7, title="desk lamp", description="white", image_hashes=None,
+        status=status, embedding=bytes(range(settings.SEMANTIC_DIM)),
+    )
+
+
+class TestSyncListingIndexes:
+    """Status changes keep the semantic and duplicate indexes in step"""
+
+    @pytest.fixture(autouse=True)
+    def _fresh_index(self, monkeypatch):
+        self.index = SemanticIndex()
+        monkeypatch.setattr(listing_index, "semantic_index", self.index)
+        self.tasks = BackgroundTasks()
+
+    def test_sold_listing_leaves_both_indexes(self):
+        self.index.upsert(7, _listing("ACTIVE").embedding)
+        listing_index.sync_listing_indexes(self.tasks, _listing("SOLD"))
+
+        assert self.index.size == 0
+        [task] = self.tasks.tasks
+        assert task.func == ai_service.remove_from_index
+        assert task.args == ([7],)
+
+    def test_reactivated_listing_is_indexed_again(self):
+        listing_index.sync_listing_indexes(self.tasks, _listing("ACTIVE"))
+
+        assert self.index.size == 1
+        [task] = self.tasks.tasks
+        assert task.func == ai_service.index_listings
+        assert task.args[0][0]["id"] == 7
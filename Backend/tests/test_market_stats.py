@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+from app.models.market_stats import CategoryMarketStats
+from app.services import market_stats_service
+from app.services.market_stats_service import (
+    MarketStatsService,
+    bucket_bounds,
+    histogram_percentile,
+    price_bucket,
+)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # SQLite speaks the same ON CONFLICT DO NOTHING upsert; FOR UPDATE is a no-op there
+    monkeypatch.setattr(market_stats_service, "pg_insert", sqlite_insert)
+    engine = create_engine("sqlite://")
+    CategoryMarketStats.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def listing(price, category="Books", status="ACTIVE"):
+    return SimpleNamespace(category=category, price=price, status=status)
+
+
+class TestHistogram:
+    def test_price_falls_inside_its_bucket(self):
+        for price in (1, 9.99, 10, 250, 1234.5):
+            lo, hi = bucket_bounds(price_bucket(price))
+            assert lo <= price < hi * 1.0000001
+
+    def test_percentile_stays_within_one_bucket_of_the_truth(self):
+        prices = [5, 10, 20, 40, 80, 160, 320]
+        histogram = {}
+        for p in prices:
+            key = str(price_bucket(p))
+            histogram[key] = histogram.get(key, 0) + 1
+        median = histogram_percentile(histogram, 0.5)
+        lo, hi = bucket_bounds(price_bucket(40))
+        assert lo <= median <= hi
+
+    def test_empty_histogram_has_no_percentile(self):
+        assert histogram_percentile({}, 0.5) is None
+
+
+class TestIncrementalUpdates:
+    def test_save_adds_each_price(self, db):
+        for price in (10, 20, 30, 40, 50):
+            MarketStatsService.on_listing_saved(db, None, listing(price))
+        db.commit()
+
+        stats = MarketStatsService.get_stats(db, "Books")
+        assert stats["sample_size"] == 5
+        assert stats["average_price"] == 30.0
+        assert stats["min_price"] == 10 and stats["max_price"] == 50
+        assert abs(stats["median_price"] - 30) / 30 < 0.07  # one log bucket is ~6%
+        assert stats["p25_price"] <= stats["median_price"] <= stats["p75_price"] <= stats["p90_price"]
+
+    def test_price_change_moves_the_sample(self, db):
+        item = listing(10)
+        for other in (100, 100):
+            MarketStatsService.on_listing_saved(db, None, listing(other))
+        MarketStatsService.on_listing_saved(db, None, item)
+
+        before = MarketStatsService.snapshot(item)
+        item.price = 100
+        MarketStatsService.on_listing_saved(db, before, item)
+        db.commit()
+
+        row = db.get(CategoryMarketStats, "Books")
+        assert row.sample_size == 3
+        assert row.histogram == {str(price_bucket(100)): 3}
+        assert abs(MarketStatsService.get_stats(db, "Books")["median_price"] - 100) < 1
+
+    def test_leaving_tracked_statuses_removes_the_sample(self, db):
+        item = listing(25)
+        MarketStatsService.on_listing_saved(db, None, item)
+        before = MarketStatsService.snapshot(item)
+        item.status = "ARCHIVED"
+        MarketStatsService.on_listing_saved(db, before, item)
+        db.commit()
+
+        assert MarketStatsService.get_stats(db, "Books")["sample_size"] == 0
+        row = db.get(CategoryMarketStats, "Books")
+        assert row.histogram == {} and row.min_price is None
+
+    def test_delete_removes_the_sample(self, db):
+        kept, deleted = listing(10), listing(1000)
+        MarketStatsService.on_listing_saved(db, None, kept)
+        MarketStatsService.on_listing_saved(db, None, deleted)
+        MarketStatsService.on_listing_deleted(db, deleted)
+        db.commit()
+
+        row = db.get(CategoryMarketStats, "Books")
+        assert row.sample_size == 1
+        assert row.histogram == {str(price_bucket(10)): 1}
+        assert abs(MarketStatsService.get_stats(db, "Books")["median_price"] - 10) < 1
+
+    def test_untracked_listing_is_ignored(self, db):
+        MarketStatsService.on_listing_deleted(db, listing(10, status="REMOVED"))
+        MarketStatsService.on_listing_saved(db, None, listing(10, status="ARCHIVED"))
+        db.commit()
+        assert db.get(CategoryMarketStats, "Books") is None
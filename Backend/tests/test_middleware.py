@@ -0,0 +1,89 @@
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.middleware import LoggingMiddleware, RateLimitMiddleware, SecurityHeadersMiddleware
+from app.utils.rate_limit import RateLimiter, RatePolicy
+
+CSP = "default-src 'self'; script-src 'self'; style-src 'self' 'unsafe-inline'"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter()
+    monkeypatch.setattr(limiter, "_get_redis", lambda: None)
+    monkeypatch.setattr(
+        "app.core.middleware.policy_for",
+        lambda method, path, authenticated: None if path.startswith("/docs") else RatePolicy("t", 2, 60, per_user=False),
+    )
+
+    app = FastAPI()
+
+    @app.get("/json")
+    def json_endpoint():
+        return {"count": 3}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"first,", b"second,", b"third"]), media_type="text/csv")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("hello")
+        await websocket.close()
+
+    # Same order as app/main.py
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(LoggingMiddleware)
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return TestClient(app)
+
+
+def test_security_headers(client):
+    response = client.get("/json")
+    assert response.json() == {"count": 3}
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+    assert response.headers["X-Frame-Options"] == "DENY"
+    assert response.headers["X-XSS-Protection"] == "1; mode=block"
+    assert response.headers["Strict-Transport-Security"] == "max-age=31536000; includeSubDomains"
+    assert response.headers["Referrer-Policy"] == "strict-origin-when-cross-origin"
+    assert response.headers["Content-Security-Policy"] == CSP
+
+
+def test_docs_are_exempt_from_csp(client):
+    response = client.get("/docs")
+    assert response.status_code == 200
+    assert "Content-Security-Policy" not in response.headers
+    assert response.headers["X-Frame-Options"] == "DENY"
+
+
+def test_process_time_header(client):
+    assert float(client.get("/json").headers["X-Process-Time"]) >= 0
+
+
+def test_streaming_response_passes_through(client):
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.content == b"first,second,third"
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+
+
+def test_rate_limited_body_matches_previous_middleware(client):
+    client.get("/json")
+    client.get("/json")
+    response = client.get("/json")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Rate limit exceeded. Please try again later."}
+    assert response.headers["X-RateLimit-Limit"] == "2"
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+    assert "Retry-After" in response.headers
+
+
+def test_websockets_pass_through(client):
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_text() == "hello"
@@ -0,0 +1,39 @@
+import pytest
+from datetime import datetime, timezone
+from fastapi import HTTPException
+
+from app.utils.pagination import encode_cursor, decode_cursor, default_count_mode
+
+
+class TestCursor:
+    """Test opaque keyset cursors"""
+
+    def test_round_trip(self):
+        """Cursor decodes back to the same (timestamp, id)"""
+        ts = datetime(2025, 8, 19, 12, 30, tzinfo=timezone.utc)
+        cursor = encode_cursor(ts, 123)
+        assert decode_cursor(cursor) == (ts, 123)
+
+    def test_cursor_is_url_safe(self):
+        """Cursor can be passed as a query parameter without escaping"""
+        cursor = encode_cursor(datetime(2025, 8, 19, tzinfo=timezone.utc), "ali.khan")
+        assert all(c.isalnum() or c in "-_" for c in cursor)
+
+    def test_invalid_cursor(self):
+        """Malformed cursors are rejected with 400"""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor")
+        assert exc.value.status_code == 400
+
+
+class TestDefaultCountMode:
+    """Search endpoints avoid COUNT(*) unless asked for it"""
+
+    def test_first_page_estimates(self):
+        assert default_count_mode(None, None) == "estimate"
+
+    def test_keyset_page_skips_count(self):
+        assert default_count_mode(None, "abc") == "none"
+
+    def test_explicit_mode_wins(self):
+        assert default_count_mode("exact", "abc") == "exact"
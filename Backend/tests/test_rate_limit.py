@@ -0,0 +1,142 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.middleware import RateLimitMiddleware
+from app.core.security import create_access_token
+from app.utils.rate_limit import (
+    DEFAULT_IP_POLICY,
+    DEFAULT_USER_POLICY,
+    LocalRateLimiter,
+    RateLimiter,
+    RatePolicy,
+    _gcra,
+    policy_for,
+    retry_after_header,
+)
+
+
+class TestGcra:
+    """Generic cell rate algorithm: burst up to the limit, then one request per interval"""
+
+    policy = RatePolicy("t", limit=3, period=3)  # interval 1s
+
+    def test_burst_then_deny(self):
+        tat, decisions = 0.0, []
+        for _ in range(4):
+            decision, new_tat = _gcra(tat, 100.0, self.policy)
+            decisions.append(decision)
+            tat = new_tat if new_tat is not None else tat
+        assert [d.allowed for d in decisions] == [True, True, True, False]
+        assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+
+    def test_retry_after_is_time_until_next_slot(self):
+        tat = 103.0  # burst of 3 at t=100 used up
+        decision, new_tat = _gcra(tat, 100.25, self.policy)
+        assert not decision.allowed and new_tat is None
+        assert decision.retry_after == pytest.approx(0.75)
+        assert retry_after_header(decision) == "1"
+
+        decision, _ = _gcra(tat, 101.0, self.policy)
+        assert decision.allowed
+
+    def test_idle_key_gets_full_burst_back(self):
+        decision, _ = _gcra(103.0, 1000.0, self.policy)
+        assert decision.allowed and decision.remaining == 2
+
+
+class TestLocalRateLimiter:
+    def test_keys_are_independent(self):
+        limiter = LocalRateLimiter()
+        policy = RatePolicy("t", limit=1, period=60)
+        assert limiter.hit("a", policy, now=0).allowed
+        assert not limiter.hit("a", policy, now=1).allowed
+        assert limiter.hit("b", policy, now=1).allowed
+
+    def test_key_count_stays_bounded(self):
+        limiter = LocalRateLimiter(max_keys=10)
+        policy = RatePolicy("t", limit=5, period=60)
+        for i in range(100):
+            limiter.hit(f"k{i}", policy, now=i)
+        assert len(limiter) == 10
+        # the most recent keys survive, the oldest were evicted
+        assert not limiter.hit("k99", RatePolicy("t", limit=1, period=600), now=100).allowed
+
+
+class TestPolicyFor:
+    def test_first_matching_rule_wins(self):
+        assert policy_for("POST", "/api/v1/auth/login", authenticated=True).name == "login"
+        assert policy_for("GET", "/api/v1/ai/health", authenticated=True).name == "ai"
+        assert policy_for("POST", "/api/v1/listings/uploads", authenticated=True).name == "listing_write"
+
+    def test_method_must_match(self):
+        assert policy_for("GET", "/api/v1/listings", authenticated=True) is DEFAULT_USER_POLICY
+
+    def test_default_depends_on_authentication(self):
+        assert policy_for("GET", "/api/v1/notifications", authenticated=False) is DEFAULT_IP_POLICY
+
+    def test_exempt_paths_are_skipped(self):
+        assert policy_for("GET", "/healthz", authenticated=False) is None
+        assert policy_for("GET", "/docs/oauth2-redirect", authenticated=False) is None
+
+
+class TestRedisFallback:
+    @pytest.mark.asyncio
+    async def test_redis_errors_fall_back_to_local_limits(self, monkeypatch):
+        async def broken_script(**kwargs):
+            raise ConnectionError("redis down")
+
+        limiter = RateLimiter()
+        monkeypatch.setattr(limiter, "_get_redis", lambda: object())
+        limiter._script = broken_script
+        policy = RatePolicy("t", limit=1, period=60)
+
+        assert (await limiter.hit("k", policy)).allowed
+        assert not (await limiter.hit("k", policy)).allowed
+        assert limiter._redis_down_until > 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter()
+    monkeypatch.setattr(limiter, "_get_redis", lambda: None)
+
+    app = FastAPI()
+
+    @app.get("/api/v1/ai/ping")
+    def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return TestClient(app)
+
+
+class TestRateLimitMiddleware:
+    def _exhaust(self, client, headers=None):
+        responses = [client.get("/api/v1/ai/ping", headers=headers or {}) for _ in range(settings.RATE_LIMIT_AI_PER_MINUTE + 1)]
+        return responses[-1]
+
+    def test_denied_request_gets_429_with_retry_after(self, client):
+        response = self._exhaust(client)
+        assert response.status_code == 429
+        assert response.json() == {"detail": "Rate limit exceeded. Please try again later."}
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.headers["X-RateLimit-Remaining"] == "0"
+
+    def test_allowed_request_reports_remaining(self, client):
+        response = client.get("/api/v1/ai/ping")
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit"] == str(settings.RATE_LIMIT_AI_PER_MINUTE)
+        assert int(response.headers["X-RateLimit-Remaining"]) == settings.RATE_LIMIT_AI_PER_MINUTE - 1
+
+    def test_users_behind_one_ip_have_separate_budgets(self, client):
+        alice = {"Authorization": f"Bearer {create_access_token('alice')}"}
+        bob = {"Authorization": f"Bearer {create_access_token('bob')}"}
+        assert self._exhaust(client, alice).status_code == 429
+        assert client.get("/api/v1/ai/ping", headers=bob).status_code == 200
+
+    def test_anonymous_requests_are_keyed_by_forwarded_ip(self, client):
+        assert self._exhaust(client, {"X-Forwarded-For": "10.0.0.1"}).status_code == 429
+        assert client.get("/api/v1/ai/ping", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
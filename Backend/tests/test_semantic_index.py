@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.services import semantic_index as module
+from app.services.semantic_index import SemanticIndex
+from app.utils.embedding import embed_texts, pack_embedding
+
+TITLES = {
+    1: "casio scientific calculator",
+    2: "calculus textbook early transcendentals",
+    3: "ikea desk lamp",
+    4: "mini fridge for dorm room",
+    5: "graphing calculator ti 84",
+}
+
+
+def packed(text: str) -> bytes:
+    return pack_embedding(embed_texts([text])[0])
+
+
+def ids(hits):
+    return [i for i, _ in hits]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    idx = SemanticIndex()
+    monkeypatch.setattr(idx, "refresh", lambda db, force=False: None)
+    for listing_id, title in TITLES.items():
+        idx.upsert(listing_id, packed(title))
+    return idx
+
+
+class TestWrites:
+    def test_search_finds_the_closest_listing(self, index):
+        assert index.size == 5
+        assert ids(index.search(None, "desk lamp", k=1)) == [3]
+
+    def test_update_overwrites_the_row_in_place(self, index):
+        rows = index._n
+        index.upsert(3, packed("office chair with wheels"))
+        assert index._n == rows and index.size == 5
+        assert 3 not in ids(index.search(None, "desk lamp", k=5, min_score=0.5))
+        assert ids(index.search(None, "office chair", k=1)) == [3]
+
+    def test_removed_rows_are_never_returned(self, index):
+        index.remove(3)
+        assert index.size == 4
+        assert 3 not in ids(index.search(None, "desk lamp", k=5))
+        # Re-adding appends a fresh row
+        index.upsert(3, packed(TITLES[3]))
+        assert ids(index.search(None, "desk lamp", k=1)) == [3]
+
+    def test_empty_embedding_removes(self, index):
+        index.upsert(4, None)
+        assert index.size == 4 and 4 not in ids(index.search(None, "mini fridge", k=5))
+
+    def test_growth_and_compaction_keep_results(self, monkeypatch):
+        monkeypatch.setattr(module, "_MIN_CAPACITY", 4)
+        monkeypatch.setattr(module, "_COMPACT_MIN", 3)
+        idx = SemanticIndex()
+        monkeypatch.setattr(idx, "refresh", lambda db, force=False: None)
+        for listing_id, title in TITLES.items():
+            idx.upsert(listing_id, packed(title))
+        assert len(idx._buf[0]) == 8  # 4 -> 8 after the fifth append
+
+        for listing_id in (1, 2):
+            idx.remove(listing_id)
+        assert idx._dead == 2 and idx._n == 5
+        idx.remove(4)  # third dead row crosses the threshold
+        assert idx._dead == 0 and idx._n == 2
+        assert sorted(idx._pos) == [3, 5]
+        assert ids(idx.search(None, "calculator", k=1)) == [5]
+        assert ids(idx.search(None, "desk lamp", k=1)) == [3]
+
+    def test_batch_apply_last_write_wins(self, index):
+        vecs = np.stack([np.frombuffer(packed(t), dtype=np.int8) for t in ("office chair", "desk lamp")])
+        index._apply([6, 6], vecs, remove=[1])
+        assert index.size == 5
+        assert ids(index.search(None, "desk lamp", k=2)) in ([3, 6], [6, 3])
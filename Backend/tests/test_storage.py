@@ -0,0 +1,117 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.security import create_access_token, decode_token
+from app.utils import storage
+from app.utils.storage import _LimitedReader, receive_local_upload, store_uploads
+
+LIMIT = 1000
+
+
+@pytest.fixture(autouse=True)
+def local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "LOCAL")
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", LIMIT)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_BYTES", 64)
+    return tmp_path
+
+
+def upload(size: int, name: str = "photo.jpg") -> UploadFile:
+    # size=None, like a chunked request body, so the cap has to be enforced while streaming
+    return UploadFile(file=io.BytesIO(b"x" * size), filename=name)
+
+
+def stored_files(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, files in os.walk(root) for f in files)
+
+
+class TestLimitedReader:
+    def test_reads_up_to_the_limit(self):
+        reader = _LimitedReader(io.BytesIO(b"x" * LIMIT), LIMIT)
+        assert sum(len(c) for c in iter(lambda: reader.read(300), b"")) == LIMIT
+
+    def test_raises_413_past_the_limit(self):
+        reader = _LimitedReader(io.BytesIO(b"x" * (LIMIT + 1)), LIMIT)
+        with pytest.raises(HTTPException) as exc:
+            while reader.read(300):
+                pass
+        assert exc.value.status_code == 413
+
+    def test_default_read_is_chunked(self):
+        assert len(_LimitedReader(io.BytesIO(b"x" * LIMIT), LIMIT).read()) == 64
+
+
+class TestStoreUploads:
+    @pytest.mark.asyncio
+    async def test_stores_in_input_order(self, local_storage):
+        urls = await store_uploads([upload(10, "a.png"), upload(LIMIT, "b.jpg")], subdir="listings")
+        assert [u.rsplit(".", 1)[1] for u in urls] == ["png", "jpg"]
+        assert all(u.startswith("/uploads/listings/") for u in urls)
+        assert len(stored_files(local_storage)) == 2
+
+    @pytest.mark.asyncio
+    async def test_one_oversize_file_rolls_back_the_rest(self, local_storage):
+        files = [upload(10), upload(LIMIT + 1), upload(20), upload(30)]
+        with pytest.raises(HTTPException) as exc:
+            await store_uploads(files, subdir="listings")
+        assert exc.value.status_code == 413
+        # No stored files and no .part leftovers
+        assert stored_files(local_storage) == []
+
+    @pytest.mark.asyncio
+    async def test_declared_size_is_rejected_before_writing(self, local_storage):
+        f = upload(10)
+        f.size = LIMIT + 1
+        with pytest.raises(HTTPException):
+            await store_uploads([f])
+        assert stored_files(local_storage) == []
+
+
+class TestReceiveLocalUpload:
+    @pytest.mark.asyncio
+    async def test_oversize_body_leaves_nothing_behind(self, local_storage):
+        async def body():
+            for _ in range(20):
+                yield b"x" * 100
+
+        with pytest.raises(HTTPException):
+            await receive_local_upload("listings/a.jpg", body())
+        assert stored_files(local_storage) == []
+
+    @pytest.mark.asyncio
+    async def test_writes_body(self, local_storage):
+        async def body():
+            yield b"abc"
+            yield b""
+            yield b"def"
+
+        assert await receive_local_upload("listings/a.jpg", body()) == 6
+        assert storage.read_key("listings/a.jpg") == b"abcdef"
+        assert storage.stat_key("listings/a.jpg") == 6
+
+
+class TestLocalUploadToken:
+    def test_round_trip(self):
+        url = storage.presigned_upload_url("listings/1/a.jpg", "image/jpeg")
+        token = url.rsplit("/", 1)[1]
+        assert url.startswith(storage.LOCAL_UPLOAD_PATH + "/")
+        assert storage.decode_local_upload_token(token) == "listings/1/a.jpg"
+
+    def test_login_token_is_not_an_upload_token(self):
+        forged = create_access_token("listings/1/a.jpg")
+        assert storage.decode_local_upload_token(forged) is None
+        # Even one carrying the upload claim, since it lacks the audience
+        claims = {"upl": "listings/1/a.jpg", "sub": "1", "exp": datetime.now(timezone.utc) + timedelta(minutes=5)}
+        forged = jwt.encode(claims, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+        assert storage.decode_local_upload_token(forged) is None
+
+    def test_upload_token_is_not_a_login_token(self):
+        token = storage.presigned_upload_url("listings/1/a.jpg", "image/jpeg").rsplit("/", 1)[1]
+        assert decode_token(token) is None
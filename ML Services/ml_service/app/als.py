@@ -0,0 +1,178 @@
+"""
+ALS factor tables for /recommend.
+
+Factors are held as contiguous float32 matrices so scoring a pool is one
+gather + one mat-vec (BLAS) instead of a per-item Python loop. An optional
+offline table of each user's top-N items (built by `python -m app.als`) is
+memory-mapped, so personalized candidates need no scoring at request time
+and every worker shares the same pages. The factor matrices themselves can be
+exported next to the model as float32 .npy files (`python -m app.als
+--export-factors`), which load by mmap without unpickling the model at all.
+"""
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import joblib
+import numpy as np
+
+log = logging.getLogger("ml.als")
+
+
+def _index_map(maps: dict, dict_key: str, list_key: str) -> Dict[str, int]:
+    """mappings.json may hold {"item2idx": {...}} or a positional {"item_ids": [...]} list."""
+    if dict_key in maps:
+        return {str(k): int(v) for k, v in maps[dict_key].items()}
+    if list_key in maps:
+        return {str(k): i for i, k in enumerate(maps[list_key])}
+    return {}
+
+
+class AlsFactors:
+    def __init__(self, user_factors, item_factors, user2idx: Dict[str, int], item2idx: Dict[str, int],
+                 topn_items: Optional[np.ndarray] = None, topn_scores: Optional[np.ndarray] = None):
+        self.user_factors = np.ascontiguousarray(user_factors, dtype=np.float32)
+        self.item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        self.user2idx = user2idx
+        self.item2idx = item2idx
+        self.idx2item = np.empty(len(item2idx), dtype=object)
+        for k, v in item2idx.items():
+            if v < len(self.idx2item):
+                self.idx2item[v] = k
+        self.topn_items = topn_items
+        self.topn_scores = topn_scores
+
+    def user_index(self, user_id: Any) -> Optional[int]:
+        idx = self.user2idx.get(str(user_id))
+        return idx if idx is not None and idx < self.user_factors.shape[0] else None
+
+    def item_indices(self, item_ids: Iterable[Any]) -> np.ndarray:
+        """Factor row per id, -1 where the id is unknown to the model."""
+        n_items = self.item_factors.shape[0]
+        idx = np.fromiter((self.item2idx.get(str(i), -1) for i in item_ids), dtype=np.int64)
+        idx[idx >= n_items] = -1
+        return idx
+
+    def score(self, uidx: int, item_idx: np.ndarray) -> np.ndarray:
+        """Raw CF scores for the given factor rows (NaN for -1) in one mat-vec."""
+        out = np.full(item_idx.shape[0], np.nan, dtype=np.float32)
+        known = item_idx >= 0
+        if known.any():
+            out[known] = self.item_factors[item_idx[known]] @ self.user_factors[uidx]
+        return out
+
+    def top_items(self, uidx: int, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """User's best n (item rows, raw scores): precomputed table if loaded, else one full mat-vec."""
+        if self.topn_items is not None and uidx < self.topn_items.shape[0] and n <= self.topn_items.shape[1]:
+            items = np.asarray(self.topn_items[uidx, :n])
+            if self.topn_scores is not None:
+                return items, np.asarray(self.topn_scores[uidx, :n])
+            return items, self.score(uidx, items.astype(np.int64))
+        scores = self.item_factors @ self.user_factors[uidx]
+        return _top_rows(scores, n)
+
+
+def _top_rows(scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    n = min(n, scores.shape[-1])
+    part = np.argpartition(-scores, n - 1, axis=-1)[..., :n]
+    part_scores = np.take_along_axis(scores, part, axis=-1)
+    order = np.argsort(-part_scores, axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1), np.take_along_axis(part_scores, order, axis=-1)
+
+
+def _scores_path(items_path: str) -> str:
+    root, ext = os.path.splitext(items_path)
+    return f"{root}.scores{ext or '.npy'}"
+
+
+def _factor_paths(model_path: str) -> Tuple[str, str]:
+    root, _ = os.path.splitext(model_path)
+    return f"{root}.user_factors.npy", f"{root}.item_factors.npy"
+
+
+def _load_factors(model_path: str, mmap: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Exported .npy factors if present (mapped, no unpickling), else the joblib model itself."""
+    mode = "r" if mmap else None
+    user_path, item_path = _factor_paths(model_path)
+    if os.path.exists(user_path) and os.path.exists(item_path):
+        return np.load(user_path, mmap_mode=mode), np.load(item_path, mmap_mode=mode)
+    model = joblib.load(model_path, mmap_mode=mode)  # implicit ALS or compatible
+    return model.user_factors, model.item_factors
+
+
+def load_als(model_path: str, mappings_path: str, topn_path: Optional[str] = None,
+             mmap: bool = True) -> Optional[AlsFactors]:
+    """Load ALS factors + id mappings (+ the optional top-N table); None if anything required is missing."""
+    has_factors = os.path.exists(model_path) or all(os.path.exists(p) for p in _factor_paths(model_path))
+    if not has_factors or not os.path.exists(mappings_path):
+        return None
+    try:
+        user_factors, item_factors = _load_factors(model_path, mmap)
+        with open(mappings_path, "r", encoding="utf-8") as f:
+            maps = json.load(f)
+    except Exception:
+        log.exception("Failed loading ALS artifacts")
+        return None
+
+    user2idx = _index_map(maps, "user2idx", "user_ids")
+    item2idx = _index_map(maps, "item2idx", "item_ids")
+    if not user2idx or not item2idx:
+        log.warning("ALS mappings have no user/item index; personalization disabled")
+        return None
+
+    topn_items = topn_scores = None
+    if topn_path and os.path.exists(topn_path):
+        topn_items = np.load(topn_path, mmap_mode="r" if mmap else None)
+        if os.path.exists(_scores_path(topn_path)):
+            topn_scores = np.load(_scores_path(topn_path), mmap_mode="r" if mmap else None)
+        log.info("Memory-mapped ALS top-%d table for %d users", topn_items.shape[1], topn_items.shape[0])
+
+    return AlsFactors(user_factors, item_factors, user2idx, item2idx, topn_items, topn_scores)
+
+
+def export_factors(factors: AlsFactors, model_path: str) -> None:
+    """Offline: write the factor matrices as float32 .npy beside the model, atomically."""
+    for path, arr in zip(_factor_paths(model_path), (factors.user_factors, factors.item_factors)):
+        tmp = f"{path}.tmp.npy"
+        np.save(tmp, np.ascontiguousarray(arr, dtype=np.float32))
+        os.replace(tmp, path)
+    log.info("Exported ALS factors (%d users, %d items) next to %s",
+             factors.user_factors.shape[0], factors.item_factors.shape[0], model_path)
+
+
+def build_topn_table(factors: AlsFactors, n: int, out_path: str, batch: int = 1024) -> None:
+    """Offline: every user's top-n item rows (int32) and scores (float32) as .npy, written atomically."""
+    n_users = factors.user_factors.shape[0]
+    n = min(n, factors.item_factors.shape[0])
+    items = np.empty((n_users, n), dtype=np.int32)
+    scores = np.empty((n_users, n), dtype=np.float32)
+    for start in range(0, n_users, batch):
+        block = factors.user_factors[start:start + batch] @ factors.item_factors.T
+        items[start:start + batch], scores[start:start + batch] = _top_rows(block, n)
+
+    for path, arr in ((out_path, items), (_scores_path(out_path), scores)):
+        tmp = f"{path}.tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, path)
+    log.info("Wrote top-%d table for %d users to %s", n, n_users, out_path)
+
+
+if __name__ == "__main__":
+    from .config import settings
+
+    parser = argparse.ArgumentParser(description="Precompute per-user ALS top-N candidates")
+    parser.add_argument("--n", type=int, default=settings.RECO_TOPN)
+    parser.add_argument("--out", default=settings.RECO_TOPN_PATH)
+    parser.add_argument("--export-factors", action="store_true",
+                        help="also write user/item factors as .npy for memory-mapped loading")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    factors = load_als(settings.RECO_MODEL_PATH, settings.RECO_MAPPINGS, mmap=False)
+    if factors is None:
+        raise SystemExit("ALS model or mappings not found")
+    if args.export_factors:
+        export_factors(factors, settings.RECO_MODEL_PATH)
+    build_topn_table(factors, args.n, args.out)
@@ -0,0 +1,235 @@
+"""
+Two-tier response cache for the ML endpoints.
+
+- local: per-process LRU with TTL, always consulted first
+- redis: optional shared tier (REDIS_URL), behind a circuit breaker with short
+  socket timeouts, so an outage costs at most a few fast failures and then no
+  Redis calls at all until the cooldown passes
+
+Keys are a sha1 of the canonical JSON of the inputs (pydantic models are
+dumped in JSON mode), so equal payloads hit regardless of dict order.
+Concurrent misses on one key are collapsed to a single computation per
+process (stampede protection).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from . import metrics
+from .config import settings
+
+log = logging.getLogger("ml.cache")
+
+_MISSING = object()
+_FOLLOWER_WAIT_S = 10.0  # how long concurrent misses wait for the first caller
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def make_key(*parts: Any) -> str:
+    raw = json.dumps(_canonical(parts), sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CircuitBreaker:
+    """Open after `failures` consecutive errors; let one probe through after `cooldown_s`."""
+
+    def __init__(self, failures: int = 3, cooldown_s: float = 30.0):
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self._count = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown_s:
+                self._opened_at = time.monotonic()  # half-open: one probe per cooldown
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._count = 0
+            self._opened_at = None
+
+    def failure(self) -> None:
+        with self._lock:
+            self._count += 1
+            if self._count >= self.failures and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                log.warning("Redis cache disabled for %.0fs after %d failures", self.cooldown_s, self._count)
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+
+_redis_client = None
+_redis_lock = threading.Lock()
+breaker = CircuitBreaker(settings.CACHE_BREAKER_FAILURES, settings.CACHE_BREAKER_COOLDOWN_S)
+
+
+def get_redis():
+    """Shared Redis client (created on first use), or None when REDIS_URL is empty."""
+    global _redis_client
+    if not settings.REDIS_URL:
+        return None
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                import redis
+
+                timeout = settings.CACHE_REDIS_TIMEOUT_MS / 1000.0
+                _redis_client = redis.Redis.from_url(
+                    settings.REDIS_URL, decode_responses=True,
+                    socket_timeout=timeout, socket_connect_timeout=timeout,
+                )
+    return _redis_client
+
+
+class TieredCache:
+    def __init__(self, prefix: str, ttl: float = settings.CACHE_TTL_S, maxsize: int = settings.CACHE_LOCAL_MAXSIZE):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+
+    def _count(self, result: str) -> None:
+        if result == "miss":
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.inc("ml_cache_requests_total", "Cache lookups by tier that answered", prefix=self.prefix, result=result)
+
+    def _redis_call(self, fn: Callable[[Any], Any]) -> Any:
+        client = get_redis()
+        if client is None or not breaker.allow():
+            return _MISSING
+        try:
+            out = fn(client)
+            breaker.success()
+            return out
+        except Exception as e:
+            breaker.failure()
+            metrics.inc("ml_cache_redis_errors_total", "Failed Redis cache calls", prefix=self.prefix)
+            log.debug("Redis cache call failed for %s: %s", self.prefix, e)
+            return _MISSING
+
+    def _lookup(self, key: str) -> Any:
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count("local")
+            return value
+        raw = self._redis_call(lambda c: c.get(f"ml:{self.prefix}:{key}"))
+        if raw is not _MISSING and raw is not None:
+            value = json.loads(raw)
+            self.local.set(key, value)
+            self._count("redis")
+            return value
+        return _MISSING
+
+    def _store(self, key: str, value: Any) -> None:
+        self.local.set(key, value)
+        body = json.dumps(value, default=str)
+        self._redis_call(lambda c: c.setex(f"ml:{self.prefix}:{key}", int(self.ttl), body))
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], store_if: Callable[[Any], bool]) -> Any:
+        """Cached JSON value for key, or compute() once per process while other callers wait."""
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(timeout=_FOLLOWER_WAIT_S)
+            value = self.local.get(key, _MISSING)
+            if value is not _MISSING:
+                self._count("local")
+                return value
+
+        self._count("miss")
+        try:
+            out = compute()
+            if store_if(out):
+                self._store(key, _canonical(out))
+            return out
+        finally:
+            if leader:
+                with self._inflight_lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "local_entries": len(self.local),
+        }
+
+
+caches: Dict[str, TieredCache] = {}
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "redis": "disabled" if get_redis() is None else ("open" if breaker.is_open else "ok"),
+        "prefixes": {prefix: c.stats() for prefix, c in caches.items()},
+    }
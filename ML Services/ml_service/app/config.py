@@ -15,13 +15,27 @@ class Settings:
 
     # latency budgets (ms)
     BUDGET_PRICE_MS: int = int(os.getenv("BUDGET_PRICE_MS", "300"))
+    BUDGET_PRICE_BATCH_MS: int = int(os.getenv("BUDGET_PRICE_BATCH_MS", "5000"))
     BUDGET_DUP_MS: int = int(os.getenv("BUDGET_DUP_MS", "500"))
     BUDGET_RECO_MS: int = int(os.getenv("BUDGET_RECO_MS", "300"))
+    # handlers past their budget answer with a degraded fallback; this bounds the worker threads
+    TIMEBOX_WORKERS: int = int(os.getenv("TIMEBOX_WORKERS", "8"))
+    # running + queued timeboxed calls; past this, handlers with a fallback are shed straight to it
+    TIMEBOX_MAX_PENDING: int = int(os.getenv("TIMEBOX_MAX_PENDING", "32"))
 
     # duplicate detection thresholds
     DUP_THRESH_HI: float = float(os.getenv("DUP_THRESH_HI", "0.88"))
     DUP_THRESH_LO: float = float(os.getenv("DUP_THRESH_LO", "0.80"))
     DUP_MARGIN: float    = float(os.getenv("DUP_MARGIN",    "0.06"))
+    DUP_DESC_WEIGHT: float = float(os.getenv("DUP_DESC_WEIGHT", "0.25"))  # Mode A: share of score from descriptions
+    # "exact" scans every row; "pruned" only scores rows sharing the query's heaviest terms
+    DUP_SEARCH_MODE: str = os.getenv("DUP_SEARCH_MODE", "pruned")
+    # image stage (manifest.json's alpha_text / top_m_for_image win when present)
+    DUP_ALPHA_TEXT: float = float(os.getenv("DUP_ALPHA_TEXT", "0.7"))
+    DUP_IMG_TOP_M: int = int(os.getenv("DUP_IMG_TOP_M", "200"))
+    DUP_IMG_NEAR_HAMMING: float = float(os.getenv("DUP_IMG_NEAR_HAMMING", "6"))  # mean bits of 64 = same photo
+    DUP_DELTA_MAX_ROWS: int = int(os.getenv("DUP_DELTA_MAX_ROWS", "5000"))  # merge delta into base past this
+    DUP_RECALL_SAMPLE: int = int(os.getenv("DUP_RECALL_SAMPLE", "200"))  # queries for the recall check at load; 0 skips
 
     # --- price model + calibration (absolute defaults) ---
     PRICE_OUT_MULTIPLIER: float = float(os.getenv("PRICE_OUT_MULTIPLIER", "289"))
@@ -33,6 +47,8 @@ class Settings:
         "PRICE_CALIB_PATH",
         str(APP_DIR / "models" / "error_bands_by_cat_cond.csv")
     )
+    PRICE_CALIB_RELOAD_S: float = float(os.getenv("PRICE_CALIB_RELOAD_S", "30"))  # 0 disables hot reload
+    PRICE_BATCH_MAX: int = int(os.getenv("PRICE_BATCH_MAX", "1000"))
 
     # duplicate index (vectorizer + tfidf matrix + item_meta)
     DUP_INDEX_DIR: str = os.getenv(
@@ -53,10 +69,25 @@ class Settings:
         "RECO_MAPPINGS",
         str(APP_DIR / "models" / "reco" / "mappings.json")
     )
+    # optional offline per-user top-N (python -m app.als), memory-mapped at load
+    RECO_TOPN_PATH: str = os.getenv(
+        "RECO_TOPN_PATH",
+        str(APP_DIR / "models" / "reco" / "topn_items.npy")
+    )
+    RECO_TOPN: int = int(os.getenv("RECO_TOPN", "200"))
+
+    # artifact loading: load every model at startup instead of on first request, and
+    # memory-map numpy arrays in joblib/.npy files so workers share the same pages
+    WARMUP_ON_START: bool = os.getenv("WARMUP_ON_START", "1") not in ("0", "false", "False")
+    MMAP_ARTIFACTS: bool = os.getenv("MMAP_ARTIFACTS", "1") not in ("0", "false", "False")
 
-    # caching (optional). Empty disables caching cleanly.
+    # caching: in-process LRU always (CACHE_TTL_S=0 disables), Redis shared tier if REDIS_URL is set
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/2") 
     CACHE_TTL_S: int = int(os.getenv("CACHE_TTL_S", "600"))
+    CACHE_LOCAL_MAXSIZE: int = int(os.getenv("CACHE_LOCAL_MAXSIZE", "2048"))
+    CACHE_REDIS_TIMEOUT_MS: int = int(os.getenv("CACHE_REDIS_TIMEOUT_MS", "50"))
+    CACHE_BREAKER_FAILURES: int = int(os.getenv("CACHE_BREAKER_FAILURES", "3"))       # consecutive errors to open
+    CACHE_BREAKER_COOLDOWN_S: float = float(os.getenv("CACHE_BREAKER_COOLDOWN_S", "30"))  # then retry Redis
 
     # logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
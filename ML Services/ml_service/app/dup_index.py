@@ -0,0 +1,388 @@
+"""
+Live duplicate index: the offline TF-IDF build plus listings added since.
+
+Layout (one generation at a time, named by manifest.live.json)
+- base-{gen}.npz: the last merged matrix (generation 1 is a snapshot of
+  tfidf_matrix.npz + item_meta.csv, which are never modified)
+- journal-{gen}.log: append-only JSON lines, one per upsert/delete call,
+  carrying the already-vectorized rows and image hashes
+
+A write appends one line (O(batch), one fsync) under an exclusive flock on
+.lock, so several uvicorn workers can share the directory. Every worker
+replays journal bytes it hasn't seen, and reloads when the manifest names a
+new generation, before it serves a query: a write that reached one worker
+is visible to all of them on their next request. Once the journal holds
+DUP_DELTA_MAX_ROWS live rows it is merged into a new base (also under the
+lock); base and empty journal are written first and the manifest is
+os.replace()d last, so a crash leaves either the old or the new generation.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .img_hash import HASHES_PER_IMAGE, parse_hashes
+from .topk import TopKIndex
+
+log = logging.getLogger("ml.dup_index")
+
+_LIVE_MANIFEST = "manifest.live.json"
+_LOCK_FILE = ".lock"
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _save_segment(path: Path, mat: sparse.csr_matrix, ids: Sequence[Any],
+                  hashes: Optional[Dict[Any, np.ndarray]] = None) -> None:
+    mat = sparse.csr_matrix(mat)
+    hashes = {i: hashes[i] for i in ids if i in hashes} if hashes else {}
+    hash_data = np.concatenate(list(hashes.values())) if hashes else np.empty((0, HASHES_PER_IMAGE), np.uint64)
+    _atomic_write(path, lambda f: np.savez(
+        f,
+        data=mat.data, indices=mat.indices, indptr=mat.indptr, shape=np.array(mat.shape),
+        ids=np.array(json.dumps(list(ids))),
+        hash_ids=np.array(json.dumps(list(hashes))),
+        hash_counts=np.array([len(h) for h in hashes.values()], dtype=np.int64),
+        hash_data=hash_data,
+    ))
+
+
+def _load_segment(path: Path) -> Tuple[sparse.csr_matrix, List[Any], Dict[Any, np.ndarray]]:
+    with np.load(path) as z:
+        mat = sparse.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+        hashes = {}
+        if "hash_ids" in z.files:
+            bounds = np.cumsum(z["hash_counts"])[:-1]
+            hashes = dict(zip(json.loads(str(z["hash_ids"])), np.split(z["hash_data"], bounds)))
+        return mat, json.loads(str(z["ids"])), hashes
+
+
+def _offline_hashes(meta, hash_cols: Sequence[str]) -> Dict[Any, np.ndarray]:
+    """One image per item from the offline build's img_*hash columns, if it has them."""
+    if not hash_cols or not all(c in meta.columns for c in hash_cols):
+        return {}
+    out = {}
+    for item_id, *row in meta[["id", *hash_cols]].itertuples(index=False):
+        arr = parse_hashes([row])
+        if arr is not None:
+            out[item_id] = arr
+    return out
+
+
+def _journal_name(generation: int) -> str:
+    return f"journal-{generation}.log"
+
+
+def live_version(directory: str) -> Tuple[int, int]:
+    """(generation, journal bytes) on disk: changes with every write by any worker."""
+    d = Path(directory)
+    try:
+        generation = json.loads((d / _LIVE_MANIFEST).read_text())["generation"]
+    except (OSError, ValueError, KeyError):
+        return 0, 0
+    try:
+        return generation, (d / _journal_name(generation)).stat().st_size
+    except OSError:
+        return generation, 0
+
+
+class LiveDuplicateIndex:
+    def __init__(self, directory: str, vectorizer, base_mat, base_ids: List[Any],
+                 pruned: bool = True, delta_max_rows: int = 5000):
+        self.dir = Path(directory)
+        self.vec = vectorizer
+        self.pruned = pruned
+        self.delta_max_rows = delta_max_rows
+        self.generation = 0
+
+        self._lock = threading.RLock()  # in-memory state
+        self._write_lock = threading.Lock()  # this process's writers; .lock covers other processes
+        self._merging = False
+        self._manifest_mtime: Optional[int] = None
+        self._journal_offset = 0
+        self._set_base(base_mat, base_ids)
+        self._delta: Dict[Any, sparse.csr_matrix] = {}
+        self._delta_dirty = False
+        self._hashes: Dict[Any, np.ndarray] = {}
+        self._publish(None)
+
+    # ---------- loading ----------
+    @classmethod
+    def load(cls, directory: str, vectorizer, pruned: bool = True, delta_max_rows: int = 5000,
+             hash_cols: Sequence[str] = ()) -> "LiveDuplicateIndex":
+        """Open the latest persisted generation, or the offline build if nothing live exists yet."""
+        import pandas as pd
+
+        d = Path(directory)
+        if (d / _LIVE_MANIFEST).exists():
+            index = cls(directory, vectorizer, sparse.csr_matrix((0, 0)), [], pruned, delta_max_rows)
+            index.sync()
+        else:
+            base = sparse.load_npz(d / "tfidf_matrix.npz")
+            meta = pd.read_csv(d / "item_meta.csv")
+            ids = meta["id"].tolist()  # assumes 'id' column in item_meta.csv
+            index = cls(directory, vectorizer, base, ids, pruned, delta_max_rows)
+            index._hashes = _offline_hashes(meta, hash_cols)
+        log.info("Loaded live duplicate index gen %d: %d base + %d delta rows",
+                 index.generation, index._base.n_rows, len(index._delta))
+        return index
+
+    def sync(self, blocking: bool = True) -> None:
+        """
+        Catch up with writes made by other processes: replay new journal lines,
+        or reload everything if the generation changed. Non-blocking callers
+        (searches) keep the current view if another thread is already syncing.
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            generation = self._disk_generation()
+            if generation != self.generation:
+                self._load_generation(generation)
+            self._replay()
+            if self._delta_dirty:
+                self._rebuild_delta()
+        except FileNotFoundError as e:
+            # A concurrent merge removed the generation we were reading; the next sync sees the new one
+            log.debug("Duplicate index sync raced a merge: %s", e)
+        finally:
+            self._lock.release()
+
+    def _disk_generation(self) -> int:
+        try:
+            mtime = (self.dir / _LIVE_MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return self.generation  # still on the offline build
+        if mtime != self._manifest_mtime:
+            info = json.loads((self.dir / _LIVE_MANIFEST).read_text())
+            self._manifest_mtime = mtime
+            return info["generation"]
+        return self.generation
+
+    def _load_generation(self, generation: int) -> None:
+        base, ids, hashes = _load_segment(self._base_path(generation))
+        self._set_base(base, ids)
+        self._hashes = hashes
+        self._delta = {}
+        self._delta_dirty = True
+        self._journal_offset = 0
+        self.generation = generation
+
+    def _replay(self) -> None:
+        path = self.dir / _journal_name(self.generation)
+        if self.generation == 0 or not path.exists() or path.stat().st_size <= self._journal_offset:
+            return
+        with open(path, "rb") as f:
+            f.seek(self._journal_offset)
+            chunk = f.read()
+        # A reader can see a line mid-append; stop at the last complete one
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self._journal_offset += end
+
+    # ---------- persistence ----------
+    def _base_path(self, generation: int) -> Path:
+        return self.dir / f"base-{generation}.npz"
+
+    @contextmanager
+    def _exclusive(self):
+        """Serialize writers across threads and worker processes."""
+        with self._write_lock, open(self.dir / _LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_manifest(self, generation: int) -> None:
+        body = json.dumps({
+            "generation": generation,
+            "base": self._base_path(generation).name,
+            "journal": _journal_name(generation),
+        }).encode()
+        _atomic_write(self.dir / _LIVE_MANIFEST, lambda f: f.write(body))
+        self._manifest_mtime = (self.dir / _LIVE_MANIFEST).stat().st_mtime_ns
+
+    def _start_live(self) -> None:
+        # First live write: snapshot the offline build as generation 1 so the
+        # original tfidf_matrix.npz / item_meta.csv are never modified.
+        _save_segment(self._base_path(1), self._base.mat, self._base_ids, hashes=self._hashes)
+        (self.dir / _journal_name(1)).touch()
+        with self._lock:
+            self._write_manifest(1)
+            self.generation = 1
+            self._journal_offset = 0
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Append one journal line (caller holds _exclusive and has synced)."""
+        if self.generation == 0:
+            self._start_live()
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with open(self.dir / _journal_name(self.generation), "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ---------- segments ----------
+    def _set_base(self, mat, ids: List[Any]) -> None:
+        self._base = TopKIndex(mat, pruned=self.pruned)
+        self._base_ids = list(ids)
+        self._base_pos: Dict[Any, int] = {item_id: i for i, item_id in enumerate(self._base_ids)}
+
+    def _rebuild_delta(self) -> None:
+        # Exact scan is cheapest for a few thousand rows; rebuilt once per sync, not per row
+        rows = list(self._delta.values())
+        self._publish(TopKIndex(sparse.vstack(rows), pruned=False) if rows else None)
+        self._delta_dirty = False
+
+    def _publish(self, delta: Optional[TopKIndex]) -> None:
+        """Swap in the view searches read, so they never see a half-applied write."""
+        self._view = (self._base, self._base_ids, delta, list(self._delta))
+
+    def _remove(self, item_id: Any) -> bool:
+        found = False
+        pos = self._base_pos.get(item_id)
+        if pos is not None and self._base.alive[pos]:
+            self._base.delete_rows([pos])
+            found = True
+        if self._delta.pop(item_id, None) is not None:
+            found = True
+        if found:
+            self._hashes.pop(item_id, None)
+            self._delta_dirty = True
+        return found
+
+    def _contains(self, item_id: Any) -> bool:
+        pos = self._base_pos.get(item_id)
+        return item_id in self._delta or (pos is not None and bool(self._base.alive[pos]))
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        if record["op"] == "delete":
+            for item_id in record["ids"]:
+                self._remove(item_id)
+            return
+        n_cols = self._base.mat.shape[1]
+        for item in record["items"]:
+            item_id = item["id"]
+            self._remove(item_id)
+            self._delta[item_id] = sparse.csr_matrix(
+                (np.asarray(item["d"], dtype=np.float32), np.asarray(item["i"], dtype=np.int32), [0, len(item["i"])]),
+                shape=(1, n_cols),
+            )
+            if item.get("h"):
+                self._hashes[item_id] = np.asarray([int(h) for h in item["h"]], dtype=np.uint64).reshape(-1, HASHES_PER_IMAGE)
+        self._delta_dirty = True
+
+    # ---------- public API ----------
+    @property
+    def base(self) -> TopKIndex:
+        return self._view[0]
+
+    @property
+    def size(self) -> int:
+        base, _, _, delta_ids = self._view
+        return int(base.alive.sum()) + len(delta_ids)
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        return self.vec.transform(texts)
+
+    def hashes_for(self, ids: Sequence[Any]) -> List[Optional[np.ndarray]]:
+        return [self._hashes.get(i) for i in ids]
+
+    def upsert(self, items: List[Tuple[Any, str, Optional[np.ndarray]]]) -> int:
+        """Insert or replace (id, normalized text, image hashes) entries. Returns the number written."""
+        if not items:
+            return 0
+        mat = sparse.csr_matrix(self.transform([text for _, text, _ in items]), dtype=np.float32)
+        record = {"op": "upsert", "items": [
+            {
+                "id": item_id,
+                "i": mat.indices[mat.indptr[n]:mat.indptr[n + 1]].tolist(),
+                "d": mat.data[mat.indptr[n]:mat.indptr[n + 1]].tolist(),
+                "h": [int(h) for h in hashes.ravel()] if hashes is not None else None,
+            }
+            for n, (item_id, _, hashes) in enumerate(items)
+        ]}
+        self._write(record)
+        return len(items)
+
+    def delete(self, ids: List[Any]) -> int:
+        """Remove listings by id. Returns how many were present."""
+        removed = 0
+        with self._exclusive():
+            self.sync()
+            with self._lock:
+                removed = sum(1 for item_id in ids if self._contains(item_id))
+            if removed:
+                self._append({"op": "delete", "ids": list(ids)})
+                self.sync()
+        return removed
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        with self._exclusive():
+            self.sync()
+            self._append(record)
+            self.sync()
+            should_merge = len(self._delta) >= self.delta_max_rows and not self._merging
+            if should_merge:
+                self._merging = True
+        if should_merge:
+            threading.Thread(target=self.merge, name="dup-index-merge", daemon=True).start()
+
+    def merge(self) -> None:
+        """Fold the journal and tombstones into a new base generation."""
+        try:
+            with self._exclusive():
+                self.sync()
+                if len(self._delta) < self.delta_max_rows:
+                    return  # another worker merged first
+                alive = self._base.alive
+                mat = sparse.vstack([self._base.mat[alive], *self._delta.values()]).tocsr()
+                ids = [i for i, keep in zip(self._base_ids, alive) if keep] + list(self._delta)
+                old = (self._base_path(self.generation), self.dir / _journal_name(self.generation))
+                generation = self.generation + 1
+                _save_segment(self._base_path(generation), mat, ids, hashes=self._hashes)
+                (self.dir / _journal_name(generation)).touch()
+                with self._lock:
+                    self._write_manifest(generation)
+                    self._set_base(mat, ids)
+                    self._delta = {}
+                    self.generation = generation
+                    self._journal_offset = 0
+                    self._rebuild_delta()
+                for p in old:
+                    if p.exists():
+                        p.unlink()
+                log.info("Merged duplicate index into gen %d (%d rows)", generation, self._base.n_rows)
+        finally:
+            self._merging = False
+
+    def search(self, q_vec, k: int = 10, min_score: float = 0.0) -> Tuple[List[Any], np.ndarray]:
+        """Top-k (ids, cosine scores) across the base and delta segments."""
+        self.sync(blocking=False)
+        base, base_ids, delta, delta_ids = self._view
+
+        idx, vals = base.search(q_vec, k, min_score)
+        ids = [base_ids[i] for i in idx]
+        if delta is not None:
+            d_idx, d_vals = delta.search(q_vec, k)
+            ids += [delta_ids[i] for i in d_idx]
+            vals = np.concatenate([vals, d_vals])
+        order = np.argsort(-vals, kind="stable")[:k]
+        return [ids[i] for i in order], vals[order]
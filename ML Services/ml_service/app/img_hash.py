@@ -0,0 +1,79 @@
+"""
+Perceptual image hashes (phash, ahash, dhash) packed as uint64 and compared by
+Hamming distance with a vectorized popcount.
+
+Hashes arrive from the backend as [[phash, ahash, dhash], ...] per listing,
+each a 16-digit hex string; here they live as (n_images, 3) uint64 arrays.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+HASHES_PER_IMAGE = 3
+_NO_MATCH = 64.0
+
+if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+    def popcount64(x: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(x)
+else:
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount64(x: np.ndarray) -> np.ndarray:
+        b = np.ascontiguousarray(x, dtype=np.uint64).view(np.uint8).reshape(*x.shape, 8)
+        return _POP8[b].sum(axis=-1, dtype=np.uint8)
+
+
+def parse_hashes(hashes: Optional[Iterable[Sequence]]) -> Optional[np.ndarray]:
+    """[[hex|int] * 3] per image -> (n, 3) uint64, or None when there is nothing usable."""
+    rows = []
+    for row in hashes or []:
+        try:
+            vals = [int(h, 16) if isinstance(h, str) else int(h) for h in row]
+        except (TypeError, ValueError):
+            continue
+        if len(vals) == HASHES_PER_IMAGE:
+            rows.append([v & 0xFFFFFFFFFFFFFFFF for v in vals])
+    return np.array(rows, dtype=np.uint64) if rows else None
+
+
+def format_hashes(arr: Optional[np.ndarray]) -> List[List[str]]:
+    if arr is None:
+        return []
+    return [[f"{int(h):016x}" for h in row] for row in arr]
+
+
+def min_distances(query: np.ndarray, candidates: List[Optional[np.ndarray]]) -> np.ndarray:
+    """
+    For each candidate, the smallest mean Hamming distance (0..64) between any
+    of its images and any query image; 64 where the candidate has no hashes.
+    All candidate images are compared in one broadcast XOR + popcount.
+    """
+    out = np.full(len(candidates), _NO_MATCH)
+    owners = [i for i, c in enumerate(candidates) if c is not None and len(c)]
+    if query is None or not len(query) or not owners:
+        return out
+
+    flat = np.concatenate([candidates[i] for i in owners])           # (N, 3)
+    counts = np.array([len(candidates[i]) for i in owners])
+    dist = popcount64(query[:, None, :] ^ flat[None, :, :]).mean(axis=2)  # (q, N)
+    per_image = dist.min(axis=0)                                       # (N,)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    out[owners] = np.minimum.reduceat(per_image, starts)
+    return out
+
+
+def rerank(text_sims: np.ndarray, distances: np.ndarray, alpha_text: float,
+           near_identical: float, thresh_hi: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Blend text and image similarity. Photos only add evidence: the score never
+    drops below the text score, and near-identical photos (mean Hamming <=
+    near_identical) lift it to at least thresh_hi, which catches re-posts with
+    reworded titles. Returns (scores, has_image_match).
+    """
+    img_sim = 1.0 - distances / 64.0
+    has_img = distances < _NO_MATCH
+    blended = alpha_text * text_sims + (1.0 - alpha_text) * img_sim
+    scores = np.where(has_img, np.maximum(text_sims, blended), text_sims)
+    same_photo = distances <= near_identical
+    scores = np.where(same_photo, np.maximum(scores, thresh_hi), scores)
+    return scores, same_photo
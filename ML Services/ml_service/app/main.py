@@ -1,8 +1,16 @@
 from fastapi import FastAPI
+from .config import settings
 from .routers import health, price, duplicate, recommend
+from . import warmup
 
 app = FastAPI(title="Campus Exchange ML Service", version="1.0.0")
 
+@app.on_event("startup")
+def warm_models():
+    # Blocking on purpose: the platform healthcheck only passes once models are in memory
+    if settings.WARMUP_ON_START:
+        warmup.warm_up()
+
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": "Welcome to the Campus Exchange ML Service!"}
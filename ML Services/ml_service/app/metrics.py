@@ -0,0 +1,72 @@
+"""
+In-process counters and latency histograms, rendered in the Prometheus text
+format on /metrics. Values are per worker process (scrape each replica).
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], list] = {}
+_help: Dict[str, Tuple[str, str]] = {}
+
+
+def _key(name: str, labels: Dict[str, str]):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, help_text: str = "", value: float = 1.0, **labels: str) -> None:
+    with _lock:
+        _help.setdefault(name, ("counter", help_text))
+        _counters[_key(name, labels)] += value
+
+
+def observe(name: str, seconds: float, help_text: str = "", **labels: str) -> None:
+    with _lock:
+        _help.setdefault(name, ("histogram", help_text))
+        # [bucket counts..., +Inf count, sum]
+        h = _histograms.setdefault(_key(name, labels), [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+        h[len(LATENCY_BUCKETS)] += 1
+        h[-1] += seconds
+
+
+def counter_value(name: str, **labels: str) -> float:
+    return _counters.get(_key(name, labels), 0.0)
+
+
+def _fmt_labels(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    lines = []
+    with _lock:
+        for name, (kind, help_text) in sorted(_help.items()):
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (n, labels), v in sorted(_counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_fmt_labels(labels)} {v:g}")
+            else:
+                for (n, labels), h in sorted(_histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(LATENCY_BUCKETS, h):
+                        lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', f'{bound:g}'),))} {count}")
+                    total = h[len(LATENCY_BUCKETS)]
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {total}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-1]:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {total}")
+    return "\n".join(lines) + "\n"
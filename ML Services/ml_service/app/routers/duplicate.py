@@ -1,40 +1,75 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from typing import List
-from ..schemas import DuplicateIn, DuplicateOut
+from ..schemas import DuplicateIn, DuplicateOut, IndexUpsertIn, IndexDeleteIn, IndexWriteOut
 from ..config import settings
-from ..utils import timeboxed
+from ..utils import cacheable, timeboxed
+from ..dup_index import LiveDuplicateIndex, live_version
+from ..img_hash import min_distances, parse_hashes, rerank
 
 import os
+import json
+import logging
 import joblib
 import numpy as np
-import pandas as pd
 import re
-from difflib import SequenceMatcher
-from scipy import sparse
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+from sklearn.feature_extraction.text import HashingVectorizer
+from ..topk import top_k
 
+log = logging.getLogger("ml.duplicate")
 router = APIRouter(tags=["Duplicate"])
 
+_TOP_K = 10
+
 # -------------------------
 # Globals (lazy-loaded)
 # -------------------------
-_vec = None
-_mat = None
-_meta = None
-
-def load_index():
-    """Load TF-IDF vectorizer, matrix, and item metadata once (lazy singleton)."""
-    global _vec, _mat, _meta
-    if _vec is None or _mat is None or _meta is None:
-        vec_path = os.path.join(settings.DUP_INDEX_DIR, "tfidf_vectorizer.joblib")
-        mat_path = os.path.join(settings.DUP_INDEX_DIR, "tfidf_matrix.npz")
-        meta_path = os.path.join(settings.DUP_INDEX_DIR, "item_meta.csv")
-
-        _vec = joblib.load(vec_path)
-        _mat = sparse.load_npz(mat_path)
-        _meta = pd.read_csv(meta_path)
-
-    return _vec, _mat, _meta
+_index: LiveDuplicateIndex = None
+_manifest = None
+_load_lock = threading.Lock()
+
+
+def load_manifest() -> dict:
+    """Offline build manifest (alpha_text, top_m_for_image, img_hash_cols, ...); {} if absent."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(settings.DUP_INDEX_DIR, "manifest.json")) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+def load_index() -> LiveDuplicateIndex:
+    """Load the vectorizer and the live (base + delta) index once (lazy singleton)."""
+    global _index
+    if _index is None:
+        with _load_lock:
+            if _index is None:
+                vec = joblib.load(os.path.join(settings.DUP_INDEX_DIR, "tfidf_vectorizer.joblib"),
+                                  mmap_mode="r" if settings.MMAP_ARTIFACTS else None)
+                index = LiveDuplicateIndex.load(
+                    settings.DUP_INDEX_DIR, vec,
+                    pruned=settings.DUP_SEARCH_MODE == "pruned",
+                    delta_max_rows=settings.DUP_DELTA_MAX_ROWS,
+                    hash_cols=load_manifest().get("img_hash_cols", ()),
+                )
+
+                base = index.base
+                if base.pruned and settings.DUP_RECALL_SAMPLE > 0 and base.n_rows > 0:
+                    rng = np.random.default_rng(0)
+                    rows = rng.choice(base.n_rows, size=min(settings.DUP_RECALL_SAMPLE, base.n_rows), replace=False)
+                    floor = _prune_floor()
+                    log.info("Duplicate index recall@%d vs exact scan (scores >= %.2f): %.4f",
+                             _TOP_K, floor, base.recall(base.mat[rows], _TOP_K, floor))
+                _index = index
+
+    return _index
+
+
+def _prune_floor() -> float:
+    # Below TLO - MARGIN a runner-up can no longer change the is_duplicate decision
+    return max(0.0, settings.DUP_THRESH_LO - settings.DUP_MARGIN)
 
 # -------------------------
 # Text utils
@@ -46,22 +81,53 @@ def norm_text(s: str) -> str:
     s = _ws_re.sub(" ", s).strip()
     return s
 
+# -------------------------
+# Mode A scorer: hashed char n-grams, all candidates in one sparse product
+# -------------------------
+# Stateless (no fit), so it works on whatever candidates the caller sends.
+# Char 2-4 grams within word boundaries tolerate typos, spacing ("fx-991" vs
+# "fx 991") and word order, and land on a similar 0..1 scale as the old
+# SequenceMatcher ratio for near-duplicates.
+_char_vec = HashingVectorizer(
+    analyzer="char_wb", ngram_range=(2, 4), n_features=2 ** 20,
+    alternate_sign=False, norm="l2", dtype=np.float32,
+)
+
+def _fuzzy_scores(cand_title: str, cand_desc: str, titles: List[str], descs: List[str]) -> np.ndarray:
+    """Cosine of char n-gram vectors; descriptions mixed in with DUP_DESC_WEIGHT where both sides have one."""
+    T = _char_vec.transform([cand_title] + titles)
+    title_sim = np.asarray((T[1:] @ T[0].T).todense()).ravel()
+
+    w = settings.DUP_DESC_WEIGHT
+    if w <= 0 or not cand_desc:
+        return title_sim
+    D = _char_vec.transform([cand_desc] + descs)
+    desc_sim = np.asarray((D[1:] @ D[0].T).todense()).ravel()
+    has_desc = np.array([bool(d) for d in descs])
+    return np.where(has_desc, (1.0 - w) * title_sim + w * desc_sim, title_sim)
+
+def _undecided(payload: DuplicateIn) -> DuplicateOut:
+    # Over budget: fail open so posting a listing is never blocked by a slow check
+    return DuplicateOut(is_duplicate=False, confidence=0, similar_listing_ids=[])
+
+def _index_version():
+    # Every upsert/delete (by any worker) grows the journal or bumps the generation
+    return live_version(settings.DUP_INDEX_DIR)
+
 # -------------------------
 # Core route
 # -------------------------
 @router.post("/check-duplicate", response_model=DuplicateOut)
-@timeboxed(settings.BUDGET_DUP_MS)
+@timeboxed(settings.BUDGET_DUP_MS, fallback=_undecided)
+@cacheable("duplicate", model=DuplicateOut, version=_index_version)
 def check_duplicate(payload: DuplicateIn):
     """
     Hybrid duplicate checker:
-    - If payload.existing_listings provided: use SequenceMatcher LIKE backend example.
+    - If payload.existing_listings provided: char n-gram similarity over title (+ description).
     - Else: compare against prebuilt TF-IDF index for entire catalog.
+    - If image_hashes are given, the top-M text candidates are re-ranked by photo similarity.
     Returns IDs of similar listings and duplicate flag using thresholds.
     """
-    THI = settings.DUP_THRESH_HI
-    TLO = settings.DUP_THRESH_LO
-    MAR = settings.DUP_MARGIN
-
     cand_title = norm_text(payload.title)
     cand_desc  = norm_text(payload.description)
     cand_text  = f"{cand_title} {cand_desc}".strip()
@@ -70,56 +136,107 @@ def check_duplicate(payload: DuplicateIn):
     if len(cand_text.split()) < 3:
         return DuplicateOut(is_duplicate=False, confidence=0, similar_listing_ids=[])
 
-    # --------------- Mode A: use provided existing_listings (SequenceMatcher) ---------------
+    query_hashes = parse_hashes(payload.image_hashes)
+    exclude = set(payload.exclude_ids)
+
+    # --------------- Mode A: use provided existing_listings (char n-grams) ---------------
     if getattr(payload, "existing_listings", None):
-        scores = []
-        for l in payload.existing_listings:
-            lt = norm_text(l.title or "")
-            # Basic title-only similarity (matches your example); optionally mix description
-            sim = SequenceMatcher(None, cand_title, lt).ratio()
-            scores.append((l.id, sim))
-
-        if not scores:
+        listings = [l for l in payload.existing_listings if l.id not in exclude]
+        if not listings:
             return DuplicateOut(is_duplicate=False, confidence=0, similar_listing_ids=[])
-
-        # Sort by similarity desc
-        scores.sort(key=lambda x: -x[1])
-        top_id, top_sim = scores[0]
-        second_sim = scores[1][1] if len(scores) > 1 else 0.0
-
-        is_dup = (top_sim >= THI) or (top_sim >= TLO and (top_sim - second_sim) >= MAR)
-
-        # Return up to 10 IDs with sim >= TLO
-        similar_ids: List[int | str] = [sid for sid, s in scores if s >= TLO][:10]
-
-        return DuplicateOut(
-            is_duplicate=is_dup,
-            confidence=int(round(top_sim * 100)),
-            similar_listing_ids=similar_ids
+        sims = _fuzzy_scores(
+            cand_title, cand_desc,
+            [norm_text(l.title or "") for l in listings],
+            [norm_text(l.description or "") for l in listings],
         )
+        ids = [l.id for l in listings]
+        if query_hashes is not None:
+            sims, ids = _image_rerank(sims, ids, query_hashes, [parse_hashes(l.image_hashes) for l in listings])
+        return _decide(ids, sims)
 
     # --------------- Mode B: fallback to global TF-IDF index ---------------
-    vec, mat, meta = load_index()
-    cand_vec = vec.transform([cand_text])
-    sims = cosine_similarity(cand_vec, mat).ravel()
+    index = load_index()
+    q_vec = index.transform([cand_text])
+    if query_hashes is None:
+        ids, sims = index.search(q_vec, k=_TOP_K + len(exclude), min_score=_prune_floor())
+    else:
+        # Reworded re-posts can score low on text, so take a wider unpruned pool for the image stage
+        ids, sims = index.search(q_vec, k=_image_top_m() + len(exclude), min_score=0.0)
+    keep = [i for i, sid in enumerate(ids) if sid not in exclude]
+    ids, sims = [ids[i] for i in keep], sims[keep]
+    if query_hashes is not None:
+        sims, ids = _image_rerank(sims, ids, query_hashes, index.hashes_for(ids))
+    return _decide(ids, sims)
+
+
+def _image_top_m() -> int:
+    return int(load_manifest().get("top_m_for_image", settings.DUP_IMG_TOP_M))
+
+
+def _image_rerank(sims: np.ndarray, ids: list, query_hashes: np.ndarray, cand_hashes: list):
+    """Re-rank the top-M text candidates by photo similarity (Hamming distance on packed hashes)."""
+    order, top = top_k(np.asarray(sims, dtype=float), _image_top_m())
+    ids = [ids[i] for i in order]
+    scores, _ = rerank(
+        top,
+        min_distances(query_hashes, [cand_hashes[i] for i in order]),
+        alpha_text=float(load_manifest().get("alpha_text", settings.DUP_ALPHA_TEXT)),
+        near_identical=settings.DUP_IMG_NEAR_HAMMING,
+        thresh_hi=settings.DUP_THRESH_HI,
+    )
+    return scores, ids
 
-    order = np.argsort(-sims)
-    top_sim = float(sims[order[0]])
-    second_sim = float(sims[order[1]]) if sims.size > 1 else 0.0
+
+def _decide(ids: list, sims: np.ndarray) -> DuplicateOut:
+    """Apply the HI / LO + margin rule to the best candidates."""
+    THI = settings.DUP_THRESH_HI
+    TLO = settings.DUP_THRESH_LO
+    MAR = settings.DUP_MARGIN
+
+    order, top = top_k(np.asarray(sims, dtype=float), _TOP_K)
+    top_sim = float(top[0]) if top.size > 0 else 0.0
+    second_sim = float(top[1]) if top.size > 1 else 0.0
 
     is_dup = (top_sim >= THI) or (top_sim >= TLO and (top_sim - second_sim) >= MAR)
 
-    similar_ids: List[int | str] = []
-    for idx in order:
-        s = float(sims[idx])
-        if s < TLO:
-            break
-        similar_ids.append(meta.iloc[idx]["id"])  # assumes 'id' column in item_meta.csv
-        if len(similar_ids) >= 10:
-            break
+    # Up to 10 IDs with sim >= TLO, best first
+    similar_ids: List[int | str] = [ids[i] for i, s in zip(order, top) if s >= TLO]
 
     return DuplicateOut(
         is_duplicate=is_dup,
-        confidence=int(round(top_sim * 100)),
+        confidence=int(round(min(top_sim, 1.0) * 100)),
         similar_listing_ids=similar_ids
     )
+
+
+# -------------------------
+# Live index maintenance (called by the backend as listings change)
+# -------------------------
+def _index_text(title: str, description: str) -> str:
+    return f"{norm_text(title)} {norm_text(description)}".strip()
+
+
+@router.post("/index/upsert", response_model=IndexWriteOut)
+def index_upsert(payload: IndexUpsertIn):
+    """Add or replace listings in the duplicate index (same text normalization as /check-duplicate)."""
+    try:
+        index = load_index()
+    except Exception:
+        log.exception("Duplicate index unavailable")
+        raise HTTPException(status_code=503, detail="Duplicate index unavailable")
+    written = index.upsert([
+        (l.id, _index_text(l.title, l.description), parse_hashes(l.image_hashes))
+        for l in payload.listings
+    ])
+    return IndexWriteOut(affected=written, size=index.size, generation=index.generation)
+
+
+@router.post("/index/delete", response_model=IndexWriteOut)
+def index_delete(payload: IndexDeleteIn):
+    try:
+        index = load_index()
+    except Exception:
+        log.exception("Duplicate index unavailable")
+        raise HTTPException(status_code=503, detail="Duplicate index unavailable")
+    removed = index.delete(payload.ids)
+    return IndexWriteOut(affected=removed, size=index.size, generation=index.generation)
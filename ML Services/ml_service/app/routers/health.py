@@ -1,7 +1,15 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from .. import cache, metrics, warmup
 
 router = APIRouter(tags=["Health"])
 
 @router.get("/healthz")
 def healthz():
-    return {"ok": True}
+    # per-artifact load time / RSS growth from startup warm-up
+    return {"ok": True, **warmup.stats(), "cache": cache.stats()}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # latency histograms / budget overruns of this worker, Prometheus text format
+    return metrics.render_prometheus()
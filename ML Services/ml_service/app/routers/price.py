@@ -1,11 +1,14 @@
-from fastapi import APIRouter
-from ..schemas import PredictPriceIn, PredictPriceOut
+from fastapi import APIRouter, HTTPException
+from ..schemas import PredictPriceIn, PredictPriceOut, PredictPriceBatchIn, PredictPriceBatchOut
 from ..config import settings
-from ..utils import timeboxed
+from ..utils import cacheable, timeboxed
 
 import logging
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import joblib
 import pandas as pd
@@ -19,55 +22,98 @@ router = APIRouter(tags=["Price"])
 _INTERVAL_MIN = 100.0     # PKR; minimum half-width
 _INTERVAL_PCT = 0.15      # ±15% around point estimate
 
+# -------- Calibration quantiles (columns of the bands CSV) --------
+QUANTILES = ("q50", "q75", "q90", "q95")
+
+
+@dataclass(frozen=True)
+class _Calibration:
+    """Bands CSV compiled for O(1) lookups: (category, condition) -> row of `bands`."""
+    path: Path
+    mtime: float
+    index: Dict[Tuple[str, str], int]
+    bands: np.ndarray  # shape (rows, len(QUANTILES))
+
+
 # -------- Globals (lazy-loaded) --------
 _model: Any = None
-_calib_df: Optional[pd.DataFrame] = None
+_calib: Optional[_Calibration] = None
+_calib_checked_at: float = 0.0
+_calib_lock = threading.Lock()
 
 
 # =========================
 # Loading artifacts
 # =========================
-def _load_calibration() -> Optional[pd.DataFrame]:
+def _calibration_path() -> Optional[Path]:
+    """settings.PRICE_CALIB_PATH if it exists, else a sibling CSV next to the model."""
+    calib_path = getattr(settings, "PRICE_CALIB_PATH", None)
+    if calib_path and Path(calib_path).exists():
+        return Path(calib_path)
+    sib = Path(settings.PRICE_MODEL_PATH).parent / "error_bands_by_cat_cond.csv"
+    if sib.exists():
+        return sib
+    return None
+
+
+def _load_calibration() -> Optional[_Calibration]:
     """
-    Try to load per-(category, condition) absolute-error quantiles (q50/q75/q90/q95).
-    Looks for settings.PRICE_CALIB_PATH or a sibling CSV near the model.
+    Load per-(category, condition) absolute-error quantiles (q50/q75/q90/q95)
+    and compile them into a dict index over a float array.
     """
-    # 1) explicit path
-    calib_path = getattr(settings, "PRICE_CALIB_PATH", None)
-    if calib_path:
-        p = Path(calib_path)
-        if p.exists():
-            try:
-                df = pd.read_csv(p)
-                df["category"] = df["category"].astype(str)
-                df["condition"] = df["condition"].astype(str)
-                return df
-            except Exception:
-                log.exception("Failed reading calibration file at PRICE_CALIB_PATH")
-
-    # 2) sibling CSV next to model
+    p = _calibration_path()
+    if p is None:
+        return None
     try:
-        model_path = Path(settings.PRICE_MODEL_PATH)
-        sib = model_path.parent / "error_bands_by_cat_cond.csv"
-        if sib.exists():
-            df = pd.read_csv(sib)
-            df["category"] = df["category"].astype(str)
-            df["condition"] = df["condition"].astype(str)
-            return df
+        mtime = p.stat().st_mtime
+        df = pd.read_csv(p)
+        df["category"] = df["category"].astype(str)
+        df["condition"] = df["condition"].astype(str)
+        df = df.drop_duplicates(["category", "condition"])
+        for q in QUANTILES:
+            if q not in df.columns:
+                df[q] = np.nan
+        index = {key: i for i, key in enumerate(zip(df["category"], df["condition"]))}
+        bands = df[list(QUANTILES)].to_numpy(dtype=float)
+        return _Calibration(path=p, mtime=mtime, index=index, bands=bands)
     except Exception:
-        log.exception("Failed reading sibling calibration CSV")
-
-    return None
+        log.exception("Failed reading calibration file at %s", p)
+        return None
+
+
+def _maybe_reload_calibration() -> None:
+    """Re-read the bands CSV when its mtime changes (checked at most every PRICE_CALIB_RELOAD_S)."""
+    global _calib, _calib_checked_at
+    interval = settings.PRICE_CALIB_RELOAD_S
+    now = time.monotonic()
+    if interval <= 0 or now - _calib_checked_at < interval:
+        return
+    with _calib_lock:
+        if now - _calib_checked_at < interval:
+            return
+        _calib_checked_at = now
+        p = _calibration_path()
+        try:
+            mtime = p.stat().st_mtime if p is not None else None
+        except OSError:
+            mtime = None
+        if _calib is not None and p == _calib.path and mtime == _calib.mtime:
+            return
+        fresh = _load_calibration()
+        if fresh is not None:
+            _calib = fresh
+            log.info("Reloaded calibration bands from %s: %d rows", fresh.path, len(fresh.index))
 
 
 def load_model():
-    global _model, _calib_df
+    global _model, _calib, _calib_checked_at
     if _model is None:
-        _model = joblib.load(settings.PRICE_MODEL_PATH)
+        _model = joblib.load(settings.PRICE_MODEL_PATH, mmap_mode="r" if settings.MMAP_ARTIFACTS else None)
         log.info("Loaded price model (compat-4): %s", type(_model))
-        _calib_df = _load_calibration()
-        if _calib_df is not None:
-            log.info("Loaded calibration bands: %d rows", len(_calib_df))
+        _calib = _load_calibration()
+        _calib_checked_at = time.monotonic()
+        if _calib is not None:
+            log.info("Loaded calibration bands: %d rows", len(_calib.index))
         else:
             log.warning("No calibration bands found; falling back to ±%d%%/min %.0f PKR",
                         int(_INTERVAL_PCT * 100), _INTERVAL_MIN)
@@ -85,43 +131,57 @@ def _norm_text(s: Optional[str]) -> str:
     return s
 
 
-def _build_compat_row(payload: PredictPriceIn) -> pd.DataFrame:
+def _build_compat_frame(payloads: List[PredictPriceIn]) -> pd.DataFrame:
     """
-    Build the single-row DataFrame that the compat-4 pipeline expects:
+    Build the DataFrame that the compat-4 pipeline expects, one row per payload:
       columns -> ["category", "condition", "text_concat"]
     """
-    # Prefer normalized text if present; else normalize raw
-    t = payload.title_norm or payload.title or ""
-    d = payload.description_norm or payload.description or ""
-    text_concat = (_norm_text(t) + " " + _norm_text(d)).strip()
-
-    row = {
-        "category": str(payload.category or "Unknown"),
-        "condition": str(payload.condition or "Unknown"),
-        "text_concat": text_concat,
-    }
-    return pd.DataFrame([row], columns=["category", "condition", "text_concat"])
-
-
-def _choose_band(pred: float, category: str, condition: str) -> float:
+    rows = []
+    for payload in payloads:
+        # Prefer normalized text if present; else normalize raw
+        t = payload.title_norm or payload.title or ""
+        d = payload.description_norm or payload.description or ""
+        rows.append((
+            str(payload.category or "Unknown"),
+            str(payload.condition or "Unknown"),
+            (_norm_text(t) + " " + _norm_text(d)).strip(),
+        ))
+    return pd.DataFrame(rows, columns=["category", "condition", "text_concat"])
+
+
+def _predict_raw(m: Any, X: pd.DataFrame) -> np.ndarray:
+    if hasattr(m, "predict"):
+        return np.asarray(m.predict(X), dtype=float)
+    if isinstance(m, dict) and "pipeline" in m and hasattr(m["pipeline"], "predict"):
+        return np.asarray(m["pipeline"].predict(X), dtype=float)
+    raise TypeError("Unsupported model bundle for price prediction")
+
+
+def _choose_bands(preds: np.ndarray, X: pd.DataFrame, quantiles: List[str]) -> np.ndarray:
     """
-    Use per-(category, condition) q75 band if available; otherwise fallback to ±15% or min 100 PKR.
-    Returns HALF-width of the interval to apply around the point estimate.
+    Vectorized HALF-widths for a batch of point estimates.
+    Rows with a per-(category, condition) band at the requested quantile use it;
+    the rest fall back to ±15% or min 100 PKR.
     """
-    base = max(_INTERVAL_MIN, _INTERVAL_PCT * abs(float(pred)))
+    abs_pred = np.abs(preds)
+    base = np.maximum(_INTERVAL_MIN, _INTERVAL_PCT * abs_pred)
 
-    if _calib_df is None:
+    calib = _calib
+    if calib is None:
         return base
 
-    cat = str(category or "Unknown")
-    cond = str(condition or "Unknown")
-    hit = _calib_df[(_calib_df["category"] == cat) & (_calib_df["condition"] == cond)]
-    if not hit.empty:
-        q75 = float(hit["q75"].iloc[0])
-        # Prevent too-narrow ranges on low-price items
-        return max(q75, 0.10 * abs(float(pred)), 50.0)
+    rows = np.fromiter(
+        (calib.index.get(key, -1) for key in zip(X["category"], X["condition"])),
+        dtype=np.intp, count=len(X),
+    )
+    cols = np.fromiter((QUANTILES.index(q) for q in quantiles), dtype=np.intp, count=len(quantiles))
+    found = rows >= 0
+    band = np.full(len(X), np.nan)
+    band[found] = calib.bands[rows[found], cols[found]]
 
-    return base
+    # Prevent too-narrow ranges on low-price items
+    calibrated = np.maximum(np.maximum(band, 0.10 * abs_pred), 50.0)
+    return np.where(np.isnan(band), base, calibrated)
 
 
 def _blend_with_market(y_model: float, payload: PredictPriceIn) -> (float, str, int):
@@ -183,22 +243,104 @@ def _blend_with_market(y_model: float, payload: PredictPriceIn) -> (float, str,
     return y_blend, expl, conf
 
 
-def _interval_from_point(y: float, payload: PredictPriceIn) -> (float, float):
+def _fallback_out() -> PredictPriceOut:
+    half = max(_INTERVAL_MIN, _INTERVAL_PCT * 0.0)
+    scale = float(getattr(settings, "PRICE_OUT_MULTIPLIER", 1.0))
+    return PredictPriceOut(
+        predicted_price=0.0 * scale,
+        min_predicted_price=0.0,
+        max_predicted_price=round(half * scale, 2),
+        confidence=50,
+        explanation="Fallback: model unavailable or input outside domain.",
+        price_range={"min": 0.0, "max": round(half * scale, 2)}
+    )
+
+
+def _market_only_out(payload: PredictPriceIn) -> PredictPriceOut:
+    """
+    Degraded answer when the model misses its budget: the market median (or
+    average) with the heuristic band, in the same units and scaling as _predict_many.
+    """
+    stats = payload.market_stats
+    baseline = None
+    if stats is not None:
+        for value in (stats.median_price, stats.avg_price, stats.average_price):
+            if value is not None:
+                baseline = float(value)
+                break
+    if baseline is None:
+        return _fallback_out()
+
+    half = max(_INTERVAL_MIN, _INTERVAL_PCT * abs(baseline))
+    scale = float(getattr(settings, "PRICE_OUT_MULTIPLIER", 1.0))
+    lo, hi = round(max(0.0, baseline - half) * scale, 2), round((baseline + half) * scale, 2)
+    return PredictPriceOut(
+        predicted_price=round(baseline * scale, 2),
+        min_predicted_price=lo,
+        max_predicted_price=hi,
+        confidence=55 if (stats.sample_size or 0) >= 20 else 45,
+        explanation=f"Market stats only (model over latency budget, n={int(stats.sample_size or 0)})",
+        price_range={"min": lo, "max": hi}
+    )
+
+
+def _market_only_batch(payload: PredictPriceBatchIn) -> PredictPriceBatchOut:
+    return PredictPriceBatchOut(predictions=[_market_only_out(p) for p in payload.items])
+
+
+def _predict_many(payloads: List[PredictPriceIn]) -> List[PredictPriceOut]:
     """
-    Construct min/max using calibrated band (q75) if available for the (category, condition),
-    otherwise a simple ±max(MIN, PCT*y).
+    One frame, one model.predict and one calibration join for the whole batch;
+    only the market blend (per-item stats) runs per row.
     """
-    half = _choose_band(y, payload.category, payload.condition)
-    lo = max(0.0, float(y) - half)
-    hi = float(y) + half
-    return (round(lo, 2), round(hi, 2))
+    m = load_model()
+    _maybe_reload_calibration()
+    X = _build_compat_frame(payloads)
+    y_model = _predict_raw(m, X)
+
+    # Blend with DB market stats if provided
+    blended = [_blend_with_market(float(y), p) for y, p in zip(y_model, payloads)]
+    y_final = np.array([b[0] for b in blended], dtype=float)
+
+    # Calibrated interval
+    half = _choose_bands(y_final, X, [p.band_quantile for p in payloads])
+    lo = np.round(np.maximum(0.0, y_final - half), 2)
+    hi = np.round(y_final + half, 2)
+
+    # --- SCALE OUTPUTS ---
+    scale = float(getattr(settings, "PRICE_OUT_MULTIPLIER", 1.0))
+    y_final, lo, hi = y_final * scale, lo * scale, hi * scale
+    # ---------------------
+
+    out = []
+    for i, (_, blend_expl, conf) in enumerate(blended):
+        lo_i, hi_i = round(float(lo[i]), 2), round(float(hi[i]), 2)
+        out.append(PredictPriceOut(
+            predicted_price=round(float(y_final[i]), 2),
+            min_predicted_price=lo_i,
+            max_predicted_price=hi_i,
+            confidence=conf,
+            explanation=f"{blend_expl}; cat={X.at[i, 'category']} / cond={X.at[i, 'condition']}",
+            price_range={"min": lo_i, "max": hi_i}
+        ))
+    return out
+
+
+def _calib_version() -> Optional[float]:
+    # new calibration bands change every answer, so they are part of the cache key
+    return _calib.mtime if _calib is not None else None
+
+
+def _is_model_answer(out: PredictPriceOut) -> bool:
+    return not out.explanation.startswith("Fallback")
 
 
 # =========================
-# Endpoint
+# Endpoints
 # =========================
 @router.post("/predict-price", response_model=PredictPriceOut)
-@timeboxed(settings.BUDGET_PRICE_MS)
+@timeboxed(settings.BUDGET_PRICE_MS, fallback=_market_only_out)
+@cacheable("price", model=PredictPriceOut, version=_calib_version, store_if=_is_model_answer)
 def price_suggest(payload: PredictPriceIn):
     """
     Compat-4 price suggestion endpoint that matches backend's new ai.py:
@@ -206,49 +348,29 @@ def price_suggest(payload: PredictPriceIn):
     - Model: LightGBM compat (category, condition, TF-IDF(title+desc))
     - Output: predicted_price + calibrated interval + confidence + explanation
     """
-    m = load_model()
-    X = _build_compat_row(payload)
-
     try:
-        if hasattr(m, "predict"):
-            y_model = float(m.predict(X)[0])
-        elif isinstance(m, dict) and "pipeline" in m and hasattr(m["pipeline"], "predict"):
-            y_model = float(m["pipeline"].predict(X)[0])
-        else:
-            raise TypeError("Unsupported model bundle for price prediction")
-
-        # Blend with DB market stats if provided
-        y_final, blend_expl, conf = _blend_with_market(y_model, payload)
-
-        # Calibrated interval
-        lo, hi = _interval_from_point(y_final, payload)
-        # --- SCALE OUTPUTS ---
-        scale = float(getattr(settings, "PRICE_OUT_MULTIPLIER", 1.0))
-        y_final *= scale
-        lo *= scale
-        hi *= scale
-        # ---------------------
-
-
-        expl = f"{blend_expl}; cat={X.loc[0,'category']} / cond={X.loc[0,'condition']}"
-        return PredictPriceOut(
-        predicted_price=round(y_final, 2),
-        min_predicted_price=round(lo, 2),
-        max_predicted_price=round(hi, 2),
-        confidence=conf,
-        explanation=expl,
-        price_range={"min": round(lo, 2), "max": round(hi, 2)}
-        )
-
+        return _predict_many([payload])[0]
     except Exception:
         log.exception("price_suggest failed")
-        half = max(_INTERVAL_MIN, _INTERVAL_PCT * 0.0)
-        scale = float(getattr(settings, "PRICE_OUT_MULTIPLIER", 1.0))
-        return PredictPriceOut(
-            predicted_price=0.0 * scale,
-            min_predicted_price=0.0,
-            max_predicted_price=round(half * scale, 2),
-            confidence=50,
-            explanation="Fallback: model unavailable or input outside domain.",
-            price_range={"min": 0.0, "max": round(half * scale, 2)}
-        )
+        return _fallback_out()
+
+
+@router.post("/predict-price/batch", response_model=PredictPriceBatchOut)
+@timeboxed(settings.BUDGET_PRICE_BATCH_MS, fallback=_market_only_batch)
+@cacheable("price_batch", model=PredictPriceBatchOut, version=_calib_version,
+           store_if=lambda out: all(_is_model_answer(p) for p in out.predictions))
+def price_suggest_batch(payload: PredictPriceBatchIn):
+    """
+    Batch variant of /predict-price for bulk repricing and imports.
+    Results are returned in input order; if the model fails every item gets the fallback.
+    """
+    if len(payload.items) > settings.PRICE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {settings.PRICE_BATCH_MAX} items)")
+    if not payload.items:
+        return PredictPriceBatchOut(predictions=[])
+
+    try:
+        return PredictPriceBatchOut(predictions=_predict_many(payload.items))
+    except Exception:
+        log.exception("price_suggest_batch failed")
+        return PredictPriceBatchOut(predictions=[_fallback_out() for _ in payload.items])
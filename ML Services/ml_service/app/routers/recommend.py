@@ -2,9 +2,11 @@ from fastapi import APIRouter
 from typing import List, Optional
 from ..schemas import RecommendIn, RecommendOut, Recommendation
 from ..config import settings
-from ..utils import timeboxed
+from ..utils import cacheable, timeboxed
+from ..als import AlsFactors, load_als
 
-import os, json, joblib, re
+import re
+import threading
 import numpy as np
 
 router = APIRouter(tags=["Recommend"])
@@ -30,41 +32,65 @@ def _scale01_to_pct(x: float) -> int:
     x = max(0.0, min(1.0, x))
     return int(round(100 * x))
 
-# ---------- ALS lazy-load ----------
-_als_model = None
-_als_maps: Optional[dict] = None
-
-def _load_als():
-    """Load ALS model + mappings only if both files exist; else return (None, None)."""
-    global _als_model, _als_maps
-    if _als_model is not None or _als_maps is not None:
-        return _als_model, _als_maps
-
-    if not os.path.exists(settings.RECO_MODEL_PATH):
-        return None, None
-    if not os.path.exists(settings.RECO_MAPPINGS):
-        return None, None
-
-    try:
-        _als_model = joblib.load(settings.RECO_MODEL_PATH)  # implicit ALS or compatible
-    except Exception:
-        _als_model = None
+def _minmax(x: np.ndarray, flat: float = 0.5) -> np.ndarray:
+    """Scale to 0..1 over the pool; `flat` when every value is the same."""
+    lo, hi = float(x.min()), float(x.max())
+    if hi <= lo:
+        return np.full(x.shape, flat, dtype=float)
+    return (x - lo) / (hi - lo)
 
-    try:
-        with open(settings.RECO_MAPPINGS, "r", encoding="utf-8") as f:
-            _als_maps = json.load(f)  # expects keys: "user2idx", "item2idx"
-    except Exception:
-        _als_maps = None
-
-    return _als_model, _als_maps
+# ---------- ALS lazy-load ----------
+_als: Optional[AlsFactors] = None
+_als_loaded = False
+_als_lock = threading.Lock()
+
+def _load_als() -> Optional[AlsFactors]:
+    """Load ALS factors + mappings (+ memory-mapped top-N table) once; None if unavailable."""
+    global _als, _als_loaded
+    if not _als_loaded:
+        with _als_lock:
+            if not _als_loaded:
+                _als = load_als(settings.RECO_MODEL_PATH, settings.RECO_MAPPINGS, settings.RECO_TOPN_PATH,
+                                mmap=settings.MMAP_ARTIFACTS)
+                _als_loaded = True
+    return _als
+
+ALS_WEIGHT = 0.35  # tune as needed
+
+
+def _personal_candidates(als: AlsFactors, uidx: int) -> RecommendOut:
+    """No pool from the backend: return the user's precomputed ALS top items directly."""
+    items, raw = als.top_items(uidx, 10)
+    pct = np.rint(100 * _minmax(np.asarray(raw, dtype=float), flat=1.0)).astype(int)
+    recs = [
+        Recommendation(listing_id=als.idx2item[i], score=int(p), reason="personalized for you")
+        for i, p in zip(items, pct)
+        if als.idx2item[i] is not None
+    ]
+    return RecommendOut(recommendations=recs, reasoning="personalized using your past activity.")
+
+def _popularity_only(payload: RecommendIn) -> RecommendOut:
+    """Degraded ranking when the full recommender misses its budget: engagement only."""
+    listings = payload.available_listings or []
+    if not listings:
+        return RecommendOut(recommendations=[], reasoning="No available listings provided.")
+    engagement = np.array(
+        [[l.saved_count or 0, l.likes or 0, l.views or 0] for l in listings], dtype=float
+    ) @ np.array([0.4, 0.4, 0.2])
+    pct = np.rint(100 * _minmax(engagement)).astype(int)
+    top_idx = np.argsort(-pct, kind="stable")[:10]
+    recs = [Recommendation(listing_id=listings[i].id, score=int(pct[i]), reason="popular on campus") for i in top_idx]
+    return RecommendOut(recommendations=recs, reasoning="Ranked by popularity on campus.")
 
 @router.post("/recommend", response_model=RecommendOut)
-@timeboxed(settings.BUDGET_RECO_MS)
+@timeboxed(settings.BUDGET_RECO_MS, fallback=_popularity_only)
+@cacheable("recommend", model=RecommendOut, version=lambda: _als_loaded)
 def recommend(payload: RecommendIn):
     """
     Hybrid recommender:
       - Baseline: content (title) + filters (category/condition) + popularity (likes/saves/views)
       - ALS personalization: only if model + mappings + user_id are available; blended with baseline.
+      - No pool + known user: the user's precomputed ALS top items are returned directly.
     """
     cand_cat  = (payload.category or "").strip()
     cand_cond = (payload.condition or "").strip()
@@ -73,86 +99,46 @@ def recommend(payload: RecommendIn):
     cand_text  = f"{cand_title} {cand_desc}".strip()
 
     listings = payload.available_listings or []
+
+    als = _load_als()
+    uidx = None
+    if als is not None and getattr(payload, "user_id", None) is not None:
+        uidx = als.user_index(payload.user_id)
+
     if not listings:
+        if uidx is not None:
+            return _personal_candidates(als, uidx)
         return RecommendOut(recommendations=[], reasoning="No available listings provided.")
 
     # ---------- Popularity for the current pool (normalized 0..1) ----------
-    pop_raw = []
-    for l in listings:
-        s = float(getattr(l, "saved_count", 0) or 0)
-        k = float(getattr(l, "likes", 0) or 0)
-        v = float(getattr(l, "views", 0) or 0)
-        pop_raw.append(0.4 * s + 0.4 * k + 0.2 * v)
-
-    pmin, pmax = (min(pop_raw), max(pop_raw)) if pop_raw else (0.0, 1.0)
-    pop_norm = [(x - pmin) / (pmax - pmin) if pmax > pmin else 0.5 for x in pop_raw]
+    engagement = np.array(
+        [[l.saved_count or 0, l.likes or 0, l.views or 0] for l in listings], dtype=float
+    )
+    pop_norm = _minmax(engagement @ np.array([0.4, 0.4, 0.2]))
 
     # ---------- Baseline score (0..1) ----------
     # weights: title 0.40, category 0.25, condition 0.15, popularity 0.20
-    base_scores = []
-    cat_matches = []
-    cond_matches = []
-    title_sims = []
-    for idx, l in enumerate(listings):
-        cat_match  = 1.0 if (l.category or "") == cand_cat and cand_cat else 0.0
-        cond_match = 1.0 if (l.condition or "") == cand_cond and cand_cond else 0.0
-        tsim       = _title_sim(cand_text, f"{l.title or ''} {l.description or ''}")
-        pop01      = float(pop_norm[idx])
-
-        base = (0.40 * tsim) + (0.25 * cat_match) + (0.15 * cond_match) + (0.20 * pop01)
-        base = max(0.0, min(1.0, base))
-
-        base_scores.append(base)
-        cat_matches.append(cat_match)
-        cond_matches.append(cond_match)
-        title_sims.append(tsim)
-
-    base_scores = np.array(base_scores, dtype=float)
+    cat_matches = np.array([bool(cand_cat) and (l.category or "") == cand_cat for l in listings], dtype=float)
+    cond_matches = np.array([bool(cand_cond) and (l.condition or "") == cand_cond for l in listings], dtype=float)
+    title_sims = np.array([_title_sim(cand_text, f"{l.title or ''} {l.description or ''}") for l in listings])
+
+    base_scores = np.clip(0.40 * title_sims + 0.25 * cat_matches + 0.15 * cond_matches + 0.20 * pop_norm, 0.0, 1.0)
 
     # ---------- ALS personalization (only if everything is available) ----------
     als_scores = None
-    model, maps = _load_als()
-    if (
-        model is not None
-        and maps is not None
-        and getattr(payload, "user_id", None) is not None
-        and "user2idx" in maps
-        and "item2idx" in maps
-    ):
-        uid_str = str(payload.user_id)
-        if uid_str in maps["user2idx"]:
-            try:
-                uidx = int(maps["user2idx"][uid_str])
-                user_vec = model.user_factors[uidx]  # shape [k]
-
-                # score only the provided pool (requires each listing id mapped to ALS index)
-                raw = []
-                for l in listings:
-                    iid = str(l.id)
-                    if iid in maps["item2idx"]:
-                        iidx = int(maps["item2idx"][iid])
-                        item_vec = model.item_factors[iidx]  # shape [k]
-                        raw.append(float(np.dot(user_vec, item_vec)))  # raw CF score
-                    else:
-                        raw.append(None)
-
-                # normalize ALS scores over the available candidates
-                vals = [x for x in raw if x is not None]
-                if vals:
-                    amin, amax = min(vals), max(vals)
-                    als_scores = []
-                    for x in raw:
-                        if x is None:
-                            als_scores.append(0.0)
-                        else:
-                            als_scores.append((x - amin) / (amax - amin + 1e-9) if amax > amin else 0.5)
-                    als_scores = np.array(als_scores, dtype=float)
-                # else: keep als_scores=None to skip blending
-            except Exception:
-                als_scores = None  # fail-safe
+    if uidx is not None:
+        try:
+            # score only the provided pool: one gather of mapped item rows + one mat-vec
+            raw = als.score(uidx, als.item_indices(l.id for l in listings))
+            known = ~np.isnan(raw)
+            if known.any():
+                als_scores = np.zeros(len(listings), dtype=float)
+                als_scores[known] = _minmax(raw[known].astype(float))
+            # else: keep als_scores=None to skip blending
+        except Exception:
+            als_scores = None  # fail-safe
 
     # ---------- Blend (if ALS available) ----------
-    ALS_WEIGHT = 0.35  # tune as needed
     if als_scores is not None:
         final01 = (1.0 - ALS_WEIGHT) * base_scores + ALS_WEIGHT * als_scores
         personalized_flags = als_scores > 0.0
@@ -161,8 +147,11 @@ def recommend(payload: RecommendIn):
         personalized_flags = np.zeros_like(final01, dtype=bool)
 
     # ---------- Build response ----------
-    scored = []
-    for idx, l in enumerate(listings):
+    pct_all = np.rint(100 * np.clip(final01, 0.0, 1.0)).astype(int)
+    top_idx = np.argsort(-pct_all, kind="stable")[:10]
+    top = []
+    for idx in top_idx:
+        l = listings[idx]
         reasons = []
         if cat_matches[idx] > 0: reasons.append(f"same category {l.category}")
         if cond_matches[idx] > 0: reasons.append(f"same condition {l.condition}")
@@ -170,11 +159,8 @@ def recommend(payload: RecommendIn):
         if pop_norm[idx] >= 0.66: reasons.append("popular on campus")
         if personalized_flags[idx]: reasons.append("personalized for you")
 
-        pct = int(round(100 * max(0.0, min(1.0, float(final01[idx])))))
-        scored.append((pct, Recommendation(listing_id=l.id, score=pct, reason=", ".join(reasons) if reasons else "relevant match")))
-
-    scored.sort(key=lambda x: -x[0])
-    top = [rec for _, rec in scored[:10]]
+        pct = int(pct_all[idx])
+        top.append(Recommendation(listing_id=l.id, score=pct, reason=", ".join(reasons) if reasons else "relevant match"))
 
     why = []
     if cand_cat:  why.append(f"matching category “{cand_cat}”")
@@ -2,7 +2,7 @@ from pydantic import BaseModel, Field
 from typing import List, Union
 
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import Literal, Optional
 
 
 # ---------- Shared ----------
@@ -29,6 +29,8 @@ class PredictPriceIn(BaseLooseModel):
     title_norm: Optional[str] = None
     description_norm: Optional[str] = None
     market_stats: Optional[MarketStats] = None
+    # calibration quantile used for the price band (wider = more conservative)
+    band_quantile: Literal["q50", "q75", "q90", "q95"] = "q75"
 
 class PriceRange(BaseModel):
     min: float
@@ -42,17 +44,28 @@ class PredictPriceOut(BaseModel):
     explanation: str
     price_range: Optional[PriceRange] = None
 
+class PredictPriceBatchIn(BaseLooseModel):
+    items: List[PredictPriceIn]
+
+class PredictPriceBatchOut(BaseModel):
+    predictions: List[PredictPriceOut]   # same order as items
+
 
 # ---------- /check-duplicate ----------
 class ExistingListing(BaseModel):
     id: Union[int, str]
     title: str
     description: str
+    # [[phash, ahash, dhash] as 16-digit hex] per image
+    image_hashes: List[List[str]] = []
 
 class DuplicateIn(BaseModel):
     title: str
     description: str
-    existing_listings: List[ExistingListing]
+    # empty -> compare against the full live index instead
+    existing_listings: List[ExistingListing] = []
+    image_hashes: List[List[str]] = []
+    exclude_ids: List[Union[int, str]] = []   # e.g. the listing being checked
 
 class DuplicateOut(BaseModel):
     is_duplicate: bool
@@ -60,6 +73,19 @@ class DuplicateOut(BaseModel):
     similar_listing_ids: List[Union[int, str]]
 
 
+# ---------- /index/upsert, /index/delete ----------
+class IndexUpsertIn(BaseModel):
+    listings: List[ExistingListing]
+
+class IndexDeleteIn(BaseModel):
+    ids: List[Union[int, str]]
+
+class IndexWriteOut(BaseModel):
+    affected: int
+    size: int          # live rows in the index after the write
+    generation: int
+
+
 from typing import List, Optional, Union
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -90,8 +116,8 @@ class RecommendIn(BaseLooseModel):
     category: Optional[str] = None
     condition: Optional[str] = None
 
-    # Pool to rank
-    available_listings: List[RecommendListingItem]
+    # Pool to rank; empty -> personalized ALS candidates for user_id
+    available_listings: List[RecommendListingItem] = []
 
 class Recommendation(BaseModel):
     listing_id: Union[int, str]
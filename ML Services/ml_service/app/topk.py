@@ -0,0 +1,120 @@
+"""
+Top-k cosine search over an L2-normalized sparse (TF-IDF) matrix.
+
+Rows are normalized once at build time, so cosine similarity is a plain
+sparse dot product, and only the k best scores are sorted (argpartition).
+
+The optional pruned mode uses the matrix's column postings as an inverted
+index: only rows sharing one of the query's heaviest terms are scored. Terms
+are kept until the norm of the dropped query weight falls below `min_score`,
+so (by Cauchy-Schwarz) every row scoring >= min_score is still found; rows
+below it may be missed, which is fine for a thresholded duplicate check.
+
+Rows can be tombstoned with `delete_rows`; they are skipped by search until
+the owner rebuilds the index without them.
+"""
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+log = logging.getLogger("ml.topk")
+
+
+def l2_normalize_rows(mat) -> sparse.csr_matrix:
+    mat = sparse.csr_matrix(mat, dtype=np.float32)
+    norms = np.sqrt(np.asarray(mat.multiply(mat).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms).dot(mat), dtype=np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and values of the k largest scores, best first, in O(n + k log k)."""
+    n = scores.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=scores.dtype)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return idx, scores[idx]
+
+
+class TopKIndex:
+    def __init__(self, mat, pruned: bool = False, max_candidate_frac: float = 0.2):
+        self.mat = l2_normalize_rows(mat)
+        self.pruned = pruned
+        self.max_candidate_frac = max_candidate_frac
+        # Column-major copy = term -> posting list of rows; only needed for pruning
+        self._postings = self.mat.tocsc() if pruned else None
+        self.alive = np.ones(self.mat.shape[0], dtype=bool)
+
+    @property
+    def n_rows(self) -> int:
+        return self.mat.shape[0]
+
+    def delete_rows(self, rows) -> None:
+        self.alive[np.asarray(rows, dtype=np.intp)] = False
+
+    def _exact(self, q: sparse.csr_matrix) -> np.ndarray:
+        scores = np.asarray(self.mat.dot(q.T).todense()).ravel()
+        scores[~self.alive] = -np.inf
+        return scores
+
+    def _candidates(self, q: sparse.csr_matrix, min_score: float) -> Optional[np.ndarray]:
+        """Rows sharing a kept query term, or None when pruning would not save work."""
+        weights = q.data
+        terms = q.indices[np.argsort(-weights)]
+        w_sorted = np.sort(weights)[::-1]
+        # residual[i] = norm of the query weight dropped if only the first i terms are kept
+        tail = np.sqrt(np.cumsum((w_sorted ** 2)[::-1])[::-1])
+        residual = np.append(tail, 0.0)
+        keep = int(np.argmax(residual < min_score)) if min_score > 0 else len(terms)
+
+        indptr, indices = self._postings.indptr, self._postings.indices
+        lengths = indptr[terms[:keep] + 1] - indptr[terms[:keep]]
+        if lengths.sum() > self.max_candidate_frac * self.n_rows:
+            return None
+        if keep == 0:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate([indices[indptr[t]:indptr[t + 1]] for t in terms[:keep]]))
+
+    def search(self, q_vec, k: int = 10, min_score: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (row indices, cosine scores) for one query vector (1 x vocab)."""
+        q = l2_normalize_rows(q_vec)
+        if q.nnz == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        if self.pruned:
+            cands = self._candidates(q, min_score)
+            if cands is not None:
+                cands = cands[self.alive[cands]]
+                scores = np.asarray(self.mat[cands].dot(q.T).todense()).ravel()
+                idx, vals = top_k(scores, k)
+                return cands[idx], vals
+
+        idx, vals = top_k(self._exact(q), k)
+        keep = np.isfinite(vals)
+        return idx[keep], vals[keep]
+
+    def recall(self, queries, k: int = 10, min_score: float = 0.0) -> float:
+        """
+        Recall@k of this index's search against the exact scan, counting only
+        exact neighbours scoring >= min_score (those pruning promises to keep).
+        """
+        queries = sparse.csr_matrix(queries)
+        hit = total = 0
+        for i in range(queries.shape[0]):
+            q = queries[i]
+            exact_idx, exact_vals = top_k(self._exact(l2_normalize_rows(q)), k)
+            keep = np.isfinite(exact_vals)
+            exact_idx, exact_vals = exact_idx[keep], exact_vals[keep]
+            want = set(exact_idx[exact_vals >= min_score].tolist())
+            if not want:
+                continue
+            got = set(self.search(q, k, min_score)[0].tolist())
+            hit += len(want & got)
+            total += len(want)
+        return hit / total if total else 1.0
@@ -1,34 +1,120 @@
+import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from functools import wraps
-import redis
-import json
+from . import metrics
+from .cache import TieredCache, caches, make_key
 from .config import settings
 
-r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+log = logging.getLogger("ml.utils")
 
-def timeboxed(ms_budget):
+# Bounded pool the timeboxed handlers run on; queueing time counts against the budget
+_executor = ThreadPoolExecutor(max_workers=settings.TIMEBOX_WORKERS, thread_name_prefix="timebox")
+# Admission control: the executor's own queue is unbounded, so cap running + queued calls
+_slots = threading.BoundedSemaphore(max(1, settings.TIMEBOX_MAX_PENDING))
+
+
+def _release_slot(future):
+    _slots.release()
+
+
+def _log_late(endpoint: str, started: float):
+    def done(future):
+        exc = future.exception()
+        if exc is not None:
+            log.error("%s failed after its budget ran out: %r", endpoint, exc)
+        else:
+            log.info("%s finished %.0f ms after start (response already served)",
+                     endpoint, (time.perf_counter() - started) * 1000)
+    return done
+
+
+def timeboxed(ms_budget, fallback=None):
+    """
+    Enforce a latency budget on a sync handler.
+
+    The handler runs on a bounded executor. If it has not returned within
+    ms_budget the request is answered with fallback(*args, **kwargs), a cheap
+    degraded response. A call still queued at that point is cancelled; one
+    already running finishes in the background (threads cannot be interrupted)
+    and its result is dropped. At most TIMEBOX_MAX_PENDING calls may be running
+    or queued: when the pool is saturated a handler with a fallback is answered
+    by it at once, without queueing. Without a fallback the overrun is only
+    counted and the caller waits, including for a free slot. A budget <= 0
+    disables enforcement.
+
+    Exports ml_request_duration_seconds{endpoint,outcome},
+    ml_budget_overruns_total{endpoint} and ml_budget_shed_total{endpoint} on /metrics.
+    """
     def deco(fn):
+        endpoint = fn.__name__
+
         @wraps(fn)
         def inner(*args, **kwargs):
-            start = time.time()
+            start = time.perf_counter()
+            outcome = "ok"
             try:
-                return fn(*args, **kwargs)
+                if ms_budget <= 0:
+                    return fn(*args, **kwargs)
+                if not _slots.acquire(blocking=fallback is None):
+                    metrics.inc("ml_budget_shed_total", "Requests answered by the fallback because the pool was full",
+                                endpoint=endpoint)
+                    outcome = "shed"
+                    return fallback(*args, **kwargs)
+                try:
+                    future = _executor.submit(fn, *args, **kwargs)
+                except BaseException:
+                    _slots.release()
+                    raise
+                future.add_done_callback(_release_slot)
+                try:
+                    return future.result(timeout=ms_budget / 1000.0)
+                except FuturesTimeout:
+                    metrics.inc("ml_budget_overruns_total", "Requests that exceeded their latency budget",
+                                endpoint=endpoint)
+                    if fallback is None:
+                        outcome = "late"
+                        return future.result()
+                    outcome = "fallback"
+                    if future.cancel():
+                        log.warning("%s still queued after its %d ms budget; cancelled, serving fallback",
+                                    endpoint, ms_budget)
+                    else:
+                        log.warning("%s exceeded its %d ms budget; serving fallback", endpoint, ms_budget)
+                        future.add_done_callback(_log_late(endpoint, start))
+                    return fallback(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
             finally:
-                elapsed = (time.time() - start) * 1000
-                # (Optional) log elapsed
+                metrics.observe("ml_request_duration_seconds", time.perf_counter() - start,
+                                "Latency of timeboxed ML endpoints as served", endpoint=endpoint, outcome=outcome)
         return inner
     return deco
 
-def cacheable(prefix: str, ttl: int = settings.CACHE_TTL_S):
+def cacheable(prefix: str, ttl: int = settings.CACHE_TTL_S, model=None, version=None, store_if=None):
+    """
+    Cache a handler's response in the two-tier cache (see app/cache.py).
+
+    - model: pydantic class cached JSON is re-validated into on a hit
+    - version: zero-arg callable mixed into the key (e.g. an artifact mtime) so
+      entries computed against older model state are never served
+    - store_if: predicate on the result; False skips storing (degraded answers)
+
+    CACHE_TTL_S <= 0 disables caching. Cache failures never fail the request.
+    """
     def deco(fn):
+        if ttl <= 0:
+            return fn
+        cache = caches.setdefault(prefix, TieredCache(prefix, ttl=ttl))
+
         @wraps(fn)
         def inner(*args, **kwargs):
-            key = f"{prefix}:{json.dumps([args, kwargs], sort_keys=True)}"
-            cached = r.get(key)
-            if cached:
-                return json.loads(cached)
-            out = fn(*args, **kwargs)
-            r.setex(key, ttl, json.dumps(out))
-            return out
+            key = make_key(version() if version else None, args, kwargs)
+            value = cache.get_or_compute(key, lambda: fn(*args, **kwargs), store_if or (lambda out: True))
+            if model is not None and isinstance(value, dict):
+                value = model.model_validate(value)
+            return value
         return inner
     return deco
@@ -0,0 +1,86 @@
+"""
+Eager artifact loading at startup.
+
+The routers' loaders are lazy singletons; calling them here once, before the
+server accepts traffic, moves the multi-second joblib/npz/CSV loads out of
+the first request after a deploy. Each load is timed and the process RSS is
+sampled around it so /healthz can show what every artifact costs.
+"""
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from .routers import duplicate, price, recommend
+
+log = logging.getLogger("ml.warmup")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class ArtifactLoad:
+    name: str
+    ok: bool            # loader returned without raising
+    loaded: bool        # an artifact is in memory (optional ones may be absent)
+    seconds: float
+    rss_delta_mb: float
+    error: Optional[str] = None
+
+
+_loads: Dict[str, ArtifactLoad] = {}
+_warmed_at: Optional[float] = None
+
+
+def rss_bytes() -> int:
+    """Current resident set size; mapped artifact pages count once touched."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        import resource  # peak RSS, in KiB on Linux; best effort elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def load_artifact(name: str, loader: Callable[[], Any]) -> ArtifactLoad:
+    """Run one loader, recording time, RSS growth and failure instead of raising."""
+    rss0, t0 = rss_bytes(), time.perf_counter()
+    try:
+        result = loader()
+        ok, error = True, None
+    except FileNotFoundError as e:
+        log.warning("Warm-up of %s skipped, artifact missing: %s", name, e.filename)
+        result, ok, error = None, False, f"missing: {e.filename}"
+    except Exception as e:
+        log.exception("Warm-up of %s failed", name)
+        result, ok, error = None, False, f"{type(e).__name__}: {e}"
+    load = ArtifactLoad(
+        name=name, ok=ok, loaded=result is not None,
+        seconds=round(time.perf_counter() - t0, 3),
+        rss_delta_mb=round((rss_bytes() - rss0) / 2**20, 1),
+        error=error,
+    )
+    _loads[name] = load
+    log.info("Warm-up %s: ok=%s loaded=%s in %.3fs (+%.1f MB RSS)",
+             name, load.ok, load.loaded, load.seconds, load.rss_delta_mb)
+    return load
+
+
+def warm_up() -> None:
+    """Load every model artifact once. A failing artifact is logged; its endpoint keeps retrying lazily."""
+    global _warmed_at
+    t0 = time.perf_counter()
+    load_artifact("price_model", price.load_model)
+    load_artifact("duplicate_index", duplicate.load_index)
+    load_artifact("recommend_als", recommend._load_als)
+    _warmed_at = time.time()
+    log.info("Warm-up finished in %.2fs, RSS %.1f MB", time.perf_counter() - t0, rss_bytes() / 2**20)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "warmed_up": _warmed_at is not None,
+        "rss_mb": round(rss_bytes() / 2**20, 1),
+        "artifacts": [asdict(load) for load in _loads.values()],
+    }
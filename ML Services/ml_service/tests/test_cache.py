@@ -0,0 +1,137 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+from pydantic import BaseModel
+
+from app import cache
+from app.cache import CircuitBreaker, TieredCache, TTLCache, make_key
+
+
+class Item(BaseModel):
+    title: str
+    price: float
+
+
+class FailingRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        raise ConnectionError("down")
+
+    def setex(self, key, ttl, value):
+        self.calls += 1
+        raise ConnectionError("down")
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    fresh = CircuitBreaker(failures=2, cooldown_s=0.1)
+    monkeypatch.setattr(cache, "breaker", fresh)
+    return fresh
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    c = TTLCache(maxsize=2, ttl=0.05)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None and c.get("a") == 1
+    time.sleep(0.08)
+    assert c.get("a") is None and c.get("c") is None
+
+
+def test_key_is_canonical_for_pydantic_and_dict_order():
+    assert make_key(Item(title="lamp", price=5), {"a": 1, "b": 2}) == make_key(
+        {"price": 5.0, "title": "lamp"}, {"b": 2, "a": 1}
+    )
+    assert make_key(Item(title="lamp", price=5)) != make_key(Item(title="lamp", price=6))
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        b = CircuitBreaker(failures=3, cooldown_s=60)
+        b.failure()
+        b.failure()
+        b.success()  # resets the streak
+        b.failure()
+        b.failure()
+        assert b.allow() and not b.is_open
+        b.failure()
+        assert b.is_open and not b.allow()
+
+    def test_half_open_probe_then_close(self):
+        b = CircuitBreaker(failures=1, cooldown_s=0.05)
+        b.failure()
+        assert not b.allow()
+        time.sleep(0.07)
+        assert b.allow()      # one probe after the cooldown
+        assert not b.allow()  # ...and only one
+        b.success()
+        assert not b.is_open and b.allow()
+
+    def test_failed_probe_stays_open(self):
+        b = CircuitBreaker(failures=1, cooldown_s=0.05)
+        b.failure()
+        time.sleep(0.07)
+        assert b.allow()
+        b.failure()
+        assert b.is_open and not b.allow()
+
+
+class TestTieredCache:
+    def test_store_if_and_local_hits(self, monkeypatch):
+        monkeypatch.setattr(cache, "get_redis", lambda: None)
+        c = TieredCache("t", ttl=60)
+        assert c.get_or_compute("k", lambda: {"ok": False}, store_if=lambda v: v["ok"]) == {"ok": False}
+        assert c.get_or_compute("k", lambda: {"ok": True}, store_if=lambda v: v["ok"]) == {"ok": True}
+        assert c.get_or_compute("k", lambda: pytest.fail("recomputed"), store_if=lambda v: True) == {"ok": True}
+        assert c.stats()["hits"] == 1 and c.stats()["misses"] == 2
+
+    def test_redis_tier_is_shared(self, monkeypatch, breaker):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        monkeypatch.setattr(cache, "get_redis", lambda: redis)
+        TieredCache("t", ttl=60).get_or_compute("k", lambda: Item(title="lamp", price=5), store_if=lambda v: True)
+
+        other_worker = TieredCache("t", ttl=60)
+        value = other_worker.get_or_compute("k", lambda: pytest.fail("recomputed"), store_if=lambda v: True)
+        assert value == {"title": "lamp", "price": 5.0}
+        assert 0 < redis.ttl("ml:t:k") <= 60
+
+    def test_redis_outage_trips_breaker_and_still_serves(self, monkeypatch, breaker):
+        redis = FailingRedis()
+        monkeypatch.setattr(cache, "get_redis", lambda: redis)
+        c = TieredCache("t", ttl=60)
+        for i in range(5):
+            assert c.get_or_compute(f"k{i}", lambda: i, store_if=lambda v: True) == i
+        # get + setex fail once each, then the open breaker skips Redis entirely
+        assert redis.calls == 2 and breaker.is_open
+        assert c.get_or_compute("k3", lambda: pytest.fail("recomputed"), store_if=lambda v: True) == 3
+
+    def test_concurrent_misses_compute_once(self, monkeypatch):
+        monkeypatch.setattr(cache, "get_redis", lambda: None)
+        c = TieredCache("t", ttl=60)
+        calls = []
+        start = threading.Barrier(8)
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"price": 42}
+
+        def worker():
+            start.wait()
+            results.append(c.get_or_compute("k", compute, store_if=lambda v: True))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert results == [{"price": 42}] * 8
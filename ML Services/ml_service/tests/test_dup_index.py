@@ -0,0 +1,114 @@
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.dup_index import LiveDuplicateIndex, live_version
+
+CATALOG = [
+    (1, "casio fx 991 scientific calculator"),
+    (2, "calculus early transcendentals textbook"),
+    (3, "ikea desk lamp white"),
+    (4, "mini fridge for dorm room"),
+]
+
+
+@pytest.fixture
+def vectorizer():
+    return TfidfVectorizer().fit([t for _, t in CATALOG] + ["graphing calculator ti 84 plus", "office chair"])
+
+
+@pytest.fixture
+def index_dir(tmp_path, vectorizer):
+    sparse.save_npz(tmp_path / "tfidf_matrix.npz", sparse.csr_matrix(vectorizer.transform([t for _, t in CATALOG])))
+    pd.DataFrame({"id": [i for i, _ in CATALOG]}).to_csv(tmp_path / "item_meta.csv", index=False)
+    return tmp_path
+
+
+def _open(index_dir, vectorizer, **kwargs):
+    return LiveDuplicateIndex.load(str(index_dir), vectorizer, pruned=False, **kwargs)
+
+
+def _best(index, text):
+    ids, scores = index.search(index.transform([text]), k=1)
+    return ids[0] if ids else None, float(scores[0]) if len(scores) else 0.0
+
+
+def test_offline_build_is_searchable(index_dir, vectorizer):
+    index = _open(index_dir, vectorizer)
+    assert index.generation == 0
+    assert _best(index, "casio calculator fx 991")[0] == 1
+
+
+def test_write_on_one_worker_is_seen_by_another(index_dir, vectorizer):
+    a = _open(index_dir, vectorizer)
+    b = _open(index_dir, vectorizer)
+
+    a.upsert([(10, "graphing calculator ti 84 plus", None)])
+    assert _best(b, "ti 84 plus graphing calculator")[0] == 10
+    assert b.size == 5
+
+    b.delete([10, 3])
+    assert _best(a, "ti 84 plus graphing calculator")[0] != 10
+    assert _best(a, "ikea desk lamp white")[0] != 3
+    assert a.size == 3
+
+
+def test_writes_append_to_journal_without_rewriting_base(index_dir, vectorizer):
+    index = _open(index_dir, vectorizer)
+    index.upsert([(10, "office chair", None)])
+    base = index_dir / "base-1.npz"
+    base_mtime = base.stat().st_mtime_ns
+    journal = index_dir / "journal-1.log"
+    size = journal.stat().st_size
+
+    version = live_version(str(index_dir))
+    index.upsert([(11, "office chair black", None)])
+    assert journal.stat().st_size > size
+    assert base.stat().st_mtime_ns == base_mtime
+    assert len(journal.read_bytes().splitlines()) == 2
+    assert live_version(str(index_dir)) != version
+
+
+def test_image_hashes_survive_the_journal(index_dir, vectorizer):
+    hashes = np.array([[1, 2, 2 ** 63 + 5]], dtype=np.uint64)
+    _open(index_dir, vectorizer).upsert([(10, "office chair", hashes)])
+    reopened = _open(index_dir, vectorizer)
+    np.testing.assert_array_equal(reopened.hashes_for([10])[0], hashes)
+
+
+def test_merge_starts_new_generation_seen_by_other_workers(index_dir, vectorizer):
+    a = _open(index_dir, vectorizer, delta_max_rows=2)
+    b = _open(index_dir, vectorizer, delta_max_rows=2)
+    a.upsert([(10, "office chair", None)])
+    a.delete([4])
+    a.upsert([(11, "graphing calculator ti 84 plus", None)])
+    a.merge()
+
+    assert a.generation == 2
+    assert not (index_dir / "journal-1.log").exists()
+    assert _best(b, "ti 84 plus graphing calculator")[0] == 11
+    assert b.generation == 2
+    assert b.size == 5  # 4 offline - 1 deleted + 2 new
+
+
+def _writer(index_dir, vectorizer, start):
+    index = LiveDuplicateIndex.load(str(index_dir), vectorizer, pruned=False)
+    for i in range(start, start + 25):
+        index.upsert([(i, f"office chair number {i}", None)])
+
+
+def test_concurrent_workers_lose_no_writes(index_dir, vectorizer):
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(index_dir, vectorizer, s)) for s in (100, 200)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    index = _open(index_dir, vectorizer)
+    assert index.size == len(CATALOG) + 50
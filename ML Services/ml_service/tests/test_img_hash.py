@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.img_hash import format_hashes, min_distances, parse_hashes, popcount64, rerank
+
+
+def test_popcount_matches_python():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([
+        rng.integers(0, 2 ** 63, 200, dtype=np.uint64) * np.uint64(2) + np.uint64(1),
+        np.array([0, 1, 2 ** 63, 2 ** 64 - 1], dtype=np.uint64),
+    ])
+    assert popcount64(values).tolist() == [bin(int(v)).count("1") for v in values]
+
+
+def test_parse_format_round_trip():
+    wire = [["8000000000000001", "ffffffffffffffff", "0000000000000000"], ["0123456789abcdef"] * 3]
+    arr = parse_hashes(wire)
+    assert arr.dtype == np.uint64 and arr.shape == (2, 3)
+    assert int(arr[0, 0]) == 2 ** 63 + 1
+    assert format_hashes(arr) == wire
+    # Plain ints are accepted too, and malformed rows are dropped
+    assert format_hashes(parse_hashes([[1, 2, 3], ["zz", "0", "0"], ["1", "2"]])) == [
+        ["0000000000000001", "0000000000000002", "0000000000000003"]
+    ]
+    assert parse_hashes([]) is None and parse_hashes(None) is None
+
+
+def test_min_distances_is_best_image_mean_hamming():
+    query = parse_hashes([[0, 0, 0]])
+    far = parse_hashes([[2 ** 64 - 1] * 3])            # 64 bits off in every hash
+    near = parse_hashes([[0b1, 0b11, 0b111]])          # 1, 2 and 3 bits off
+    dist = min_distances(query, [np.concatenate([far, near]), far, None, near])
+    assert dist.tolist() == pytest.approx([2.0, 64.0, 64.0, 2.0])
+    assert min_distances(None, [near]).tolist() == [64.0]
+
+
+def test_rerank_only_adds_evidence():
+    text = np.array([0.4, 0.4, 0.9])
+    dist = np.array([0.0, 64.0, 40.0])
+    scores, same_photo = rerank(text, dist, alpha_text=0.7, near_identical=4, thresh_hi=0.85)
+    assert same_photo.tolist() == [True, False, False]
+    assert scores[0] >= 0.85           # identical photo, reworded title
+    assert scores[1] == pytest.approx(0.4)  # no photos: text score unchanged
+    assert scores[2] == pytest.approx(0.9)  # dissimilar photo never lowers the score
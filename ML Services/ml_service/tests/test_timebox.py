@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import utils
+from app.utils import timeboxed
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(utils, "_executor", executor)
+    monkeypatch.setattr(utils, "_slots", threading.BoundedSemaphore(8))
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def _blocker(release: threading.Event):
+    started = threading.Event()
+
+    @timeboxed(5000)
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    return slow, started
+
+
+def test_fast_handler_returns_its_result(pool):
+    @timeboxed(1000, fallback=lambda x: "fallback")
+    def handler(x):
+        return x * 2
+
+    assert handler(21) == 42
+
+
+def test_timed_out_queued_call_is_cancelled(pool):
+    release = threading.Event()
+    slow, started = _blocker(release)
+    ran = []
+
+    @timeboxed(50, fallback=lambda: "fallback")
+    def queued():
+        ran.append(1)
+        return "late"
+
+    busy = threading.Thread(target=slow)
+    busy.start()
+    assert started.wait(2)
+    assert queued() == "fallback"  # still behind `slow` in the one-worker pool
+    release.set()
+    busy.join()
+    pool.submit(lambda: None).result()
+    assert ran == []
+
+
+def test_saturated_pool_sheds_to_fallback(pool, monkeypatch):
+    monkeypatch.setattr(utils, "_slots", threading.BoundedSemaphore(1))
+    release = threading.Event()
+    slow, started = _blocker(release)
+    ran = []
+
+    @timeboxed(5000, fallback=lambda: "fallback")
+    def handler():
+        ran.append(1)
+        return "ok"
+
+    busy = threading.Thread(target=slow)
+    busy.start()
+    assert started.wait(2)
+    t0 = time.perf_counter()
+    assert handler() == "fallback"
+    assert time.perf_counter() - t0 < 1  # answered without waiting for the pool
+    release.set()
+    busy.join()
+    assert ran == []
+    # The slot comes back from the finished call's done-callback, a moment after its result
+    deadline = time.monotonic() + 2
+    while handler() != "ok":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
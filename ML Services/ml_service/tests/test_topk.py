@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from app.topk import TopKIndex, l2_normalize_rows, top_k
+
+MIN_SCORE = 0.5
+
+
+@pytest.fixture
+def corpus():
+    # Many short documents over a large vocabulary, like listing titles: each
+    # term posts to few rows, so the pruned path is the one actually taken.
+    rng = np.random.default_rng(7)
+    mat = sparse.random(2000, 5000, density=0.002, format="csr", random_state=rng, dtype=np.float32)
+    # Near-duplicates of existing rows, plus a couple of random queries
+    picks = rng.choice(mat.shape[0], 30, replace=False)
+    noise = sparse.random(30, 5000, density=0.0005, format="csr", random_state=rng, dtype=np.float32)
+    queries = sparse.vstack([mat[picks] + 0.3 * noise, sparse.random(5, 5000, density=0.002, random_state=rng)])
+    return mat, sparse.csr_matrix(queries, dtype=np.float32)
+
+
+def _brute_force(mat, q, k, min_score, dead=()):
+    scores = l2_normalize_rows(mat).dot(l2_normalize_rows(q).T).toarray().ravel()
+    scores[list(dead)] = -np.inf
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [(int(i), float(scores[i])) for i in order if scores[i] >= min_score]
+
+
+def test_top_k_orders_best_first():
+    scores = np.array([0.1, 0.9, 0.4, 0.7, 0.2], dtype=np.float32)
+    idx, vals = top_k(scores, 3)
+    assert idx.tolist() == [1, 3, 2]
+    assert vals.tolist() == pytest.approx([0.9, 0.7, 0.4])
+    assert top_k(scores, 10)[0].tolist() == [1, 3, 2, 4, 0]
+    assert top_k(scores, 0)[0].size == 0
+
+
+def test_pruned_search_matches_brute_force_above_threshold(corpus):
+    mat, queries = corpus
+    index = TopKIndex(mat, pruned=True)
+    pruned_used = 0
+    for i in range(queries.shape[0]):
+        q = queries[i]
+        pruned_used += index._candidates(l2_normalize_rows(q), MIN_SCORE) is not None
+        idx, vals = index.search(q, k=5, min_score=MIN_SCORE)
+        got = [(int(r), float(s)) for r, s in zip(idx, vals) if s >= MIN_SCORE]
+        want = _brute_force(mat, q, 5, MIN_SCORE)
+        assert [r for r, _ in got] == [r for r, _ in want]
+        assert [s for _, s in got] == pytest.approx([s for _, s in want], abs=1e-5)
+    assert pruned_used == queries.shape[0]
+    assert index.recall(queries, k=5, min_score=MIN_SCORE) == 1.0
+
+
+def test_deleted_rows_are_skipped(corpus):
+    mat, queries = corpus
+    for pruned in (False, True):
+        index = TopKIndex(mat, pruned=pruned)
+        q = queries[0]
+        best = int(index.search(q, k=1, min_score=MIN_SCORE)[0][0])
+        index.delete_rows([best])
+        idx, _ = index.search(q, k=5, min_score=MIN_SCORE)
+        assert best not in idx.tolist()
+        want = [r for r, _ in _brute_force(mat, q, 5, MIN_SCORE, dead=[best])]
+        assert idx.tolist()[:len(want)] == want
+
+
+def test_empty_query_returns_nothing(corpus):
+    mat, _ = corpus
+    idx, vals = TopKIndex(mat, pruned=True).search(sparse.csr_matrix((1, mat.shape[1])), k=5)
+    assert idx.size == 0 and vals.size == 0